@@ -14,3 +14,15 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'financial_api.settings')
 
 application = get_asgi_application()
+
+# Open the database connections and load the caches before the worker's first request
+from django.conf import settings  # noqa: E402
+
+if settings.WARM_UP:
+    from django.db import connections
+    from transactions_app.startup import warm_up
+
+    warm_up()
+    # Connections of the loading thread, opened by the warm-up's queries: the request
+    # threads never use them (pooled ones go back to their pool)
+    connections.close_all()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 import dj_database_url
 
@@ -46,6 +47,7 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    "transactions_app.instrumentation.QueryInstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -55,6 +57,8 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
+    "transactions_app.replicas.replica_pin_middleware",
+    "transactions_app.profiling.ProfilingMiddleware",
 ]
 
 CORS_ALLOWED_ORIGINS = [
@@ -70,6 +74,87 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": 5,
 }
 
+# A request running more queries than the query_budget of its view logs a warning, or
+# raises QueryBudgetExceeded when set (as by the test runner)
+QUERY_BUDGET_RAISE = os.environ.get("QUERY_BUDGET_RAISE") == "1"
+TEST_RUNNER = "financial_api.test_runner.TestRunner"
+
+# Maximum number of transactions accepted by one add_transaction/bulk/ request
+BULK_TRANSACTION_MAX_ITEMS = 10000
+
+# Write-behind mode for add_transaction/: requests are queued in-process and
+# group-committed every WRITE_BEHIND_MAX_DELAY_MS or WRITE_BEHIND_MAX_BATCH rows
+TRANSACTIONS_WRITE_BEHIND = os.environ.get("TRANSACTIONS_WRITE_BEHIND") == "1"
+WRITE_BEHIND_QUEUE_SIZE = 10000
+WRITE_BEHIND_MAX_BATCH = 500
+WRITE_BEHIND_MAX_DELAY_MS = 5
+WRITE_BEHIND_RETRY_AFTER = 1  # seconds, sent when the queue is full or a commit times out
+# Seconds a request waits for its batch to commit before answering 503 (the flusher may
+# be stalled): it bounds how long a stuck flusher can hold a worker
+WRITE_BEHIND_TIMEOUT = 10
+
+# In-memory per-account velocity tracker fed at insert time
+VELOCITY_WINDOWS = (60, 3600, 86400)  # seconds
+VELOCITY_BUFFER_SIZE = 256  # most recent transactions kept per account
+# Buffers grow with an account's transactions: 80 MB if every account filled its buffer
+VELOCITY_MAX_ACCOUNTS = 20000
+# Limits of the insert-time velocity rule: most transactions allowed per window (seconds)
+VELOCITY_LIMITS = {60: 5, 3600: 30}
+
+# Server-sent events stream of flagged transactions (async/flagged/stream/)
+FLAGGED_STREAM_MAX_SUBSCRIBERS = 1000
+FLAGGED_STREAM_QUEUE_SIZE = 100  # events buffered per subscriber before it is dropped
+FLAGGED_STREAM_HEARTBEAT = 15  # seconds between keep-alive comments
+
+# Largest number of points returned by the time-series endpoints; longer ranges are
+# downsampled by merging consecutive buckets
+TIMESERIES_MAX_POINTS = 500
+
+# Columnar snapshot of the Transactions table written by the build_snapshot command and
+# read by endpoints called with ?source=snapshot
+TRANSACTIONS_SNAPSHOT_DIR = os.environ.get(
+    "TRANSACTIONS_SNAPSHOT_DIR", BASE_DIR / "snapshots"
+)
+
+# Monthly partitions of the old transactions moved out of the table by the
+# archive_transactions command, combined with the table by the history endpoints
+TRANSACTIONS_ARCHIVE_DIR = os.environ.get(
+    "TRANSACTIONS_ARCHIVE_DIR", BASE_DIR / "archive"
+)
+
+# OpenAPI schema written by the generate_schema command (generated on first use when
+# missing) and served from memory at swagger.json/swagger.yaml; the documentation pages
+# load it from there
+API_SCHEMA_DIR = os.environ.get("API_SCHEMA_DIR", BASE_DIR / "schema")
+API_SCHEMA_MAX_AGE = 86400  # seconds clients may cache the schema and documentation pages
+SWAGGER_SETTINGS = {"SPEC_URL": "schema-json"}
+REDOC_SETTINGS = {"SPEC_URL": "schema-json"}
+
+# Memory-mapped files of the metrics of each worker process, added up by the metrics
+# endpoint (see transactions_app/metrics.py); empty it when deploying. Metrics are only
+# recorded when it is set, so tests and development servers leave no files behind
+METRICS_DIR = os.environ.get("METRICS_DIR") or None
+
+# Profiles of the requests asking for one (X-Profile header or ?profile=, admins only) and
+# of a random fraction of all requests, listed and downloaded at profiles/ (see
+# transactions_app/profiling.py)
+PROFILES_DIR = os.environ.get("PROFILES_DIR", BASE_DIR / "profiles")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))  # 0 to 1
+PROFILE_SAMPLE_INTERVAL = 0.005  # seconds between two stack samples
+PROFILES_KEEP = 200  # most recent profiles kept
+
+# Change log of the Transactions table, tailed by the consume_changes command
+CHANGELOG_BATCH_SIZE = 1000  # changes applied per batch
+CHANGELOG_GAP_TIMEOUT = 5  # seconds before a gap in the sequence is skipped
+
+# changes/ feed: largest page, longest long-poll and how often a long-poll checks the log.
+# The sync endpoint holds a worker thread while it waits: its long-polls are cut short
+# to CHANGES_FEED_SYNC_MAX_WAIT, and only async/changes/ waits CHANGES_FEED_MAX_WAIT
+CHANGES_FEED_MAX_LIMIT = 10000
+CHANGES_FEED_MAX_WAIT = 30  # seconds
+CHANGES_FEED_SYNC_MAX_WAIT = 2  # seconds
+CHANGES_FEED_POLL_INTERVAL = 0.5  # seconds
+
 ROOT_URLCONF = "financial_api.urls"
 
 TEMPLATES = [
@@ -114,6 +199,120 @@ DATABASES = {
     )
 }
 
+# Databases holding the transactions of the accounts, "default" first (see
+# transactions_app/sharding.py). Extra shards are given as comma-separated database URLs
+# in TRANSACTIONS_SHARD_URLS and named shard1, shard2...
+TRANSACTIONS_SHARDS = ["default"]
+for number, url in enumerate(
+    filter(None, os.environ.get("TRANSACTIONS_SHARD_URLS", "").split(",")), start=1
+):
+    DATABASES[f"shard{number}"] = dj_database_url.parse(url.strip(), conn_max_age=600)
+    TRANSACTIONS_SHARDS.append(f"shard{number}")
+DATABASE_ROUTERS = ["transactions_app.sharding.ShardRouter"]
+SHARD_MAP_REFRESH = 5  # seconds a read of the AccountShard directory is reused
+# TransactionIDs reserved at once by a process (see Transactions.allocate_ids)
+TRANSACTION_ID_BLOCK_SIZE = 100
+# Threads of a process querying the shards in parallel for the cross-shard endpoints
+SHARD_SCATTER_THREADS = 4 * len(TRANSACTIONS_SHARDS)
+# Shortest time between two reads of a dimension table (Locations, Occupations) caused by
+# looking up a name missing from its cache (see transactions_app/dimensions.py)
+DIMENSION_RELOAD_INTERVAL = 5  # seconds
+
+# Read replicas used by the analytics endpoints, as {database alias: [replica aliases]}
+# (see transactions_app/replicas.py). Replicas of "default" are given as comma-separated
+# database URLs in TRANSACTIONS_REPLICA_URLS and named replica1, replica2...
+TRANSACTIONS_REPLICAS = {}
+for number, url in enumerate(
+    filter(None, os.environ.get("TRANSACTIONS_REPLICA_URLS", "").split(",")), start=1
+):
+    DATABASES[f"replica{number}"] = dj_database_url.parse(
+        url.strip(), conn_max_age=600, test_options={"MIRROR": "default"}
+    )
+    TRANSACTIONS_REPLICAS.setdefault("default", []).append(f"replica{number}")
+# Seconds a client stays on the primaries after a write, so it reads its own writes
+REPLICA_PIN_SECONDS = 5
+
+# Performance profile of the SQLite databases, run on every new connection (disable with
+# SQLITE_PROFILE=0): WAL journal, so readers and the writer do not block each other,
+# fsync at checkpoints only, memory-mapped reads, a larger page cache and in-memory
+# temporary tables. Transactions start with BEGIN IMMEDIATE, so concurrent writers wait
+# up to SQLITE_BUSY_TIMEOUT for the lock instead of failing with "database is locked".
+SQLITE_PROFILE = os.environ.get("SQLITE_PROFILE", "1") == "1"
+SQLITE_BUSY_TIMEOUT = 20  # seconds
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,  # bytes
+    "cache_size": -64 * 1024,  # in KiB when negative: 64 MiB per connection
+    "temp_store": "MEMORY",
+}
+# With SQLITE_READ_ONLY_CONNECTIONS=1, the analytics endpoints read through read-only
+# connections to the same file: the "readonly" replica of "default"
+SQLITE_READ_ONLY_CONNECTIONS = os.environ.get("SQLITE_READ_ONLY_CONNECTIONS") == "1"
+for alias, database in list(DATABASES.items()):
+    if database["ENGINE"] != "django.db.backends.sqlite3" or not SQLITE_PROFILE:
+        continue
+    database.setdefault("OPTIONS", {}).update(
+        init_command=";".join(
+            f"PRAGMA {name}={value}" for name, value in SQLITE_PRAGMAS.items()
+        ),
+        timeout=SQLITE_BUSY_TIMEOUT,
+        transaction_mode="IMMEDIATE",
+    )
+    if alias == "default" and SQLITE_READ_ONLY_CONNECTIONS:
+        DATABASES["readonly"] = {
+            **database,
+            "NAME": f"file:{database['NAME']}?mode=ro",
+            # The journal mode is set by the writable connections
+            "OPTIONS": {
+                "init_command": ";".join(
+                    ["PRAGMA query_only=1"]
+                    + [
+                        f"PRAGMA {name}={value}"
+                        for name, value in SQLITE_PRAGMAS.items()
+                        if name != "journal_mode"
+                    ]
+                ),
+                "timeout": SQLITE_BUSY_TIMEOUT,
+            },
+            "TEST": {"MIRROR": "default"},
+        }
+        TRANSACTIONS_REPLICAS.setdefault("default", []).append("readonly")
+
+# Connection pool of the PostgreSQL databases (psycopg 3), enabled with DATABASE_POOL=1:
+# the threads of a worker share up to DATABASE_POOL_MAX_SIZE connections instead of
+# keeping one persistent connection each. Connections are checked before being lent.
+DATABASE_POOL = os.environ.get("DATABASE_POOL") == "1"
+DATABASE_POOL_MIN_SIZE = int(os.environ.get("DATABASE_POOL_MIN_SIZE", 4))
+DATABASE_POOL_MAX_SIZE = int(os.environ.get("DATABASE_POOL_MAX_SIZE", 16))
+DATABASE_POOL_TIMEOUT = 10  # seconds a request waits for a free connection
+# Server-side prepared statements, enabled with DATABASE_PREPARED_STATEMENTS=1: a query
+# run DATABASE_PREPARE_THRESHOLD times on a connection is prepared (not behind pgbouncer
+# in transaction mode)
+DATABASE_PREPARED_STATEMENTS = os.environ.get("DATABASE_PREPARED_STATEMENTS") == "1"
+DATABASE_PREPARE_THRESHOLD = 5
+for database in DATABASES.values():
+    if database["ENGINE"] != "django.db.backends.postgresql":
+        continue
+    options = database.setdefault("OPTIONS", {})
+    if DATABASE_POOL:
+        database["CONN_MAX_AGE"] = 0  # Connections go back to the pool after a request
+        database["CONN_HEALTH_CHECKS"] = True
+        options["pool"] = {
+            "min_size": DATABASE_POOL_MIN_SIZE,
+            "max_size": DATABASE_POOL_MAX_SIZE,
+            "timeout": DATABASE_POOL_TIMEOUT,
+            "max_idle": 300,  # seconds before an idle connection above min_size closes
+        }
+    if DATABASE_PREPARED_STATEMENTS:
+        options["server_side_binding"] = True
+        options["prepare_threshold"] = DATABASE_PREPARE_THRESHOLD
+
+# Warm-up run by wsgi.py and asgi.py before a worker takes traffic (disable with
+# WARM_UP=0): database connection pools, URL patterns, validators, dimension caches and the
+# OpenAPI schema (see transactions_app/startup.py)
+WARM_UP = os.environ.get("WARM_UP") != "0"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -0,0 +1,29 @@
+"""
+Test runner of the project (TEST_RUNNER in settings.py).
+"""
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Django's runner, with QUERY_BUDGET_RAISE on: a request running more queries than the
+    query_budget of its view fails its test instead of only logging a warning.
+
+    TransactionIDs are reserved one block per allocation (TRANSACTION_ID_BLOCK_SIZE of
+    1): the rollback at the end of a test returns its reservations to the sequence, so
+    numbers left in the process's block would continue in the next test.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.query_budget_raise = settings.QUERY_BUDGET_RAISE
+        self.transaction_id_block_size = settings.TRANSACTION_ID_BLOCK_SIZE
+        settings.QUERY_BUDGET_RAISE = True
+        settings.TRANSACTION_ID_BLOCK_SIZE = 1
+
+    def teardown_test_environment(self, **kwargs):
+        settings.QUERY_BUDGET_RAISE = self.query_budget_raise
+        settings.TRANSACTION_ID_BLOCK_SIZE = self.transaction_id_block_size
+        super().teardown_test_environment(**kwargs)
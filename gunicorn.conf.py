@@ -0,0 +1,22 @@
+"""
+Gunicorn settings, read from the working directory (e.g. ``gunicorn financial_api.wsgi``).
+
+With --preload, the master loads the application, and runs its warm-up (see
+transactions_app/startup.py), before forking the workers: the connections and pools it
+opened would be shared by every worker. The master closes them before each fork, and
+each worker opens its own pools once forked.
+"""
+
+
+def pre_fork(server, worker):
+    if server.cfg.preload_app:
+        from transactions_app.pooling import close_connections
+
+        close_connections()
+
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        from transactions_app.pooling import warm_up_connections
+
+        warm_up_connections()
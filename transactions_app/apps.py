@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class TransactionsAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'transactions_app'
+
+    def ready(self):
+        # Connect the signal receivers
+        from . import (  # noqa: F401
+            broadcast,
+            changelog,
+            instrumentation,
+            rollups,
+            rules,
+            sharding,
+            signals,
+        )
@@ -0,0 +1,363 @@
+"""
+Cold tier of the Transactions table: memory-mapped files of archived rows.
+
+archive_transactions moves the transactions older than a day out of the table into one
+NumPy .npy file per month (``YYYY-MM.npy``) under TRANSACTIONS_ARCHIVE_DIR, holding a
+record array with a field per column. Amounts are stored in cents and dates in
+microseconds since the epoch; rows are sorted by account and date, so the rows of an
+account are a slice found with a binary search.
+
+Partitions are uncompressed and opened with mmap: reading the rows of an account only
+loads the pages holding them, and the pages are shared by the workers through the OS
+page cache instead of being copied into each of them.
+
+The account history and merchant summary endpoints combine the table with the archive.
+Partitions are selected by file name, so a query with a date range never opens the
+months outside it.
+
+Archiving is not a change of the data: rows are deleted without the post_delete signals,
+so the rollups keep counting them and the change log does not record deletes.
+"""
+
+import heapq
+import re
+import threading
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.db import router, transaction
+from django.utils import timezone
+
+from . import sharding
+from .models import Accounts, Devices, Merchants, Transactions
+from .snapshot import EPOCH
+from .startup import lazy_import
+
+np = lazy_import("numpy")  # Only imported once a partition is written or read
+
+# Columns of a partition: Transactions field and dtype (str columns get their width
+# from the longest value)
+COLUMNS = {
+    "TransactionID": str,
+    "AccountID": str,
+    "TransactionAmount": "int64",  # Cents
+    "TransactionDate": "int64",  # Microseconds since the epoch
+    "TransactionType": str,
+    "TransactionDuration": "int32",
+    "LoginAttempts": "int32",
+    "CustomerAge": "int32",
+    "CustomerOccupation": str,
+    "AccountBalance": "int64",  # Cents
+    "PreviousTransactionDate": "int64",  # Microseconds since the epoch
+    "Location": str,
+    "IPAddress": str,
+    "MerchantID": str,
+    "Channel": str,
+    "DeviceID": str,
+}
+CENTS_COLUMNS = ("TransactionAmount", "AccountBalance")
+DATE_COLUMNS = ("TransactionDate", "PreviousTransactionDate")
+PARTITION_NAME = re.compile(r"^(\d{4})-(\d{2})\.npy$")
+# TransactionIDs per DELETE statement
+DELETE_BATCH_SIZE = 1000
+
+
+def to_microseconds(value):
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def from_microseconds(value):
+    return EPOCH + timedelta(microseconds=int(value))
+
+
+def day_start(day):
+    """Start of a day in the current time zone, as microseconds since the epoch."""
+    return to_microseconds(timezone.make_aware(datetime.combine(day, time.min)))
+
+
+def next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def partition_path(month):
+    return Path(settings.TRANSACTIONS_ARCHIVE_DIR) / f"{month:%Y-%m}.npy"
+
+
+def partitions(start=None, end=None):
+    """
+    Archived months overlapping the days from ``start`` to ``end`` (both optional and
+    included), oldest first, as (first day of the month, path).
+    """
+    directory = Path(settings.TRANSACTIONS_ARCHIVE_DIR)
+    if not directory.is_dir():
+        return []
+    found = []
+    for path in directory.iterdir():
+        match = PARTITION_NAME.match(path.name)
+        if not match:
+            continue
+        month = date(int(match[1]), int(match[2]), 1)
+        if start and next_month(month) <= start:
+            continue
+        if end and month > end:
+            continue
+        found.append((month, path))
+    return sorted(found)
+
+
+# Mapped partitions by path, as (modification time, columns). Mappings only take address
+# space; the pages read stay in the OS page cache, which evicts them as needed.
+_partitions = {}
+_partitions_lock = threading.Lock()
+
+
+def read_partition(path):
+    """Columns of a partition, as {field: memory-mapped array}."""
+    path = Path(path)
+    mtime_ns = path.stat().st_mtime_ns
+    with _partitions_lock:
+        cached = _partitions.get(path)
+    # A partition rewritten by archive_transactions is mapped again (the replaced file
+    # stays readable by the mappings still in use)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+    records = np.load(path, mmap_mode="r")
+    columns = {name: records[name] for name in records.dtype.names}
+    with _partitions_lock:
+        _partitions[path] = (mtime_ns, columns)
+    return columns
+
+
+def forget_partitions():
+    """Drop the mapped partitions, e.g. after the archive directory changed."""
+    with _partitions_lock:
+        _partitions.clear()
+
+
+def write_partition(path, columns):
+    """
+    Sort columns by account and date and write them next to ``path``.
+
+    Returns:
+        Path: The written file; replacing ``path`` with it publishes the partition.
+    """
+    order = np.lexsort((columns["TransactionDate"], columns["AccountID"]))
+    records = np.empty(
+        len(order), dtype=[(name, column.dtype) for name, column in columns.items()]
+    )
+    for name, column in columns.items():
+        records[name] = column[order]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f"{path.stem}.tmp.npy")
+    np.save(temporary, records)
+    return temporary
+
+
+def row_columns(rows):
+    """Columns of an iterable of Transactions.values() rows."""
+    values = {name: [] for name in COLUMNS}
+    for row in rows:
+        for name in COLUMNS:
+            value = row[name]
+            if name in CENTS_COLUMNS:
+                value = int(value * 100)
+            elif name in DATE_COLUMNS:
+                value = to_microseconds(value)
+            values[name].append(value)
+    return {name: np.asarray(values[name], dtype=COLUMNS[name]) for name in COLUMNS}
+
+
+def archive_month(month, before):
+    """
+    Move the transactions of a month dated before ``before`` (an aware datetime) to the
+    month's partition, merging them with the rows already archived there.
+
+    The row with the highest TransactionID stays in the table, since the sequence of
+    TransactionIDs starts after the highest one in the table (see
+    Transactions.allocate_ids).
+
+    Returns:
+        int: Number of transactions archived.
+    """
+    start = timezone.make_aware(datetime.combine(month, time.min))
+    end = min(timezone.make_aware(datetime.combine(next_month(month), time.min)), before)
+    using = router.db_for_write(Transactions)
+    with transaction.atomic(using=using):
+        last_id = Transactions.objects.order_by("-TransactionID").values_list(
+            "TransactionID", flat=True
+        )[:1]
+        rows = Transactions.objects.filter(
+            TransactionDate__gte=start, TransactionDate__lt=end
+        ).exclude(TransactionID__in=list(last_id))
+        columns = row_columns(rows.select_for_update().values(*COLUMNS).order_by())
+        count = len(columns["TransactionID"])
+        if not count:
+            return 0
+
+        path = partition_path(month)
+        if path.exists():
+            archived = read_partition(path)
+            columns = {
+                name: np.concatenate((archived[name], columns[name])) for name in COLUMNS
+            }
+        # Deleted by ID (rows inserted meanwhile stay) and without signals: archiving
+        # must not update the rollups or the change log
+        ids = columns["TransactionID"][-count:].tolist()
+        for offset in range(0, count, DELETE_BATCH_SIZE):
+            batch = Transactions.objects.filter(
+                TransactionID__in=ids[offset : offset + DELETE_BATCH_SIZE]
+            )
+            batch._raw_delete(batch.db)
+        # Written before the delete commits, so that a failed write rolls it back, but
+        # only published once it has: a failed commit leaves the partition as it was
+        temporary = write_partition(path, columns)
+        transaction.on_commit(lambda: temporary.replace(path), using=using)
+    return count
+
+
+def archive_before(day):
+    """
+    Archive the transactions dated before ``day``, one shard and month at a time.
+
+    Returns:
+        dict: Number of transactions archived per month (first day of the month).
+    """
+    before = timezone.make_aware(datetime.combine(day, time.min))
+    archived = defaultdict(int)
+    # One shard after the other, since shards write to the same partitions
+    for alias in sharding.shards():
+        with sharding.use_shard(alias):
+            first = (
+                Transactions.objects.filter(TransactionDate__lt=before)
+                .order_by("TransactionDate")
+                .values_list("TransactionDate", flat=True)
+                .first()
+            )
+            if first is None:
+                continue
+            first = timezone.localtime(first).date()
+            month = date(first.year, first.month, 1)
+            while month < day:
+                archived[month] += archive_month(month, before)
+                month = next_month(month)
+    return dict(sorted(archived.items()))
+
+
+def to_transaction(columns, index):
+    """An unsaved Transactions instance of an archived row."""
+    values = {name: columns[name][index].item() for name in COLUMNS}
+    for name in CENTS_COLUMNS:
+        values[name] = Decimal(values[name]).scaleb(-2)
+    for name in DATE_COLUMNS:
+        values[name] = from_microseconds(values[name])
+    # Related rows are built from their IDs, so serializing never queries them
+    values["AccountID"] = Accounts(AccountID=values["AccountID"])
+    values["MerchantID"] = Merchants(MerchantID=values["MerchantID"])
+    values["DeviceID"] = Devices(DeviceID=values["DeviceID"])
+    return Transactions(**values)
+
+
+def account_rows(account_id):
+    """Archived rows of an account, oldest first, as (columns, index) pairs."""
+    found = []
+    for _, path in partitions():
+        columns = read_partition(path)
+        accounts = columns["AccountID"]
+        first = np.searchsorted(accounts, account_id, side="left")
+        last = np.searchsorted(accounts, account_id, side="right")
+        found.extend((columns, index) for index in range(first, last))
+    return found
+
+
+class AccountHistory:
+    """
+    Transactions of an account in the table and in the archive, ordered by date, as a
+    sequence for a paginator: slicing it only fetches the page's rows of the table and
+    builds the page's archived transactions.
+
+    The table's rows are placed among the archived ones by their dates, read (alone)
+    once. As in heapq.merge(archived, table), archived rows come first on equal dates.
+
+    Args:
+        account_id (str): Account whose transactions are listed.
+        transactions (QuerySet): The account's transactions in the table, ordered by
+            TransactionDate.
+    """
+
+    def __init__(self, account_id, transactions):
+        self.transactions = transactions
+        self.archived = account_rows(account_id)
+        self.archived_dates = np.array(
+            [columns["TransactionDate"][index] for columns, index in self.archived],
+            dtype="int64",
+        )
+        self._table_dates = None
+
+    @property
+    def table_dates(self):
+        if self._table_dates is None:
+            self._table_dates = np.array(
+                [
+                    to_microseconds(value)
+                    for value in self.transactions.values_list(
+                        "TransactionDate", flat=True
+                    )
+                ],
+                dtype="int64",
+            )
+        return self._table_dates
+
+    def __len__(self):
+        return len(self.archived) + len(self.table_dates)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index : index + 1][0]
+        start, stop, _ = index.indices(len(self))
+        # Position of each row in the merged history
+        archived = np.arange(len(self.archived)) + np.searchsorted(
+            self.table_dates, self.archived_dates, side="left"
+        )
+        table = np.arange(len(self.table_dates)) + np.searchsorted(
+            self.archived_dates, self.table_dates, side="right"
+        )
+        # Both are increasing, so the page's rows of each source are consecutive
+        first, last = np.searchsorted(archived, [start, stop])
+        table_first, table_last = np.searchsorted(table, [start, stop])
+        page = [to_transaction(*self.archived[i]) for i in range(first, last)]
+        if table_last > table_first:
+            rows = list(self.transactions[int(table_first) : int(table_last)])
+            page = list(heapq.merge(page, rows, key=lambda tx: tx.TransactionDate))
+        return page
+
+
+def merchant_totals(merchant_ids=None, start=None, end=None):
+    """
+    Archived amount (in cents) and number of transactions per merchant, for the
+    merchants in ``merchant_ids`` (all if None) and the days from ``start`` to ``end``.
+
+    Returns:
+        dict: Merchant ID to (total cents, count).
+    """
+    totals = {}
+    for _, path in partitions(start, end):
+        columns = read_partition(path)
+        merchants = columns["MerchantID"]
+        rows = np.ones(len(merchants), dtype=bool)
+        if merchant_ids is not None:
+            rows &= np.isin(merchants, list(merchant_ids))
+        if start:
+            rows &= columns["TransactionDate"] >= day_start(start)
+        if end:
+            rows &= columns["TransactionDate"] < day_start(end + timedelta(days=1))
+        distinct, codes = np.unique(merchants[rows], return_inverse=True)
+        cents = np.zeros(len(distinct), dtype="int64")
+        np.add.at(cents, codes, columns["TransactionAmount"][rows])
+        counts = np.bincount(codes, minlength=len(distinct))
+        for merchant_id, total, count in zip(distinct.tolist(), cents.tolist(), counts.tolist()):
+            previous = totals.get(merchant_id, (0, 0))
+            totals[merchant_id] = (previous[0] + total, previous[1] + count)
+    return totals
@@ -0,0 +1,416 @@
+"""
+Native async versions of the read endpoints, for use behind the ASGI entry point.
+
+The sync views in views.py run in a worker thread under ASGI (Django wraps them with
+sync_to_async). These views use Django's async ORM instead and return the same JSON
+documents as their sync counterparts.
+"""
+
+import asyncio
+import json
+from datetime import timedelta
+from decimal import Decimal
+from math import ceil
+from time import monotonic
+
+from asgiref.sync import sync_to_async
+from django.db.models import Count, QuerySet, Sum
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views import View
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from . import archive, changelog, replicas, sharding
+from .broadcast import DROPPED, FILTER_FIELDS, TooManySubscribers, get_broadcaster
+from .models import AccountDailyActivity, Transactions
+from .serializer import TransactionsSerializer
+
+
+def bounded_int(request, name, default, low, high):
+    """Parse an optional integer query parameter that must lie in [low, high]."""
+    value = request.GET.get(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {value}. Expected an integer.")
+    if not low <= number <= high:
+        raise ValueError(f"{name} must be between {low} and {high}.")
+    return number
+
+
+def high_frequency_params(request):
+    """
+    Period in days and threshold of a high-frequency accounts request (?days=, ?threshold=).
+
+    Raises:
+        ValueError: Invalid parameter.
+    """
+    period = bounded_int(request, "days", 1000, 1, 36500)
+    threshold = bounded_int(request, "threshold", 10, 0, 2**31 - 1)
+    return period, threshold
+
+
+def requested_shard(request):
+    """
+    Shard whose change log a request reads (?shard=): required when there are several,
+    since each shard numbers its own changes.
+
+    Raises:
+        ValueError: Missing or unknown shard.
+    """
+    aliases = sharding.shards()
+    alias = request.GET.get("shard")
+    if alias is None and len(aliases) == 1:
+        return aliases[0]
+    if alias not in aliases:
+        raise ValueError(f"shard must be one of {', '.join(aliases)}.")
+    return alias
+
+
+def json_response(data, status=200):
+    # Rendered with DRF's renderer so Decimals and datetimes match the sync views
+    return HttpResponse(
+        JSONRenderer().render(data), content_type="application/json", status=status
+    )
+
+
+async def fetch(queryset):
+    """Evaluate a queryset with the async ORM."""
+    return [row async for row in queryset.aiterator()]
+
+
+async def account_shard(account_id):
+    """Alias of the shard holding an account (reading the shard directory off the loop)."""
+    return await sync_to_async(sharding.shard_for)(account_id)
+
+
+async def scatter(func):
+    """Async version of sharding.scatter(): await ``func()`` on every shard concurrently."""
+
+    async def on_shard(alias):
+        with sharding.use_shard(alias):
+            return await func()
+
+    return await asyncio.gather(*(on_shard(alias) for alias in sharding.shards()))
+
+
+class AsyncReplicaReadMixin:
+    """Runs the view's reads on the replicas, unless the client wrote recently."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        with replicas.for_request(request):
+            return await super().dispatch(request, *args, **kwargs)
+
+
+async def paginate(request, queryset):
+    """
+    Paginate a queryset (or a sequence, such as a list or an archive.AccountHistory)
+    like rest_framework.pagination.PageNumberPagination.
+
+    Returns:
+        tuple: (response data, status code)
+    """
+    page_size = api_settings.PAGE_SIZE
+    is_sequence = not isinstance(queryset, QuerySet)
+    if is_sequence:
+        count = await sync_to_async(len)(queryset)
+    else:
+        count = await queryset.acount()
+    num_pages = max(1, ceil(count / page_size))
+
+    page_number = request.GET.get("page", 1)
+    if page_number == "last":
+        page_number = num_pages
+    try:
+        page_number = int(page_number)
+    except (TypeError, ValueError):
+        page_number = 0
+    if not 1 <= page_number <= num_pages:
+        return {"detail": "Invalid page."}, 404
+
+    offset = (page_number - 1) * page_size
+    if is_sequence:
+        # Slicing a sequence may query the database, e.g. an AccountHistory
+        page = await sync_to_async(queryset.__getitem__)(slice(offset, offset + page_size))
+    else:
+        page = await fetch(queryset[offset : offset + page_size])
+
+    url = request.build_absolute_uri()
+    next_link = (
+        replace_query_param(url, "page", page_number + 1)
+        if page_number < num_pages
+        else None
+    )
+    if page_number == 1:
+        previous_link = None
+    elif page_number == 2:
+        previous_link = remove_query_param(url, "page")
+    else:
+        previous_link = replace_query_param(url, "page", page_number - 1)
+
+    data = {
+        "count": count,
+        "next": next_link,
+        "previous": previous_link,
+        "results": TransactionsSerializer(page, many=True).data,
+    }
+    return data, 200
+
+
+def most_used(counts, message):
+    """Return the most frequent value, or a message when every value is used once."""
+    most_used_value = counts[0] if counts else None
+    if most_used_value and all(value["count"] == 1 for value in counts):
+        return {"message": message}
+    return most_used_value
+
+
+class AsyncTransactionsByAccount(View):
+    """
+    Async version of TransactionsByAccount: paginated transactions for an account, ordered by date.
+    """
+
+    async def get(self, request, account_id):
+        transactions = (
+            Transactions.objects.filter(AccountID=account_id)
+            .select_related("AccountID", "MerchantID", "DeviceID")
+            .order_by("TransactionDate")
+        )
+        with sharding.use_shard(await account_shard(account_id)):
+            history = await sync_to_async(archive.AccountHistory)(account_id, transactions)
+            if history.archived:
+                transactions = history
+            data, status = await paginate(request, transactions)
+        return json_response(data, status=status)
+
+
+class AsyncChangesFeedView(View):
+    """
+    Async version of ChangesFeedView, JSON only: a long-poll waits on the event loop
+    instead of holding a worker thread, so it may last up to CHANGES_FEED_MAX_WAIT
+    seconds.
+    """
+
+    async def get(self, request):
+        try:
+            alias = requested_shard(request)
+            since = bounded_int(request, "since", 0, 0, 2**63 - 1)
+            limit = bounded_int(
+                request,
+                "limit",
+                settings.CHANGELOG_BATCH_SIZE,
+                1,
+                settings.CHANGES_FEED_MAX_LIMIT,
+            )
+            wait = bounded_int(request, "wait", 0, 0, settings.CHANGES_FEED_MAX_WAIT)
+        except ValueError as e:
+            return json_response({"error": str(e)}, status=400)
+
+        read_changes = sync_to_async(changelog.read_changes)
+        deadline = monotonic() + wait
+        try:
+            with sharding.use_shard(alias):
+                changes = await read_changes(since, limit)
+                while not changes and monotonic() < deadline:
+                    await asyncio.sleep(settings.CHANGES_FEED_POLL_INTERVAL)
+                    changes = await read_changes(since, limit)
+        except changelog.CursorExpired as e:
+            return json_response(
+                {
+                    "error": "Changes after this cursor were compacted; reload and continue from `compacted`.",
+                    "compacted": e.args[0],
+                },
+                status=410,
+            )
+        return json_response(
+            {
+                "changes": [changelog.serialize_change(c) for c in changes],
+                "next": changes[-1].Sequence if changes else since,
+            }
+        )
+
+
+class AsyncTransactionsSummaryByMerchant(AsyncReplicaReadMixin, View):
+    """
+    Async version of TransactionsSummaryByMerchant: total amount and count for a merchant.
+    """
+
+    async def get(self, request, merchant_id):
+        transactions = Transactions.objects.filter(MerchantID=merchant_id)
+        summary = sharding.merge_sums(
+            await scatter(
+                lambda: transactions.aaggregate(
+                    total_amount=Sum("TransactionAmount"),
+                    total_transactions=Count("TransactionID"),
+                )
+            ),
+            ("total_amount", "total_transactions"),
+        )
+        # Add the transactions moved to the archive
+        totals = await sync_to_async(archive.merchant_totals)([merchant_id])
+        cents, count = totals.get(merchant_id, (0, 0))
+        if count:
+            summary["total_amount"] = (summary["total_amount"] or 0) + Decimal(cents) / 100
+            summary["total_transactions"] += count
+        summary["merchant_id"] = merchant_id
+        return json_response(summary)
+
+
+class AsyncSpendingInsightsView(AsyncReplicaReadMixin, View):
+    """
+    Async version of SpendingInsightsView.
+
+    The four independent group-bys are issued concurrently with asyncio.gather.
+    """
+
+    async def get(self, request, account_id):
+        with sharding.use_shard(await account_shard(account_id)):
+            return await self.get_insights(account_id)
+
+    async def get_insights(self, account_id):
+        try:
+            transactions = Transactions.objects.filter(AccountID=account_id)
+
+            spending_by_type, merchant_counts, channel_counts, location_counts = (
+                await asyncio.gather(
+                    fetch(
+                        transactions.values("TransactionType").annotate(
+                            total_amount=Sum("TransactionAmount"),
+                            transaction_count=Count("TransactionID"),
+                        )
+                    ),
+                    *(
+                        fetch(
+                            transactions.values(field)
+                            .annotate(count=Count("TransactionID"))
+                            .order_by("-count")
+                        )
+                        for field in ("MerchantID", "Channel", "Location")
+                    ),
+                )
+            )
+
+            response = {
+                "account_id": account_id,
+                "spending_by_type": spending_by_type,
+                "most_used_merchant": most_used(
+                    merchant_counts, "All merchants are used once"
+                ),
+                "most_used_channel": most_used(
+                    channel_counts, "All channels are used once"
+                ),
+                "most_used_location": most_used(
+                    location_counts, "All locations are used once"
+                ),
+            }
+            return json_response(response)
+
+        except Exception as e:
+            return json_response(
+                {"error": f"An unexpected error occurred: {str(e)}"}, status=500
+            )
+
+
+class AsyncHighFrequencyAccountsView(AsyncReplicaReadMixin, View):
+    """
+    Async version of HighFrequencyAccountsView: accounts with more than `threshold` transactions
+    in the last `days` days, summed from the daily activity buckets.
+    """
+
+    async def get(self, request):
+        try:
+            period, threshold = high_frequency_params(request)
+        except ValueError as e:
+            return json_response({"error": str(e)}, status=400)
+        start_day = timezone.localdate() - timedelta(days=period)
+
+        accounts = (
+            AccountDailyActivity.objects.filter(Day__gte=start_day)
+            .values("AccountID")
+            .annotate(transaction_count=Sum("TransactionCount"))
+            .filter(transaction_count__gt=threshold)
+            .order_by("-transaction_count")
+        )
+        # Like the sync view: each shard's accounts are complete, merged in order
+        high_frequency_accounts = sorted(
+            (
+                account
+                for rows in await scatter(lambda: fetch(accounts.all()))
+                for account in rows
+            ),
+            key=lambda account: -account["transaction_count"],
+        )
+
+        return json_response(
+            {
+                "period_days": period,
+                "threshold": threshold,
+                "high_frequency_accounts": high_frequency_accounts,
+            }
+        )
+
+
+def sse_event(event):
+    """Format an event of the broadcaster as a server-sent event."""
+    data = json.dumps(event, cls=JSONEncoder)
+    if event is DROPPED:
+        return f"event: dropped\ndata: {data}\n\n"
+    return f"id: {event['transaction_id']}\nevent: flagged\ndata: {data}\n\n"
+
+
+class FlaggedTransactionsStream(View):
+    """
+    Server-sent events stream of the transactions flagged by the insert-time fraud rules.
+
+    Each flagged transaction is pushed as an ``event: flagged`` message as soon as its
+    insert commits, instead of polling flagged_transactions/<account_id>/. The data is a
+    JSON object with transaction_id, account_id, channel, the names of the rules that
+    flagged it and the serialized transaction.
+
+    Query Parameters:
+        account (str, optional): Only transactions of this account.
+        rule (str, optional): Only transactions flagged by this rule (e.g. velocity).
+        channel (str, optional): Only transactions of this channel.
+
+    A comment line is sent every FLAGGED_STREAM_HEARTBEAT seconds to keep the connection
+    open. A client that reads too slowly is sent an ``event: dropped`` message and the
+    stream ends. Returns 503 when FLAGGED_STREAM_MAX_SUBSCRIBERS streams are open.
+    """
+
+    async def get(self, request):
+        filters = {
+            name: request.GET[name] for name in FILTER_FIELDS if request.GET.get(name)
+        }
+        broadcaster = get_broadcaster()
+        try:
+            subscription = broadcaster.subscribe(**filters)
+        except TooManySubscribers:
+            return json_response({"error": "Too many open streams."}, status=503)
+
+        async def events():
+            try:
+                yield ": connected\n\n"
+                while True:
+                    try:
+                        event = await asyncio.wait_for(
+                            subscription.queue.get(), settings.FLAGGED_STREAM_HEARTBEAT
+                        )
+                    except asyncio.TimeoutError:
+                        yield ": keep-alive\n\n"
+                        continue
+                    yield sse_event(event)
+                    if event is DROPPED:
+                        break
+            finally:
+                broadcaster.unsubscribe(subscription)
+
+        response = StreamingHttpResponse(events(), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # Disable proxy buffering (nginx)
+        return response
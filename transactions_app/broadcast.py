@@ -0,0 +1,140 @@
+"""
+In-process broadcaster of transactions flagged by the insert-time fraud rules.
+
+Each subscriber (one per open SSE stream) gets a bounded asyncio queue on its own event
+loop. Flagged transactions are serialized once, when the inserting database transaction
+commits, and fanned out to the subscribers whose filters match. A subscriber whose queue
+is full is dropped instead of buffering without limit: its stream receives a final
+``dropped`` event and closes, and the client reconnects.
+
+Only transactions inserted by this process are broadcast; with several workers, each
+stream sees the inserts of the worker serving it.
+"""
+
+import asyncio
+import threading
+
+from django.conf import settings
+from django.dispatch import receiver
+
+from .serializer import TransactionsSerializer
+from .signals import transaction_flagged
+
+# Filters a subscriber can set, and the event field each one matches
+FILTER_FIELDS = {"account": "account_id", "rule": "rules", "channel": "channel"}
+# Last item of a dropped subscriber's queue
+DROPPED = {"event": "dropped"}
+
+
+class TooManySubscribers(Exception):
+    """Raised by subscribe() when FLAGGED_STREAM_MAX_SUBSCRIBERS streams are open."""
+
+
+class Subscription:
+    """
+    A subscriber's bounded queue and filters.
+
+    Attributes:
+        queue (asyncio.Queue): Events waiting to be sent, at most FLAGGED_STREAM_QUEUE_SIZE.
+        filters (dict): Filter name (account, rule or channel) to the required value.
+        dropped (bool): Set when the queue overflowed; no more events are queued.
+    """
+
+    def __init__(self, loop, filters, maxsize):
+        self.loop = loop
+        self.filters = filters
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = False
+
+    def matches(self, event):
+        for name, value in self.filters.items():
+            field = event[FILTER_FIELDS[name]]
+            if isinstance(field, list):
+                if value not in field:
+                    return False
+            elif field != value:
+                return False
+        return True
+
+    def offer(self, event):
+        # Runs on the subscriber's event loop
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(DROPPED)
+
+
+class FlaggedBroadcaster:
+    """Fans flagged transactions out to the subscribed SSE streams."""
+
+    def __init__(self, max_subscribers, queue_size):
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.lock = threading.Lock()
+
+    def subscribe(self, **filters):
+        """Register a subscriber on the running event loop (call unsubscribe when done)."""
+        subscription = Subscription(asyncio.get_running_loop(), filters, self.queue_size)
+        with self.lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                raise TooManySubscribers
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def publish(self, event):
+        """Queue an event for every matching subscriber; callable from any thread."""
+        with self.lock:
+            subscribers = [s for s in self.subscribers if s.matches(event)]
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:
+                # The subscriber's event loop is closed
+                self.unsubscribe(subscription)
+
+
+def flagged_event(transaction, rules):
+    """The event broadcast for a flagged transaction."""
+    return {
+        "event": "flagged",
+        "transaction_id": transaction.TransactionID,
+        "account_id": transaction.AccountID_id,
+        "channel": transaction.Channel,
+        "rules": rules,
+        "transaction": TransactionsSerializer(transaction).data,
+    }
+
+
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+
+def get_broadcaster():
+    """Return the process-wide broadcaster, creating it on first use."""
+    global _broadcaster
+    with _broadcaster_lock:
+        if _broadcaster is None:
+            _broadcaster = FlaggedBroadcaster(
+                settings.FLAGGED_STREAM_MAX_SUBSCRIBERS,
+                settings.FLAGGED_STREAM_QUEUE_SIZE,
+            )
+        return _broadcaster
+
+
+@receiver(transaction_flagged)
+def broadcast_flagged(sender, transaction, rules, **kwargs):
+    broadcaster = get_broadcaster()
+    if not broadcaster.subscribers:
+        return
+    # Sent once the insert committed (see rules.py)
+    broadcaster.publish(flagged_event(transaction, rules))
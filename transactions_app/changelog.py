@@ -0,0 +1,207 @@
+"""
+Append-only change log (outbox) of the Transactions table.
+
+Every insert, update and delete of a transaction adds a TransactionChange row in the same
+database transaction, so the log never misses a committed change nor records one that
+was rolled back. Consumers tail the log by Sequence, apply the changes in batches and
+record in ChangeCursor how far they got. Changes made with queryset update() or raw SQL
+bypass the log.
+
+With several shards, each shard logs the changes of its transactions with its own
+Sequence (see sharding.py): consume() and compact() go through every shard, and the other
+functions read the log of the shard selected with use_shard().
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max, Min
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import sharding, snapshot
+from .models import ChangeCursor, TransactionChange, Transactions
+from .signals import transactions_inserted
+
+# Change log consumers: name -> function applying a list of TransactionChange
+CONSUMERS = {
+    "snapshot": snapshot.apply_changes,
+}
+# ChangeCursor row recording the last Sequence deleted by compact()
+COMPACTED = "compacted"
+
+
+class CursorExpired(Exception):
+    """The changes after a cursor were partly deleted by compaction."""
+
+
+def transaction_data(tx):
+    """The fields of a transaction as a JSON-serializable dict (foreign keys as IDs)."""
+    data = {
+        field.name: field.value_from_object(tx)
+        for field in Transactions._meta.concrete_fields
+    }
+    # Full precision (the JSON encoder would round datetimes to milliseconds)
+    data["TransactionDate"] = tx.transaction_datetime.isoformat()
+    return data
+
+
+def record_changes(operation, transactions):
+    TransactionChange.objects.bulk_create(
+        [
+            TransactionChange(
+                TransactionID=tx.TransactionID,
+                Operation=operation,
+                Data=transaction_data(tx),
+            )
+            for tx in transactions
+        ]
+    )
+
+
+@receiver(transactions_inserted)
+def log_inserts(sender, transactions, **kwargs):
+    record_changes("insert", transactions)
+
+
+@receiver(post_save, sender=Transactions)
+def log_update(sender, instance, created, **kwargs):
+    if not created:  # Inserts are logged by log_inserts
+        record_changes("update", [instance])
+
+
+@receiver(post_delete, sender=Transactions)
+def log_delete(sender, instance, **kwargs):
+    record_changes("delete", [instance])
+
+
+def head():
+    """Sequence of the last change, including changes already compacted away."""
+    last = TransactionChange.objects.aggregate(Max("Sequence"))["Sequence__max"]
+    applied = ChangeCursor.objects.aggregate(Max("Sequence"))["Sequence__max"]
+    return max(last or 0, applied or 0)
+
+
+def pending_changes(after, limit):
+    """
+    Up to ``limit`` changes after Sequence ``after``, in order.
+
+    A sequence number can be allocated by a transaction that commits after later numbers
+    (or never commits). The batch therefore stops before a gap until the change after it
+    is CHANGELOG_GAP_TIMEOUT seconds old, after which the gap is considered rolled back.
+    """
+    changes = list(
+        TransactionChange.objects.filter(Sequence__gt=after).order_by("Sequence")[:limit]
+    )
+    settled = timezone.now() - timedelta(seconds=settings.CHANGELOG_GAP_TIMEOUT)
+    expected = after + 1
+    for index, change in enumerate(changes):
+        if change.Sequence != expected and change.CreatedAt > settled:
+            return changes[:index]
+        expected = change.Sequence + 1
+    return changes
+
+
+def serialize_change(change):
+    """A change as published by the changes/ feed."""
+    return {
+        "sequence": change.Sequence,
+        "transaction_id": change.TransactionID,
+        "operation": change.Operation,
+        "data": change.Data,
+        "created_at": change.CreatedAt.isoformat(),
+    }
+
+
+def read_changes(since, limit):
+    """
+    Changes after the cursor ``since`` for readers outside the process (see
+    pending_changes).
+
+    Raises:
+        CursorExpired: Some of the changes after ``since`` were compacted away.
+    """
+    compacted = (
+        ChangeCursor.objects.filter(Consumer=COMPACTED)
+        .values_list("Sequence", flat=True)
+        .first()
+    )
+    if compacted and since < compacted:
+        raise CursorExpired(compacted)
+    return pending_changes(since, limit)
+
+
+def set_cursor(consumer, sequence):
+    ChangeCursor.objects.update_or_create(
+        Consumer=consumer, defaults={"Sequence": sequence, "UpdatedAt": timezone.now()}
+    )
+
+
+def consume(consumer, batch_size=None):
+    """
+    Apply the next batch of changes of every shard to a consumer and advance its cursors.
+
+    Consumers must be idempotent: a batch is applied again if the process stops between
+    applying it and saving the cursor. They are called within use_shard() of the shard
+    the changes come from.
+
+    Returns:
+        int: Number of changes applied.
+    """
+    applied = 0
+    for alias in sharding.shards():
+        with sharding.use_shard(alias):
+            cursor, _ = ChangeCursor.objects.get_or_create(Consumer=consumer)
+            changes = pending_changes(
+                cursor.Sequence, batch_size or settings.CHANGELOG_BATCH_SIZE
+            )
+            if changes:
+                CONSUMERS[consumer](changes)
+                set_cursor(consumer, changes[-1].Sequence)
+            applied += len(changes)
+    return applied
+
+
+def compact():
+    """
+    Delete the changes every consumer has applied, on every shard.
+
+    Returns:
+        int: Number of deleted changes.
+    """
+    total = 0
+    for alias in sharding.shards():
+        with sharding.use_shard(alias):
+            cursors = dict(ChangeCursor.objects.values_list("Consumer", "Sequence"))
+            applied = min(cursors.get(consumer, 0) for consumer in CONSUMERS)
+            deleted, _ = TransactionChange.objects.filter(Sequence__lte=applied).delete()
+            if deleted:
+                set_cursor(COMPACTED, applied)
+            total += deleted
+    return total
+
+
+def freshness():
+    """
+    How far behind the head of the log each consumer is.
+
+    Returns:
+        dict: head (last Sequence) and, per consumer, the applied Sequence, the lag in
+        changes and lag_seconds, the age of the oldest change not applied yet.
+    """
+    last = head()
+    cursors = dict(ChangeCursor.objects.values_list("Consumer", "Sequence"))
+    now = timezone.now()
+    consumers = {}
+    for consumer in CONSUMERS:
+        applied = cursors.get(consumer, 0)
+        oldest = TransactionChange.objects.filter(Sequence__gt=applied).aggregate(
+            Min("CreatedAt")
+        )["CreatedAt__min"]
+        consumers[consumer] = {
+            "applied": applied,
+            "lag": last - applied,
+            "lag_seconds": round((now - oldest).total_seconds(), 3) if oldest else 0,
+        }
+    return {"head": last, "consumers": consumers}
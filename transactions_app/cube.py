@@ -0,0 +1,150 @@
+"""
+Aggregate cube of the Transactions table, for slicing transactions by channel, location,
+transaction type, customer occupation, customer age band and day.
+
+Each TransactionCube row (a cell) holds the count, the amount in cents and the sum of the
+squared amounts of the transactions sharing a day and a value of every dimension. Text
+values are stored like in the Transactions table, as the integer codes of EnumCodeField
+and the Locations/Occupations keys of DimensionField, so a cell is a handful of integers
+and computing its key runs no query. Any coarser slice is a sum of cells, and the sum of
+squares gives the standard deviation. Amounts and squares are integers (cents and cents²),
+so the variance n·Σx² − (Σx)² is computed exactly before the square root, however large
+the amounts. Cells are maintained by rollups.py like the other rollups.
+
+Cells live on the shard of their transactions (see sharding.py): a slice adds up the
+cells of every shard.
+"""
+
+from bisect import bisect_right
+from decimal import Decimal
+from math import sqrt
+
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+
+from . import sharding
+from .models import TransactionCube
+
+# Coded dimensions: query parameter -> (Transactions field, TransactionCube field)
+CODED_DIMENSIONS = {
+    "channel": ("Channel", "Channel"),
+    "location": ("Location", "Location"),
+    "transaction_type": ("TransactionType", "TransactionType"),
+    "occupation": ("CustomerOccupation", "Occupation"),
+}
+# Lower bound of each customer age band
+AGE_BANDS = (0, 18, 25, 35, 45, 55, 65)
+# Dimensions the cube can be grouped by (month rolls days up) and their cell fields
+GROUP_FIELDS = {
+    **{dimension: field for dimension, (_, field) in CODED_DIMENSIONS.items()},
+    "age_band": "AgeBand",
+    "day": "Day",
+    "month": "month",
+}
+# Dimensions the cube can be filtered on (days are filtered with a start/end range)
+FILTER_DIMENSIONS = (*CODED_DIMENSIONS, "age_band")
+# Transactions fields a cell key is computed from
+SOURCE_FIELDS = (*(field for field, _ in CODED_DIMENSIONS.values()), "CustomerAge")
+# TransactionCube fields forming a cell key, in order
+CELL_FIELDS = (
+    "Day",
+    *(field for _, field in CODED_DIMENSIONS.values()),
+    "AgeBand",
+)
+
+
+def age_band(age):
+    """Index in AGE_BANDS of the band containing ``age``."""
+    return max(0, bisect_right(AGE_BANDS, age) - 1)
+
+
+def age_band_label(index):
+    if index == len(AGE_BANDS) - 1:
+        return f"{AGE_BANDS[index]}+"
+    return f"{AGE_BANDS[index]}-{AGE_BANDS[index + 1] - 1}"
+
+
+AGE_BAND_LABELS = [age_band_label(index) for index in range(len(AGE_BANDS))]
+
+
+def cell_key(day, values):
+    """Cell of a day and a mapping of SOURCE_FIELDS to values, as CELL_FIELDS values."""
+    return (
+        day,
+        *(values[field] for field, _ in CODED_DIMENSIONS.values()),
+        age_band(values["CustomerAge"]),
+    )
+
+
+def query_cube(group_by, filters, start=None, end=None):
+    """
+    Sum the cube cells into the requested slice.
+
+    Args:
+        group_by (list): GROUP_FIELDS keys to group by. Fewer dimensions roll up, more
+            dimensions drill down; an empty list returns one grand total.
+        filters (dict): Maps FILTER_DIMENSIONS to lists of allowed values.
+        start, end (date, optional): Day range.
+
+    Returns:
+        list: One dict per group with the group's dimension values, transaction_count,
+        total_amount, average_amount and stddev_amount.
+    """
+    cells = TransactionCube.objects.all()
+    if start:
+        cells = cells.filter(Day__gte=start)
+    if end:
+        cells = cells.filter(Day__lte=end)
+
+    for dimension, values in filters.items():
+        if dimension == "age_band":
+            cells = cells.filter(AgeBand__in=[AGE_BAND_LABELS.index(v) for v in values])
+        else:
+            # Names never seen in a transaction have no key and match nothing
+            cells = cells.filter(**{f"{CODED_DIMENSIONS[dimension][1]}__in": values})
+
+    fields = {dimension: GROUP_FIELDS[dimension] for dimension in group_by}
+    if "month" in fields:
+        cells = cells.annotate(month=TruncMonth("Day"))
+
+    totals = {
+        "count": Sum("TransactionCount"),
+        "cents": Sum("AmountCents"),
+        "squares": Sum("AmountSquares"),
+    }
+    if fields:
+        partials = sharding.scatter(
+            lambda: list(cells.values(*fields.values()).annotate(**totals).order_by())
+        )
+    else:
+        partials = sharding.scatter(lambda: [cells.aggregate(**totals)])
+    # Add up the groups found on several shards
+    groups = {}
+    for row in (row for rows in partials for row in rows):
+        key = tuple(row[field] for field in fields.values())
+        if key in groups:
+            row = sharding.merge_sums([groups[key], row], totals)
+        groups[key] = row
+    results = []
+    for row in groups.values():
+        if not row["count"]:
+            continue  # Every transaction of the group was deleted
+        result = {}
+        for dimension, field in fields.items():
+            if dimension == "age_band":
+                result[dimension] = AGE_BAND_LABELS[row[field]]
+            else:
+                result[dimension] = row[field]
+        count, cents, squares = int(row["count"]), int(row["cents"]), int(row["squares"])
+        # n² times the variance in cents², exact in integers
+        spread = count * squares - cents * cents
+        result.update(
+            {
+                "transaction_count": count,
+                "total_amount": Decimal(cents) / 100,
+                "average_amount": round(cents / 100 / count, 2),
+                "stddev_amount": round(sqrt(max(0, spread)) / count / 100, 2),
+            }
+        )
+        results.append(result)
+    return sorted(results, key=lambda result: [result[d] for d in group_by])
@@ -0,0 +1,129 @@
+"""
+In-memory dictionaries of the dimension tables (Locations, Occupations) that the
+DimensionField columns of Transactions point to.
+
+Dimension rows are only ever added, so a row read outside a transaction is committed and
+is cached for the life of the process. A name missing from the cache makes the table be
+read again at most once every DIMENSION_RELOAD_INTERVAL seconds, so that lookups of
+unknown names (e.g. filter values) do not each read the whole table; saving a new name
+always reads it again. Inside a transaction, a row may have been added by
+that transaction (or one of its savepoints) and disappear if it rolls back. Rows learned
+there are registered with transaction.on_commit, which moves them to the process cache
+once the transaction commits, and are only used while that callback is pending: the
+thread keeps weak references to them, and Django drops the only strong one when it
+discards the callback of a rolled back transaction or savepoint.
+"""
+
+import threading
+import weakref
+from time import monotonic
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+
+from . import metrics
+
+
+class LearnedRows:
+    """Dimension rows read or added inside a transaction, as an on_commit callback."""
+
+    def __init__(self, cache, names):
+        self.cache = cache
+        self.names = names  # names by key
+        self.keys = {name: key for key, name in names.items()}
+
+    def __call__(self):
+        self.cache.remember(self.names)
+
+
+class DimensionCache:
+    """Two-way dictionary of a dimension table: Name <-> integer key."""
+
+    def __init__(self, model):
+        self.model = model
+        self.keys = {}  # committed keys by name
+        self.names = {}  # committed names by key
+        self.lock = threading.Lock()
+        self.local = threading.local()  # LearnedRows of the thread's transaction
+        self.loaded_at = None  # monotonic() of the last load()
+
+    def remember(self, names):
+        with self.lock:
+            self.names.update(names)
+            self.keys.update({name: key for key, name in names.items()})
+
+    def learned(self):
+        """LearnedRows still valid in the current transaction, most recent first."""
+        alive = [(ref, ref()) for ref in getattr(self.local, "rows", [])]
+        alive = [(ref, rows) for ref, rows in alive if rows is not None]
+        self.local.rows = [ref for ref, _ in alive]
+        return [rows for _, rows in reversed(alive)]
+
+    def learn(self, names):
+        """Record rows read or added by the current code path."""
+        if transaction.get_autocommit():
+            self.remember(names)
+            return
+        rows = LearnedRows(self, names)
+        transaction.on_commit(rows)
+        # Weak: the pending callback holds the only reference (see module docstring)
+        self.local.rows = [*getattr(self.local, "rows", []), weakref.ref(rows)]
+
+    def find(self, mapping, value):
+        # mapping is "keys" (by name) or "names" (by key)
+        found = getattr(self, mapping).get(value)
+        if found is None and not transaction.get_autocommit():
+            for rows in self.learned():
+                found = getattr(rows, mapping).get(value)
+                if found is not None:
+                    break
+        return found
+
+    def load(self):
+        self.learn(dict(self.model.objects.values_list("pk", "Name")))
+        self.loaded_at = monotonic()
+
+    def reload_due(self):
+        return (
+            self.loaded_at is None
+            or monotonic() - self.loaded_at >= settings.DIMENSION_RELOAD_INTERVAL
+        )
+
+    def key(self, name, create=False):
+        """
+        Key of a name, or None if it is not in the table. With ``create``, a missing name
+        is added to the table.
+        """
+        key = self.find("keys", name)
+        metrics.cache_lookup("dimensions", key is not None)
+        if key is None and self.reload_due():
+            self.load()
+            key = self.find("keys", name)
+        if key is None and create:
+            # Conflicts mean a concurrent insert created the name first
+            self.model.objects.bulk_create([self.model(Name=name)], ignore_conflicts=True)
+            self.load()
+            key = self.find("keys", name)
+        return key
+
+    def name(self, key):
+        """Name of a key."""
+        name = self.find("names", key)
+        metrics.cache_lookup("dimensions", name is not None)
+        if name is None:
+            self.load()
+            name = self.find("names", key)
+        return name
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_dimension_cache(label):
+    """Return the cache of a dimension model, given as "app_label.ModelName"."""
+    with _caches_lock:
+        if label not in _caches:
+            _caches[label] = DimensionCache(apps.get_model(label))
+        return _caches[label]
@@ -0,0 +1,216 @@
+"""
+Compact storage for Transactions columns.
+
+The fields keep the Python values of the fields they replace (Decimal amounts, choice
+strings and names), so instances, lookups, values() and aggregates look the same to the
+rest of the code, while the database stores integers: cheaper rows and integer
+arithmetic in SUM and friends.
+"""
+
+from decimal import Decimal, InvalidOperation
+
+from django.core import exceptions
+from django.db import models
+from django.db.models import lookups
+from django.utils.functional import cached_property
+
+from .dimensions import get_dimension_cache
+
+
+class CentsField(models.BigIntegerField):
+    """
+    A Decimal amount with 2 decimal places, stored as a BIGINT number of cents.
+
+    Lookups compare with the exact value (``TransactionAmount__gt=100.505`` compares
+    with 10050.5 cents); saved values are rounded to the cent. Expressions combining the
+    field with itself (e.g. a product) are in cents and need an explicit output_field.
+    """
+
+    description = "Amount stored as a whole number of cents"
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return Decimal(int(value)).scaleb(-2)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, Decimal):
+            return value
+        try:
+            return Decimal(str(value)).quantize(Decimal("0.01"))
+        except (InvalidOperation, ValueError):
+            raise exceptions.ValidationError(
+                "“%(value)s” value must be a decimal number.",
+                code="invalid",
+                params={"value": value},
+            )
+
+    def get_prep_value(self, value):
+        value = models.Field.get_prep_value(self, value)
+        if value is None or hasattr(value, "resolve_expression"):
+            return value
+        try:
+            cents = Decimal(str(value)) * 100
+        except InvalidOperation as e:
+            raise e.__class__(
+                f"Field '{self.name}' expected a decimal number but got {value!r}."
+            ) from e
+        return int(cents) if cents == cents.to_integral_value() else cents
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        if isinstance(value, Decimal):
+            return value  # A fraction of a cent, in a lookup
+        return connection.ops.adapt_integerfield_value(value, self.get_internal_type())
+
+    def get_db_prep_save(self, value, connection):
+        value = self.get_prep_value(value)
+        if isinstance(value, Decimal):
+            value = int(value.to_integral_value())
+        return connection.ops.adapt_integerfield_value(value, self.get_internal_type())
+
+
+# IntegerField rounds float values of these lookups up to an integer before they reach
+# get_prep_value, which would turn 100.5 into 101.00; compare with the exact value instead
+for lookup in (
+    lookups.Exact,
+    lookups.GreaterThan,
+    lookups.GreaterThanOrEqual,
+    lookups.LessThan,
+    lookups.LessThanOrEqual,
+):
+    CentsField.register_lookup(lookup)
+
+
+class EnumCodeField(models.PositiveSmallIntegerField):
+    """
+    A choice of strings stored as a SMALLINT code.
+
+    ``codes`` maps each value to its code. Codes follow the alphabetical order of the
+    values, so ordering by the field orders by value.
+    """
+
+    description = "String choice stored as a small integer code"
+
+    def __init__(self, *args, codes=None, **kwargs):
+        self.codes = dict(codes or {})
+        self.values = {code: value for value, code in self.codes.items()}
+        kwargs.setdefault("choices", [(value, value) for value in self.codes])
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["codes"] = self.codes
+        return name, path, args, kwargs
+
+    def get_internal_type(self):
+        return "PositiveSmallIntegerField"
+
+    @cached_property
+    def validators(self):
+        # Values are strings: skip the integer range validators of the column
+        return [*self.default_validators, *self._validators]
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return self.values[value]
+
+    def to_python(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        try:
+            return self.values[value]
+        except KeyError:
+            raise exceptions.ValidationError(
+                self.error_messages["invalid_choice"],
+                code="invalid_choice",
+                params={"value": value},
+            )
+
+    def get_prep_value(self, value):
+        value = models.Field.get_prep_value(self, value)
+        if value is None or hasattr(value, "resolve_expression"):
+            return value
+        try:
+            return self.codes[value]
+        except KeyError:
+            raise ValueError(
+                f"Field '{self.name}' expected one of {', '.join(self.codes)} "
+                f"but got {value!r}."
+            )
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        return value
+
+
+class DimensionField(models.PositiveIntegerField):
+    """
+    A string stored as the integer key of its row in a dimension table.
+
+    ``to`` is the dimension model ("app_label.ModelName"), which has a unique ``Name``.
+    Keys and names are resolved through the in-memory dictionaries of dimensions.py, and
+    saving a string missing from the table adds it. Lookups with a missing string match
+    nothing. Ordering by the field orders by key, which is the order names were added in.
+    """
+
+    description = "String stored as the key of a dimension table row"
+
+    def __init__(self, *args, to=None, **kwargs):
+        self.to = to
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["to"] = self.to
+        return name, path, args, kwargs
+
+    def get_internal_type(self):
+        return "PositiveIntegerField"
+
+    @property
+    def dimension(self):
+        return get_dimension_cache(self.to)
+
+    @cached_property
+    def validators(self):
+        # Values are strings: skip the integer range validators of the column
+        return [*self.default_validators, *self._validators]
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return self.dimension.name(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        name = self.dimension.name(value)
+        if name is None:
+            raise exceptions.ValidationError(
+                "“%(value)s” is not a key of %(dimension)s.",
+                code="invalid",
+                params={"value": value, "dimension": self.to},
+            )
+        return name
+
+    def get_prep_value(self, value):
+        value = models.Field.get_prep_value(self, value)
+        if value is None or hasattr(value, "resolve_expression"):
+            return value
+        key = self.dimension.key(value)
+        return 0 if key is None else key  # Keys start at 1: matches no row
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        return value
+
+    def get_db_prep_save(self, value, connection):
+        value = models.Field.get_prep_value(self, value)
+        if value is None or hasattr(value, "resolve_expression"):
+            return value
+        return self.dimension.key(value, create=True)
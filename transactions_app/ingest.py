@@ -0,0 +1,102 @@
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+
+from . import sharding
+from .models import (
+    ID_ALLOCATION_ATTEMPTS,
+    Accounts,
+    Devices,
+    Merchants,
+    Transactions,
+    forget_id_block,
+)
+from .serializer import TransactionsSerializer
+from .signals import transactions_inserted
+
+# Foreign keys checked by the serializer, keyed by the request field name
+RELATED_MODELS = {
+    "AccountID": Accounts,
+    "MerchantID": Merchants,
+    "DeviceID": Devices,
+}
+
+
+def prefetch_related_rows(items):
+    """
+    Fetch every account, merchant and device referenced by ``items``.
+
+    Runs one ``IN`` query per model instead of one query per item and field.
+
+    Returns:
+        dict: {model: {primary key: instance}} as expected by TransactionsSerializer.
+    """
+    ids = {model: set() for model in RELATED_MODELS.values()}
+    for item in items:
+        if not isinstance(item, dict):
+            continue  # Reported by the serializer as an invalid item
+        for field, model in RELATED_MODELS.items():
+            value = item.get(field)
+            if isinstance(value, str):
+                ids[model].add(value)
+
+    return {model: model.objects.in_bulk(list(pks)) for model, pks in ids.items()}
+
+
+def validate_transactions(items):
+    """
+    Validate a batch of transaction payloads.
+
+    Args:
+        items (list): Transaction payloads in the AddTransaction format.
+
+    Returns:
+        tuple: (unsaved Transactions instances, list of {"index", "errors"} dicts)
+    """
+    context = {"prefetched": prefetch_related_rows(items)}
+
+    instances, errors = [], []
+    for index, item in enumerate(items):
+        serializer = TransactionsSerializer(data=item, context=context)
+        if serializer.is_valid():
+            instances.append(Transactions(**serializer.validated_data))
+        else:
+            errors.append({"index": index, "errors": serializer.errors})
+    return instances, errors
+
+
+def insert_transactions(instances):
+    """
+    Insert validated transactions with a single block of TransactionIDs per shard.
+
+    Everything written to a shard is written in one database transaction, so either the
+    whole batch of the shard is stored or none of it is (with one shard, the whole batch).
+    """
+    by_shard = defaultdict(list)
+    for instance in instances:
+        by_shard[sharding.shard_for(instance.AccountID_id)].append(instance)
+
+    created = []
+    for alias, batch in by_shard.items():
+        with sharding.use_shard(alias):
+            created.extend(insert_shard_transactions(batch, alias))
+    return created
+
+
+def insert_shard_transactions(instances, alias):
+    for attempt in range(1, ID_ALLOCATION_ATTEMPTS + 1):
+        # Allocated before the transaction, which would hold the lock of the sequence
+        for instance, transaction_id in zip(
+            instances, Transactions.allocate_ids(len(instances))
+        ):
+            instance.TransactionID = transaction_id
+        try:
+            with transaction.atomic(using=alias):
+                created = Transactions.objects.bulk_create(instances, batch_size=500)
+                transactions_inserted.send(sender=Transactions, transactions=created)
+                return created
+        except IntegrityError:
+            # A taken ID: retry with IDs of a new block
+            forget_id_block()
+            if attempt == ID_ALLOCATION_ATTEMPTS:
+                raise
@@ -0,0 +1,170 @@
+"""
+Per-request database instrumentation.
+
+Every database connection gets an execute wrapper (see Django's
+connection.execute_wrapper) when it connects. While QueryInstrumentationMiddleware handles
+a request, the wrapper adds each query to the request's QueryStats, found through a
+ContextVar: queries run by the threads of sharding.scatter() and by the sync_to_async
+calls of the async views are counted too, on every database.
+
+For each request the middleware sends the figures in a Server-Timing header (total database
+time and query count, slowest query, rendering of the response body and total time),
+which the browser developer tools show, logs them and adds them to the metrics (see
+metrics.py). Queries run while a streaming response is consumed are not counted.
+
+Views may set a ``query_budget``: a request running more queries logs a warning, or raises
+QueryBudgetExceeded when QUERY_BUDGET_RAISE is set (as by the project's test runner).
+"""
+
+import contextvars
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_stats = contextvars.ContextVar("query_stats", default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    """A request ran more queries than the query_budget of its view."""
+
+
+class QueryStats:
+    """Queries and response rendering of one request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0  # seconds
+        self.slowest_sql = None
+        self.slowest_time = 0.0  # seconds
+        self.render_time = 0.0  # seconds
+        self.render_start = None
+        self.lock = threading.Lock()  # Queries may run in several threads
+
+    def add(self, sql, duration):
+        with self.lock:
+            self.queries += 1
+            self.db_time += duration
+            if duration >= self.slowest_time:
+                self.slowest_sql = sql
+                self.slowest_time = duration
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper timing the queries of the current request."""
+    stats = _stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add(sql, time.perf_counter() - start)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def query_budget(request):
+    """query_budget of the view handling a request, or None."""
+    match = getattr(request, "resolver_match", None)
+    view_class = getattr(match.func, "view_class", None) if match else None
+    return getattr(view_class, "query_budget", None)
+
+
+def server_timing(stats, total):
+    entries = [
+        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"',
+        f"db-slowest;dur={stats.slowest_time * 1000:.1f}",
+        f"render;dur={stats.render_time * 1000:.1f}",
+        f"total;dur={total * 1000:.1f}",
+    ]
+    return ", ".join(entries)
+
+
+class QueryInstrumentationMiddleware:
+    """Measures the queries and rendering time of each request (see module docstring)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = QueryStats()
+        start = time.perf_counter()
+        token = _stats.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _stats.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        stats = QueryStats()
+        start = time.perf_counter()
+        token = _stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _stats.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - start)
+
+    def process_template_response(self, request, response):
+        # Called just before a DRF Response is rendered, i.e. serialized into its body
+        stats = _stats.get()
+        if stats is not None:
+            stats.render_start = time.perf_counter()
+
+            def rendered(response):
+                stats.render_time = time.perf_counter() - stats.render_start
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def finish(self, request, response, stats, total):
+        response["Server-Timing"] = server_timing(stats, total)
+        figures = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "queries": stats.queries,
+            "db_ms": round(stats.db_time * 1000, 1),
+            "slowest_ms": round(stats.slowest_time * 1000, 1),
+            "slowest_sql": (stats.slowest_sql or "")[:500],
+            "render_ms": round(stats.render_time * 1000, 1),
+            "total_ms": round(total * 1000, 1),
+        }
+        logger.info(
+            "%(method)s %(path)s %(status)s: %(queries)s queries in %(db_ms)sms "
+            "(slowest %(slowest_ms)sms), rendered in %(render_ms)sms, %(total_ms)sms",
+            figures,
+            extra={"request_stats": figures},
+        )
+        metrics.observe_request(request, response, stats, total)
+        budget = query_budget(request)
+        if budget is not None and stats.queries > budget:
+            message = (
+                f"{request.method} {request.path} ran {stats.queries} queries, over the "
+                f"budget of {budget} of its view"
+            )
+            if settings.QUERY_BUDGET_RAISE:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message, extra={"request_stats": figures})
+        return response
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from transactions_app.archive import archive_before, partition_path
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the transactions dated before a day out of the Transactions table into "
+        "memory-mapped monthly partitions under TRANSACTIONS_ARCHIVE_DIR."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--before",
+            required=True,
+            help="Archive the transactions dated before this day (YYYY-MM-DD).",
+        )
+
+    def handle(self, *args, **options):
+        day = parse_date(options["before"])
+        if day is None:
+            raise CommandError(f"Invalid date: {options['before']}. Expected YYYY-MM-DD.")
+
+        start = time.perf_counter()
+        archived = archive_before(day)
+        for month, count in archived.items():
+            if count:
+                self.stdout.write(f"{month:%Y-%m}: {count} transactions -> {partition_path(month)}")
+        self.stdout.write(
+            f"Archived {sum(archived.values())} transactions in "
+            f"{time.perf_counter() - start:.2f}s"
+        )
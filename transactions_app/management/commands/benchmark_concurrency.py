@@ -0,0 +1,140 @@
+import statistics as st
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.urls import Resolver404, resolve
+from rest_framework.test import APIRequestFactory
+
+from transactions_app.management.commands.benchmark_ingest import (
+    BENCHMARK_ACCOUNT,
+    BENCHMARK_DEVICE,
+    BENCHMARK_MERCHANT,
+    Command as BenchmarkIngest,
+)
+from transactions_app.models import Accounts, Devices, Merchants
+from transactions_app.views import AddTransaction
+
+DEFAULT_PATHS = [
+    "/transactions/spending-insights/AC00002/",
+    "/accounts/high-frequency/",
+    "/merchants/summary/?top=5",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Run add_transaction/ writers and read endpoint clients concurrently for a while "
+        "and report the throughput, latency percentiles and errors of each. Run it with "
+        "SQLITE_PROFILE=0 and 1 (on copies of the database) to compare the SQLite "
+        "profiles. Inserted rows go to a benchmark account deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--writers", type=int, default=4, help="Concurrent add_transaction/ clients."
+        )
+        parser.add_argument(
+            "--readers", type=int, default=8, help="Concurrent read endpoint clients."
+        )
+        parser.add_argument(
+            "--duration", type=float, default=10, help="Seconds the clients run."
+        )
+        parser.add_argument(
+            "--path",
+            action="append",
+            dest="paths",
+            help="Read endpoint path (with query string); repeat to rotate between several.",
+        )
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        reads = []
+        for path in options["paths"] or DEFAULT_PATHS:
+            try:
+                match = resolve(urlsplit(path).path)
+            except Resolver404:
+                raise CommandError(f"No endpoint at {path}.")
+            reads.append((path, match))
+
+        payload = BenchmarkIngest().build_payloads(1)[0]
+        add_transaction = AddTransaction.as_view()
+
+        def write(_):
+            request = factory.post("/add_transaction/", payload, format="json")
+            return add_transaction(request).status_code == 200
+
+        def read(offset):
+            path, match = reads[offset % len(reads)]
+            response = match.func(factory.get(path), *match.args, **match.kwargs)
+            return response.status_code == 200
+
+        self.stdout.write(f"SQLite profile: {self.profile()}")
+        deadline = time.perf_counter() + options["duration"]
+        try:
+            with ThreadPoolExecutor(
+                max_workers=options["writers"] + options["readers"]
+            ) as executor:
+                writers = [
+                    executor.submit(self.client, write, deadline, number)
+                    for number in range(options["writers"])
+                ]
+                readers = [
+                    executor.submit(self.client, read, deadline, number)
+                    for number in range(options["readers"])
+                ]
+                results = {
+                    "writes": [future.result() for future in writers],
+                    "reads": [future.result() for future in readers],
+                }
+        finally:
+            # Deleting the benchmark account cascades to every inserted transaction
+            Accounts.objects.filter(AccountID=BENCHMARK_ACCOUNT).delete()
+            Merchants.objects.filter(MerchantID=BENCHMARK_MERCHANT).delete()
+            Devices.objects.filter(DeviceID=BENCHMARK_DEVICE).delete()
+
+        for name, clients in results.items():
+            latencies = sorted(latency for client, _ in clients for latency in client)
+            errors = sum(client_errors for _, client_errors in clients)
+            if not latencies:
+                self.stdout.write(f"{name:>6}: no successful request, {errors} errors")
+                continue
+            self.stdout.write(
+                f"{name:>6}: {len(latencies)} requests "
+                f"({len(latencies) / options['duration']:,.0f}/s), {errors} errors, "
+                f"latency p50={st.median(latencies) * 1000:.1f}ms "
+                f"p99={latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms "
+                f"max={latencies[-1] * 1000:.1f}ms"
+            )
+
+    def client(self, request, deadline, number):
+        """Call ``request(offset)`` until the deadline; returns (latencies, errors)."""
+        latencies, errors = [], 0
+        offsets = count(number)  # Readers start on different paths
+        try:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    succeeded = request(next(offsets))
+                except Exception:  # e.g. "database is locked"
+                    succeeded = False
+                if succeeded:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+        finally:
+            connections.close_all()  # Each client thread opened its own connections
+        return latencies, errors
+
+    def profile(self):
+        if connection.vendor != "sqlite":
+            return f"not SQLite ({connection.vendor})"
+        with connection.cursor() as cursor:
+            values = []
+            for pragma in ("journal_mode", "synchronous", "busy_timeout"):
+                cursor.execute(f"PRAGMA {pragma}")
+                values.append(f"{pragma}={cursor.fetchone()[0]}")
+        return ", ".join(values)
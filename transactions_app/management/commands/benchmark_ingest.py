@@ -0,0 +1,140 @@
+import json
+import statistics as st
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+
+from transactions_app.models import Accounts, Devices, Merchants
+from transactions_app.views import AddTransaction, BulkAddTransaction
+
+BENCHMARK_ACCOUNT = "AC99999"
+BENCHMARK_MERCHANT = "M999"
+BENCHMARK_DEVICE = "D999999"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure insert throughput of add_transaction/ (direct and write-behind) against "
+        "add_transaction/bulk/. Rows are written to a dedicated benchmark account that is "
+        "deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--count", type=int, default=1000, help="Transactions inserted per mode."
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Transactions sent per bulk request.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="Concurrent clients for the single-item modes.",
+        )
+
+    def handle(self, *args, **options):
+        count = options["count"]
+        concurrency = options["concurrency"]
+
+        payloads = self.build_payloads(count)
+        try:
+            results = [
+                ("single", self.run_single(payloads, concurrency)),
+                ("write-behind", self.run_write_behind(payloads, concurrency)),
+                ("bulk", self.run_bulk(payloads, options["batch_size"])),
+            ]
+        finally:
+            # Deleting the benchmark account cascades to every inserted transaction
+            Accounts.objects.filter(AccountID=BENCHMARK_ACCOUNT).delete()
+            Merchants.objects.filter(MerchantID=BENCHMARK_MERCHANT).delete()
+            Devices.objects.filter(DeviceID=BENCHMARK_DEVICE).delete()
+
+        for mode, (elapsed, latencies) in results:
+            latencies.sort()
+            self.stdout.write(
+                f"{mode:>12}: {count} transactions in {elapsed:.3f}s "
+                f"({count / elapsed:,.0f} transactions/s), request latency "
+                f"p50={st.median(latencies) * 1000:.1f}ms "
+                f"p99={latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms"
+            )
+
+    def build_payloads(self, count):
+        Accounts.objects.get_or_create(AccountID=BENCHMARK_ACCOUNT)
+        Merchants.objects.get_or_create(MerchantID=BENCHMARK_MERCHANT)
+        Devices.objects.get_or_create(DeviceID=BENCHMARK_DEVICE)
+        payload = {
+            "AccountID": BENCHMARK_ACCOUNT,
+            "TransactionDate": "2024-04-11 16:29:14",
+            "TransactionAmount": 100.50,
+            "TransactionType": "Credit",
+            "TransactionDuration": 120,
+            "Location": "New York",
+            "LoginAttempts": 1,
+            "IPAddress": "192.168.1.1",
+            "MerchantID": BENCHMARK_MERCHANT,
+            "Channel": "ATM",
+            "DeviceID": BENCHMARK_DEVICE,
+            "CustomerAge": 30,
+            "CustomerOccupation": "Engineer",
+            "AccountBalance": 4900,
+            "PreviousTransactionDate": "2023-01-01 12:00:00",
+        }
+        return [payload] * count
+
+    def run_single(self, payloads, concurrency):
+        factory = APIRequestFactory()
+        view = AddTransaction.as_view()
+
+        def post(payload):
+            start = time.perf_counter()
+            response = view(factory.post("/add_transaction/", payload, format="json"))
+            if response.status_code != 200:
+                raise RuntimeError(f"add_transaction/ failed: {response.data}")
+            return time.perf_counter() - start
+
+        def worker(chunk):
+            try:
+                return [post(payload) for payload in chunk]
+            finally:
+                connection.close()  # Each worker thread opened its own connection
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            chunks = [payloads[i::concurrency] for i in range(concurrency)]
+            latencies = [
+                latency
+                for chunk_latencies in executor.map(worker, chunks)
+                for latency in chunk_latencies
+            ]
+        return time.perf_counter() - start, latencies
+
+    def run_write_behind(self, payloads, concurrency):
+        with override_settings(TRANSACTIONS_WRITE_BEHIND=True):
+            return self.run_single(payloads, concurrency)
+
+    def run_bulk(self, payloads, batch_size):
+        factory = APIRequestFactory()
+        view = BulkAddTransaction.as_view()
+
+        latencies = []
+        start = time.perf_counter()
+        for offset in range(0, len(payloads), batch_size):
+            request_start = time.perf_counter()
+            request = factory.post(
+                "/add_transaction/bulk/",
+                json.dumps(payloads[offset : offset + batch_size]),
+                content_type="application/json",
+            )
+            response = view(request)
+            if response.status_code != 200 or response.data["errors"]:
+                raise RuntimeError(f"add_transaction/bulk/ failed: {response.data}")
+            latencies.append(time.perf_counter() - request_start)
+        return time.perf_counter() - start, latencies
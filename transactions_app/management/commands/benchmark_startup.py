@@ -0,0 +1,116 @@
+import json
+import os
+import statistics as st
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Modules a web worker should not import until an endpoint needs them
+HEAVY_MODULES = ["pandas", "numpy"]
+
+# Run in a new process: load the WSGI application, then time two requests
+CHILD = """
+import json, sys, time
+started = time.time()
+load_start = time.perf_counter()
+from financial_api.wsgi import application
+load = time.perf_counter() - load_start
+from wsgiref.util import setup_testing_defaults
+
+path, query, host, heavy = sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4:]
+responses = []
+for _ in range(2):
+    environ = {
+        "PATH_INFO": path,
+        "QUERY_STRING": query,
+        "HTTP_HOST": host,
+        "HTTP_X_FORWARDED_PROTO": "https",
+    }
+    setup_testing_defaults(environ)
+    status = []
+    start = time.perf_counter()
+    body = application(environ, lambda code, headers, exc_info=None: status.append(code))
+    b"".join(body)
+    body.close()
+    responses.append((time.perf_counter() - start, status[0], time.time()))
+print(json.dumps({
+    "load": load,
+    "first": responses[0][0],
+    "second": responses[1][0],
+    "status": responses[0][1],
+    "started": started,
+    "responded": responses[0][2],
+    "imported": [name for name in heavy if name in sys.modules],
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Start fresh Python processes that load the WSGI application and call an "
+        "endpoint twice, with the warm-up disabled (WARM_UP=0) and enabled, and report "
+        "the application load time, the latency of the first and second responses, the "
+        "time from process start to the first response and the heavy modules imported."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            default="/transactions/AC00002/",
+            help="Endpoint path (with query string) to request.",
+        )
+        parser.add_argument(
+            "--host",
+            default="financial-api-wdns.onrender.com",
+            help="Host header to send (must be in ALLOWED_HOSTS).",
+        )
+        parser.add_argument(
+            "--runs", type=int, default=5, help="Processes started per mode."
+        )
+
+    def handle(self, *args, **options):
+        url = urlsplit(options["path"])
+        env = {
+            **os.environ,
+            "DJANGO_SETTINGS_MODULE": os.environ.get(
+                "DJANGO_SETTINGS_MODULE", "financial_api.settings"
+            ),
+            # Includes the --pythonpath given to this command
+            "PYTHONPATH": os.pathsep.join(path for path in sys.path if path),
+        }
+        for label, warm_up in (("no warm-up", "0"), ("warm-up", "1")):
+            runs = []
+            for _ in range(options["runs"]):
+                spawned = time.time()
+                process = subprocess.run(
+                    [sys.executable, "-c", CHILD, url.path, url.query, options["host"]]
+                    + HEAVY_MODULES,
+                    cwd=settings.BASE_DIR,
+                    env={**env, "WARM_UP": warm_up},
+                    capture_output=True,
+                    text=True,
+                )
+                if process.returncode != 0:
+                    raise CommandError(
+                        f"The benchmark process failed:\n{process.stderr[-2000:]}"
+                    )
+                run = json.loads(process.stdout.strip().splitlines()[-1])
+                run["total"] = run["responded"] - spawned
+                runs.append(run)
+
+            def median_ms(key):
+                return st.median(run[key] for run in runs) * 1000
+
+            imported = sorted({name for run in runs for name in run["imported"]})
+            self.stdout.write(
+                f"{label:>10}: load={median_ms('load'):.0f}ms "
+                f"first response={median_ms('first'):.1f}ms "
+                f"second response={median_ms('second'):.1f}ms "
+                f"start to first response={median_ms('total'):.0f}ms "
+                f"(status {runs[0]['status']}, median of {len(runs)} runs, "
+                f"imported: {', '.join(imported) or 'none'})"
+            )
@@ -0,0 +1,92 @@
+import statistics as st
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+from django.db.models import Count, Sum
+
+from transactions_app.models import Accounts, Transactions
+from transactions_app.views import SuspiciousTransactions
+
+
+class Command(BaseCommand):
+    help = (
+        "Report the size of the Transactions table and the latency of the aggregates "
+        "that read its amount, channel, type and location columns."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repeat", type=int, default=20, help="Runs per aggregate (median reported)."
+        )
+        parser.add_argument(
+            "--accounts",
+            type=int,
+            default=50,
+            help="Accounts whose fraud statistics are computed per run.",
+        )
+
+    def handle(self, *args, **options):
+        rows = Transactions.objects.count()
+        size = self.table_size(Transactions._meta.db_table)
+        if size is None:
+            self.stdout.write(f"Table size: not supported on {connection.vendor}")
+        else:
+            self.stdout.write(
+                f"Table size: {size / 1024:,.0f} KB for {rows} rows "
+                f"({size / max(rows, 1):.0f} bytes/row)"
+            )
+
+        account_ids = list(
+            Accounts.objects.order_by("AccountID").values_list("AccountID", flat=True)[
+                : options["accounts"]
+            ]
+        )
+        def fraud_statistics():
+            # The rules of flagged_transactions/, without the response serialization
+            for account_id in account_ids:
+                view = SuspiciousTransactions(kwargs={"account_id": account_id})
+                list(view.get_queryset())
+
+        benchmarks = {
+            "merchant totals": lambda: list(
+                Transactions.objects.values("MerchantID").annotate(
+                    total=Sum("TransactionAmount"), count=Count("TransactionID")
+                )
+            ),
+            "channel x type totals": lambda: list(
+                Transactions.objects.values("Channel", "TransactionType").annotate(
+                    total=Sum("TransactionAmount"), balance=Sum("AccountBalance")
+                )
+            ),
+            "location totals": lambda: list(
+                Transactions.objects.values("Location").annotate(
+                    total=Sum("TransactionAmount"), count=Count("TransactionID")
+                )
+            ),
+            f"fraud statistics ({len(account_ids)} accounts)": fraud_statistics,
+        }
+        for name, benchmark in benchmarks.items():
+            timings = []
+            for _ in range(options["repeat"]):
+                start = time.perf_counter()
+                benchmark()
+                timings.append(time.perf_counter() - start)
+            self.stdout.write(
+                f"{name:>30}: median {st.median(timings) * 1000:.2f}ms, "
+                f"min {min(timings) * 1000:.2f}ms"
+            )
+
+    def table_size(self, table):
+        """Bytes used by a table (with its indexes on PostgreSQL), or None if unknown."""
+        with connection.cursor() as cursor:
+            if connection.vendor == "sqlite":
+                try:
+                    cursor.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = %s", [table])
+                except DatabaseError:
+                    return None  # SQLite built without the dbstat virtual table
+            elif connection.vendor == "postgresql":
+                cursor.execute("SELECT pg_total_relation_size(%s)", [table])
+            else:
+                return None
+            return cursor.fetchone()[0]
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions_app.changelog import CONSUMERS, compact, consume
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply the pending entries of the Transactions change log to its consumers "
+        "(e.g. the columnar snapshot), then optionally compact the log."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "consumers",
+            nargs="*",
+            help=f"Consumers to update: {', '.join(sorted(CONSUMERS))} (default: all).",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, help="Changes per batch (default: CHANGELOG_BATCH_SIZE)."
+        )
+        parser.add_argument(
+            "--follow",
+            action="store_true",
+            help="Keep tailing the log instead of stopping once the consumers caught up.",
+        )
+        parser.add_argument(
+            "--interval", type=float, default=1.0, help="Seconds between polls with --follow."
+        )
+        parser.add_argument(
+            "--compact",
+            action="store_true",
+            help="Delete the changes every consumer has applied.",
+        )
+
+    def handle(self, *args, **options):
+        consumers = options["consumers"] or list(CONSUMERS)
+        unknown = set(consumers) - set(CONSUMERS)
+        if unknown:
+            raise CommandError(f"Unknown consumers: {', '.join(sorted(unknown))}")
+        while True:
+            for consumer in consumers:
+                applied = 0
+                while count := consume(consumer, options["batch_size"]):
+                    applied += count
+                if applied:
+                    self.stdout.write(f"{consumer}: applied {applied} changes")
+            if options["compact"]:
+                deleted = compact()
+                if deleted:
+                    self.stdout.write(f"Compacted {deleted} changes")
+            if not options["follow"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from transactions_app import schema
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate the OpenAPI schema of the API and write it as JSON and YAML to "
+        "API_SCHEMA_DIR, where swagger.json and swagger.yaml serve it from. Run it when "
+        "building a release, and again after changing an endpoint."
+    )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        paths = schema.write_schema_files()
+        for path in paths:
+            self.stdout.write(f"Wrote {path} ({path.stat().st_size:,} bytes)")
+        self.stdout.write(f"Generated the schema in {time.perf_counter() - start:.2f}s")
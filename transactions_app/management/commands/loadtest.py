@@ -0,0 +1,130 @@
+import asyncio
+import statistics as st
+import time
+from itertools import cycle
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Send GET requests to a running server from many concurrent keep-alive clients "
+        "and report throughput and latency percentiles. Use it to compare the same "
+        "endpoints served by a WSGI server and an ASGI server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url", default="http://127.0.0.1:8000", help="Base URL of the server."
+        )
+        parser.add_argument(
+            "--path",
+            action="append",
+            dest="paths",
+            help="Path to request; repeat to rotate between several endpoints.",
+        )
+        parser.add_argument(
+            "--host",
+            help="Host header to send (must be in ALLOWED_HOSTS). Defaults to the URL host.",
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=500, help="Concurrent clients."
+        )
+        parser.add_argument(
+            "--requests", type=int, default=10000, help="Total number of requests."
+        )
+
+    def handle(self, *args, **options):
+        url = urlsplit(options["url"])
+        if url.scheme != "http":
+            raise CommandError("Only plain http:// URLs are supported.")
+        paths = options["paths"] or ["/accounts/high-frequency/"]
+
+        latencies, errors, elapsed = asyncio.run(
+            self.run(
+                url.hostname,
+                url.port or 80,
+                options["host"] or url.netloc,
+                paths,
+                options["concurrency"],
+                options["requests"],
+            )
+        )
+
+        if not latencies:
+            raise CommandError(f"All {errors} requests failed.")
+        latencies.sort()
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+        self.stdout.write(
+            f"{len(latencies) + errors} requests, {options['concurrency']} clients, "
+            f"{elapsed:.2f}s: {len(latencies) / elapsed:,.0f} req/s, {errors} errors"
+        )
+        self.stdout.write(
+            f"latency mean={st.mean(latencies) * 1000:.1f}ms "
+            f"p50={percentile(0.50):.1f}ms p95={percentile(0.95):.1f}ms "
+            f"p99={percentile(0.99):.1f}ms max={latencies[-1] * 1000:.1f}ms"
+        )
+
+    async def run(self, address, port, host, paths, concurrency, total):
+        remaining = iter(range(total))
+        next_path = cycle(paths)
+        latencies = []
+        errors = 0
+
+        async def client():
+            nonlocal errors
+            reader = writer = None
+            for _ in remaining:
+                path = next(next_path)
+                start = time.perf_counter()
+                try:
+                    if writer is None:
+                        reader, writer = await asyncio.open_connection(address, port)
+                    status, keep_alive = await self.request(reader, writer, host, path)
+                except (OSError, asyncio.IncompleteReadError, ValueError):
+                    errors += 1
+                    writer = None
+                    continue
+                if status == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+                if not keep_alive:
+                    writer.close()
+                    writer = None
+            if writer is not None:
+                writer.close()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return latencies, errors, time.perf_counter() - start
+
+    async def request(self, reader, writer, host, path):
+        # The X-Forwarded-Proto header avoids the SECURE_SSL_REDIRECT redirect
+        writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: {host}\r\nX-Forwarded-Proto: https\r\n"
+            f"Connection: keep-alive\r\n\r\n".encode()
+        )
+        await writer.drain()
+
+        status_line = await reader.readline()
+        status = int(status_line.split()[1])
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip().lower()
+
+        if "content-length" in headers:
+            await reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding") == "chunked":
+            while size := int((await reader.readline()).strip(), 16):
+                await reader.readexactly(size + 2)
+            await reader.readline()
+        else:
+            await reader.read()  # Body delimited by the server closing the connection
+            return status, False
+        return status, headers.get("connection") != "close"
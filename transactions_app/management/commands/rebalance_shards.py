@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions_app import sharding
+
+
+class Command(BaseCommand):
+    help = (
+        "Move accounts between the shards of TRANSACTIONS_SHARDS: the given accounts to "
+        "--to, or (without accounts) every account whose rows are not on its shard, e.g. "
+        "after adding a shard. Writes to the moved accounts should be paused meanwhile."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("accounts", nargs="*", help="AccountIDs to move.")
+        parser.add_argument("--to", help="Shard the given accounts are moved to.")
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only list the accounts to move."
+        )
+
+    def handle(self, *args, **options):
+        aliases = sharding.shards()
+        accounts, target = options["accounts"], options["to"]
+        if accounts and target not in aliases:
+            raise CommandError(f"--to must be one of: {', '.join(aliases)}.")
+        if target and not accounts:
+            raise CommandError("--to needs the AccountIDs to move.")
+
+        if accounts:
+            moves = [
+                (account_id, sharding.shard_for(account_id), target)
+                for account_id in accounts
+            ]
+        else:
+            moves = sharding.misplaced_accounts()
+
+        for account_id, source, destination in moves:
+            self.stdout.write(f"{account_id}: {source} -> {destination}")
+        if options["dry_run"]:
+            return
+
+        start = time.perf_counter()
+        # Rows created with bulk_create were not copied to the other shards
+        copied = sharding.copy_reference_rows()
+        moved = 0
+        for account_id, source, destination in moves:
+            if source != destination:
+                moved += sharding.move_account(account_id, source, destination)
+            if accounts:
+                sharding.assign_account(account_id, destination)
+        self.stdout.write(
+            f"Copied {copied} reference rows and moved {len(moves)} accounts "
+            f"({moved} rows) in {time.perf_counter() - start:.2f}s"
+        )
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from transactions_app import sharding
+from transactions_app.rollups import REBUILDERS
+
+
+class Command(BaseCommand):
+    help = "Rebuild the pre-aggregated rollups from the Transactions table of every shard."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "rollups",
+            nargs="*",
+            choices=sorted(REBUILDERS),
+            help="Rollups to rebuild (default: all).",
+        )
+
+    def handle(self, *args, **options):
+        for name in options["rollups"] or REBUILDERS:
+            start = time.perf_counter()
+            for alias in sharding.shards():
+                with sharding.use_shard(alias):
+                    REBUILDERS[name]()
+            self.stdout.write(f"Rebuilt {name} in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,398 @@
+"""
+Prometheus metrics of the service, shared by the worker processes.
+
+Each process keeps its values in its own memory-mapped file, ``<pid>.db`` under
+METRICS_DIR: incrementing a counter writes 8 bytes into the page cache, without a system
+call nor any coordination with the other processes. The metrics/ endpoint reads the files
+of every process and adds them up, so whichever worker serves the scrape reports the
+whole service. Counters and histograms of processes that exited are kept, so the totals
+never go down; gauges only count the processes still running.
+
+The threads of a process share its file through a lock. METRICS_DIR should be emptied
+when the service is (re)deployed, like the PROMETHEUS_MULTIPROC_DIR of the official
+Python client. Nothing is recorded while METRICS_DIR is not set: the metrics/ endpoint
+then exposes no samples.
+
+File layout: an 8-byte header holding the number of bytes used, then one entry per value:
+the length of the key (4 bytes), the key (JSON [name, [[label, value], ...]]) padded to
+8 bytes, and the value (a double). New entries are written before the header is updated,
+so a reader never sees a partial entry. A histogram bucket holds the observations of its
+own range, so an observation writes one bucket; buckets are made cumulative when exposed.
+"""
+
+import bisect
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Buckets (upper bounds) of the histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Metric name -> (type, help), in the order they are exposed
+METRICS = {
+    "http_requests_total": (
+        "counter",
+        "Requests handled, by URL name, method and status code.",
+    ),
+    "http_request_errors_total": (
+        "counter",
+        "Requests answered with a server error (5xx), by URL name.",
+    ),
+    "http_request_duration_seconds": (
+        "histogram",
+        "Time to handle a request, by URL name.",
+    ),
+    "db_queries_per_request": (
+        "histogram",
+        "Database queries run by a request, by URL name.",
+    ),
+    "db_query_duration_seconds": (
+        "histogram",
+        "Time a request spent in database queries, by URL name.",
+    ),
+    "cache_requests_total": (
+        "counter",
+        "Lookups of the in-process and Django caches, by cache and result (hit or miss).",
+    ),
+    "cache_hit_ratio": (
+        "gauge",
+        "Share of the lookups of a cache that were hits, since the metrics were reset.",
+    ),
+    "ingest_queue_depth": (
+        "gauge",
+        "Transactions waiting in the write-behind queues to be committed.",
+    ),
+}
+
+HEADER = struct.Struct("q")
+KEY_LENGTH = struct.Struct("i")
+VALUE = struct.Struct("d")
+INITIAL_SIZE = 64 * 1024  # bytes, doubled whenever full
+
+
+def read_entries(data):
+    """(key, value, value position) of each entry of the content of a values file."""
+    used = HEADER.unpack_from(data, 0)[0] if len(data) >= HEADER.size else 0
+    position = HEADER.size
+    while position < used:
+        length = KEY_LENGTH.unpack_from(data, position)[0]
+        key_start = position + KEY_LENGTH.size
+        value_position = key_start + length + (-(KEY_LENGTH.size + length) % 8)
+        key = data[key_start : key_start + length].decode()
+        yield key, VALUE.unpack_from(data, value_position)[0], value_position
+        position = value_position + VALUE.size
+
+
+class ValuesFile:
+    """Values by key in a memory-mapped file, written by a single process."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, "a+b")
+        size = os.fstat(self.file.fileno()).st_size
+        if size < INITIAL_SIZE:
+            self.file.truncate(INITIAL_SIZE)
+            size = INITIAL_SIZE
+        self.map = mmap.mmap(self.file.fileno(), size)
+        self.used = HEADER.unpack_from(self.map, 0)[0] or HEADER.size
+        # Value positions by (name, labels); a file left by an earlier process with the
+        # same pid is carried on
+        self.positions = {}
+        for key, _, position in read_entries(self.map):
+            name, labels = json.loads(key)
+            self.positions[name, tuple(map(tuple, labels))] = position
+        self.histograms = {}  # Value positions of the samples of each histogram series
+        self.lock = threading.Lock()
+
+    def position(self, name, labels):
+        # Called with the lock held
+        position = self.positions.get((name, labels))
+        if position is None:
+            key = json.dumps([name, labels]).encode()
+            padding = -(KEY_LENGTH.size + len(key)) % 8
+            size = KEY_LENGTH.size + len(key) + padding + VALUE.size
+            if self.used + size > len(self.map):
+                self.grow(self.used + size)
+            KEY_LENGTH.pack_into(self.map, self.used, len(key))
+            start = self.used + KEY_LENGTH.size
+            self.map[start : start + len(key)] = key
+            position = start + len(key) + padding
+            VALUE.pack_into(self.map, position, 0.0)
+            self.used += size
+            HEADER.pack_into(self.map, 0, self.used)
+            self.positions[name, labels] = position
+        return position
+
+    def grow(self, needed):
+        size = len(self.map)
+        while size < needed:
+            size *= 2
+        self.map.close()
+        self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), size)
+
+    def add(self, name, labels, amount=1.0):
+        with self.lock:
+            self.add_at(self.position(name, labels), amount)
+
+    def set(self, name, labels, value):
+        with self.lock:
+            VALUE.pack_into(self.map, self.position(name, labels), value)
+
+    def observe(self, name, labels, value, buckets):
+        """Add an observation to the buckets, sum and count of a histogram."""
+        with self.lock:
+            positions = self.histograms.get((name, labels))
+            if positions is None:
+                # Every bucket is created, so a series always has all of them
+                positions = [
+                    self.position(f"{name}_bucket", labels + (("le", str(bound)),))
+                    for bound in buckets
+                ]
+                positions += [
+                    self.position(f"{name}_bucket", labels + (("le", "+Inf"),)),
+                    self.position(f"{name}_count", labels),
+                    self.position(f"{name}_sum", labels),
+                ]
+                self.histograms[name, labels] = positions
+            # Only the bucket of the value: buckets are made cumulative when exposed
+            self.add_at(positions[bisect.bisect_left(buckets, value)], 1)
+            self.add_at(positions[-2], 1)
+            self.add_at(positions[-1], value)
+
+    def add_at(self, position, amount):
+        # Called with the lock held
+        value = VALUE.unpack_from(self.map, position)[0]
+        VALUE.pack_into(self.map, position, value + amount)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+_values = None
+_values_key = None  # (pid, METRICS_DIR) of _values
+_values_lock = threading.Lock()
+_unwritable = None  # (pid, METRICS_DIR) whose file could not be opened
+
+
+def process_values():
+    """
+    ValuesFile of the current process, or None if METRICS_DIR is not set or cannot be
+    written (metrics are then not recorded, and requests are served as usual).
+    """
+    global _values, _values_key, _unwritable
+    if not settings.METRICS_DIR:
+        return None
+    key = (os.getpid(), settings.METRICS_DIR)
+    if key == _values_key:
+        return _values
+    if key == _unwritable:
+        return None
+    with _values_lock:
+        # A new process (forked worker) or METRICS_DIR changed
+        if key != _values_key:
+            if _values is not None:
+                _values.close()
+                _values, _values_key = None, None
+            path = Path(key[1]) / f"{key[0]}.db"
+            try:
+                _values = ValuesFile(path)
+            except OSError:
+                logger.exception("Cannot record the metrics in %s", path)
+                _unwritable = key
+                return None
+            _values_key = key
+        return _values
+
+
+def inc(name, labels=(), amount=1.0):
+    values = process_values()
+    if values is not None:
+        values.add(name, labels, amount)
+
+
+def set_gauge(name, labels, value):
+    values = process_values()
+    if values is not None:
+        values.set(name, labels, value)
+
+
+def observe(name, labels, value, buckets):
+    values = process_values()
+    if values is not None:
+        values.observe(name, labels, value, buckets)
+
+
+class CacheCounter:
+    """
+    Hits and misses of a cache in this process. Caches are looked up once per row, so
+    lookups are counted in memory without a lock (a count lost to a race only skews the
+    ratio) and added to the file of the process after each request.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.published = (0, 0)
+
+
+_cache_counters = {}
+_publish_lock = threading.Lock()
+
+
+def cache_lookup(cache, hit):
+    """Count a lookup of a cache (see the cache_requests_total metric)."""
+    counter = _cache_counters.get(cache)
+    if counter is None:
+        counter = _cache_counters.setdefault(cache, CacheCounter())
+    if hit:
+        counter.hits += 1
+    else:
+        counter.misses += 1
+
+
+def publish_cache_lookups():
+    """Add the cache lookups counted since the last call to the file of the process."""
+    if not _publish_lock.acquire(blocking=False):
+        return  # Another thread is publishing them
+    try:
+        for cache, counter in list(_cache_counters.items()):
+            hits, misses = counter.hits, counter.misses
+            for result, count, published in (
+                ("hit", hits, counter.published[0]),
+                ("miss", misses, counter.published[1]),
+            ):
+                if count > published:
+                    inc(
+                        "cache_requests_total",
+                        (("cache", cache), ("result", result)),
+                        count - published,
+                    )
+            counter.published = (hits, misses)
+    finally:
+        _publish_lock.release()
+
+
+def observe_request(request, response, stats, seconds):
+    """Record a handled request, with the QueryStats measured by instrumentation.py."""
+    match = getattr(request, "resolver_match", None)
+    # URL names only, so unknown paths do not create a series each
+    view = (("view", (match.url_name if match else None) or "unmatched"),)
+    inc(
+        "http_requests_total",
+        view + (("method", request.method), ("status", str(response.status_code))),
+    )
+    if response.status_code >= 500:
+        inc("http_request_errors_total", view)
+    observe("http_request_duration_seconds", view, seconds, LATENCY_BUCKETS)
+    observe("db_queries_per_request", view, stats.queries, QUERY_COUNT_BUCKETS)
+    observe("db_query_duration_seconds", view, stats.db_time, LATENCY_BUCKETS)
+    publish_cache_lookups()
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Running as another user
+    return True
+
+
+def collect():
+    """
+    Values of every process added up.
+
+    Returns:
+        dict: (name, labels) to value.
+    """
+    totals = defaultdict(float)
+    directory = Path(settings.METRICS_DIR) if settings.METRICS_DIR else None
+    for path in directory.glob("*.db") if directory and directory.is_dir() else ():
+        try:
+            pid = int(path.stem)
+            data = path.read_bytes()
+        except (ValueError, OSError):
+            continue
+        alive = None
+        for key, value, _ in read_entries(data):
+            name, labels = json.loads(key)
+            if METRICS.get(name, ("",))[0] == "gauge":
+                if alive is None:
+                    alive = process_alive(pid)
+                if not alive:
+                    continue
+            totals[name, tuple(map(tuple, labels))] += value
+    # Hit ratios from the lookups of all processes
+    lookups = defaultdict(lambda: [0.0, 0.0])
+    for (name, labels), value in list(totals.items()):
+        if name == "cache_requests_total":
+            labels = dict(labels)
+            lookups[labels["cache"]][labels["result"] == "hit"] += value
+    for cache, (misses, hits) in lookups.items():
+        if hits + misses:
+            totals["cache_hit_ratio", (("cache", cache),)] = hits / (hits + misses)
+    return totals
+
+
+def metric_name(name):
+    """Metric a sample belongs to (histogram samples have a _bucket/_sum/_count suffix)."""
+    if name not in METRICS:
+        for suffix in ("_bucket", "_sum", "_count"):
+            if name.endswith(suffix) and name[: -len(suffix)] in METRICS:
+                return name[: -len(suffix)]
+    return name
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (label, str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for label, value in labels
+    )
+    return "{" + ",".join(f'{label}="{value}"' for label, value in escaped) + "}"
+
+
+def sample_order(sample):
+    # Series by series, histogram buckets in increasing order
+    (name, labels), _ = sample
+    le = dict(labels).get("le")
+    other = tuple(pair for pair in labels if pair[0] != "le")
+    return other, name, float(le) if le is not None else 0.0
+
+
+def exposition():
+    """All metrics in the Prometheus text format (version 0.0.4)."""
+    samples = defaultdict(list)
+    for (name, labels), value in collect().items():
+        samples[metric_name(name)].append(((name, labels), value))
+    lines = []
+    for metric, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        series, cumulated = None, 0.0
+        for (name, labels), value in sorted(samples[metric], key=sample_order):
+            if name.endswith("_bucket"):
+                # Files hold the count of each bucket alone; exposed buckets count every
+                # observation up to their bound
+                other = [pair for pair in labels if pair[0] != "le"]
+                if other != series:
+                    series, cumulated = other, 0.0
+                cumulated += value
+                value = cumulated
+            lines.append(f"{name}{format_labels(labels)} {value!r}")
+    return "\n".join(lines) + "\n"
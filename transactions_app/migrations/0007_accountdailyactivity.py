@@ -0,0 +1,87 @@
+# Generated by Django 5.1.4 on 2026-10-18 22:42
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_account_activity(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Transactions = apps.get_model("transactions_app", "Transactions")
+    AccountDailyActivity = apps.get_model("transactions_app", "AccountDailyActivity")
+    AccountDailyActivity.objects.using(db).bulk_create(
+        (
+            AccountDailyActivity(
+                AccountID_id=row["AccountID"], Day=row["day"], TransactionCount=row["count"]
+            )
+            for row in Transactions.objects.using(db).annotate(day=TruncDate("TransactionDate"))
+            .values("AccountID", "day")
+            .annotate(count=Count("TransactionID"))
+            .order_by()
+            .iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions_app', '0006_alter_transactions_accountbalance_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transactions',
+            name='AccountBalance',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='transactions',
+            name='Channel',
+            field=models.CharField(choices=[('ATM', 'ATM'), ('Online', 'Online'), ('Branch', 'Branch')], max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='transactions',
+            name='CustomerAge',
+            field=models.IntegerField(default=15, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='transactions',
+            name='LoginAttempts',
+            field=models.IntegerField(validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='transactions',
+            name='TransactionAmount',
+            field=models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='transactions',
+            name='TransactionDuration',
+            field=models.IntegerField(validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='transactions',
+            name='TransactionType',
+            field=models.CharField(choices=[('Credit', 'Credit'), ('Debit', 'Debit')], max_length=10),
+        ),
+        migrations.CreateModel(
+            name='AccountDailyActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Day', models.DateField()),
+                ('TransactionCount', models.PositiveIntegerField(default=0)),
+                ('UpdatedAt', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('AccountID', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='transactions_app.accounts')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['Day', 'AccountID', 'TransactionCount'], name='activity_day_account_idx')],
+                'constraints': [models.UniqueConstraint(fields=('AccountID', 'Day'), name='unique_account_day_activity')],
+            },
+        ),
+        migrations.RunPython(backfill_account_activity, migrations.RunPython.noop),
+    ]
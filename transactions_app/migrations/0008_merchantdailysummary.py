@@ -0,0 +1,53 @@
+# Generated by Django 5.1.4 on 2026-10-18 22:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_merchant_summary(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Transactions = apps.get_model("transactions_app", "Transactions")
+    MerchantDailySummary = apps.get_model("transactions_app", "MerchantDailySummary")
+    MerchantDailySummary.objects.using(db).bulk_create(
+        (
+            MerchantDailySummary(
+                MerchantID_id=row["MerchantID"],
+                Day=row["day"],
+                TransactionCount=row["count"],
+                TotalAmount=row["amount"],
+            )
+            for row in Transactions.objects.using(db).annotate(day=TruncDate("TransactionDate"))
+            .values("MerchantID", "day")
+            .annotate(count=Count("TransactionID"), amount=Sum("TransactionAmount"))
+            .order_by()
+            .iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions_app', '0007_accountdailyactivity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MerchantDailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Day', models.DateField()),
+                ('TransactionCount', models.PositiveIntegerField(default=0)),
+                ('TotalAmount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('MerchantID', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='transactions_app.merchants')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['Day', 'MerchantID'], name='merchant_summary_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('MerchantID', 'Day'), name='unique_merchant_day_summary')],
+            },
+        ),
+        migrations.RunPython(backfill_merchant_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.1.4 on 2026-10-18 22:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay, TruncHour, TruncMonth
+
+
+def backfill_timeseries(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Transactions = apps.get_model("transactions_app", "Transactions")
+    for model_name, key_field in (
+        ("AccountTimeSeries", "AccountID"),
+        ("MerchantTimeSeries", "MerchantID"),
+    ):
+        model = apps.get_model("transactions_app", model_name)
+        source, date_field = Transactions.objects.using(db), "TransactionDate"
+        count, amount = Count("TransactionID"), Sum("TransactionAmount")
+        for granularity, trunc in (("hour", TruncHour), ("day", TruncDay), ("month", TruncMonth)):
+            rows = (
+                source.annotate(start=trunc(date_field))
+                .values(key_field, "start", "TransactionType", "Channel")
+                .annotate(count=count, amount=amount)
+                .order_by()
+                .iterator()
+            )
+            model.objects.using(db).bulk_create(
+                (
+                    model(
+                        **{f"{key_field}_id": row[key_field]},
+                        Granularity=granularity,
+                        Start=row["start"],
+                        TransactionType=row["TransactionType"],
+                        Channel=row["Channel"],
+                        TransactionCount=row["count"],
+                        TotalAmount=row["amount"],
+                    )
+                    for row in rows
+                ),
+                batch_size=1000,
+            )
+            source, date_field = model.objects.using(db).filter(Granularity=granularity), "Start"
+            count, amount = Sum("TransactionCount"), Sum("TotalAmount")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions_app', '0008_merchantdailysummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountTimeSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Granularity', models.CharField(choices=[('hour', 'hour'), ('day', 'day'), ('month', 'month')], max_length=5)),
+                ('Start', models.DateTimeField()),
+                ('TransactionType', models.CharField(max_length=10)),
+                ('Channel', models.CharField(max_length=50)),
+                ('TransactionCount', models.PositiveIntegerField(default=0)),
+                ('TotalAmount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('AccountID', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='transactions_app.accounts')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('AccountID', 'Granularity', 'Start', 'TransactionType', 'Channel'), name='unique_account_timeseries_bucket')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MerchantTimeSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Granularity', models.CharField(choices=[('hour', 'hour'), ('day', 'day'), ('month', 'month')], max_length=5)),
+                ('Start', models.DateTimeField()),
+                ('TransactionType', models.CharField(max_length=10)),
+                ('Channel', models.CharField(max_length=50)),
+                ('TransactionCount', models.PositiveIntegerField(default=0)),
+                ('TotalAmount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('MerchantID', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='transactions_app.merchants')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('MerchantID', 'Granularity', 'Start', 'TransactionType', 'Channel'), name='unique_merchant_timeseries_bucket')],
+            },
+        ),
+        migrations.RunPython(backfill_timeseries, migrations.RunPython.noop),
+    ]
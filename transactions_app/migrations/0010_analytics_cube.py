@@ -0,0 +1,120 @@
+# Generated by Django 5.1.4 on 2026-10-18 22:57
+
+from bisect import bisect_right
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+AGE_BANDS = (0, 18, 25, 35, 45, 55, 65)
+CODED_FIELDS = {
+    "channel": "Channel",
+    "location": "Location",
+    "transaction_type": "TransactionType",
+    "occupation": "CustomerOccupation",
+}
+
+
+def backfill_analytics_cube(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Transactions = apps.get_model("transactions_app", "Transactions")
+    CubeDimensionValue = apps.get_model("transactions_app", "CubeDimensionValue")
+    TransactionCube = apps.get_model("transactions_app", "TransactionCube")
+
+    rows = list(
+        Transactions.objects.using(db).annotate(day=TruncDate("TransactionDate"))
+        .values("day", "CustomerAge", *CODED_FIELDS.values())
+        .annotate(
+            count=Count("TransactionID"),
+            amount=Sum("TransactionAmount"),
+            squares=Sum(F("TransactionAmount") * F("TransactionAmount")),
+        )
+        .order_by()
+    )
+    pairs = {
+        (dimension, row[field]) for row in rows for dimension, field in CODED_FIELDS.items()
+    }
+    CubeDimensionValue.objects.using(db).bulk_create(
+        [CubeDimensionValue(Dimension=d, Value=v) for d, v in pairs],
+        ignore_conflicts=True,
+    )
+    codes = {
+        (dimension, value): code
+        for dimension, value, code in CubeDimensionValue.objects.using(db).values_list(
+            "Dimension", "Value", "id"
+        )
+    }
+
+    totals = defaultdict(lambda: [0, 0, 0.0])
+    for row in rows:
+        key = (
+            row["day"],
+            *(codes[(d, row[field])] for d, field in CODED_FIELDS.items()),
+            max(0, bisect_right(AGE_BANDS, row["CustomerAge"]) - 1),
+        )
+        totals[key][0] += row["count"]
+        totals[key][1] += int(row["amount"] * 100)
+        totals[key][2] += float(row["squares"])
+
+    TransactionCube.objects.using(db).bulk_create(
+        (
+            TransactionCube(
+                Day=day,
+                Channel=channel,
+                Location=location,
+                TransactionType=transaction_type,
+                Occupation=occupation,
+                AgeBand=band,
+                TransactionCount=count,
+                AmountCents=cents,
+                AmountSquares=squares,
+            )
+            for (day, channel, location, transaction_type, occupation, band), (
+                count,
+                cents,
+                squares,
+            ) in totals.items()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions_app', '0009_timeseries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CubeDimensionValue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Dimension', models.CharField(max_length=20)),
+                ('Value', models.CharField(max_length=50)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('Dimension', 'Value'), name='unique_cube_dimension_value')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TransactionCube',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Day', models.DateField()),
+                ('Channel', models.PositiveIntegerField()),
+                ('Location', models.PositiveIntegerField()),
+                ('TransactionType', models.PositiveIntegerField()),
+                ('Occupation', models.PositiveIntegerField()),
+                ('AgeBand', models.PositiveSmallIntegerField()),
+                ('TransactionCount', models.PositiveIntegerField(default=0)),
+                ('AmountCents', models.BigIntegerField(default=0)),
+                ('AmountSquares', models.FloatField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('Day', 'Channel', 'Location', 'TransactionType', 'Occupation', 'AgeBand'), name='unique_transaction_cube_cell')],
+            },
+        ),
+        migrations.RunPython(backfill_analytics_cube, migrations.RunPython.noop),
+    ]
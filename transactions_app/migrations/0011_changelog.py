@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 23:04
+
+import django.core.serializers.json
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions_app', '0010_analytics_cube'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeCursor',
+            fields=[
+                ('Consumer', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('Sequence', models.BigIntegerField(default=0)),
+                ('UpdatedAt', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TransactionChange',
+            fields=[
+                ('Sequence', models.BigAutoField(primary_key=True, serialize=False)),
+                ('TransactionID', models.CharField(max_length=10)),
+                ('Operation', models.CharField(choices=[('insert', 'insert'), ('update', 'update'), ('delete', 'delete')], max_length=6)),
+                ('Data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('CreatedAt', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
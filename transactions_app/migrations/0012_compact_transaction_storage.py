@@ -0,0 +1,149 @@
+# Generated by Django 5.1.4 on 2026-10-18 23:23
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Round
+
+import transactions_app.fields
+
+# Amount columns moved to cents, and the codes of the enum columns
+AMOUNTS = ("TransactionAmount", "AccountBalance")
+CODES = {
+    "TransactionType": {"Credit": 1, "Debit": 2},
+    "Channel": {"ATM": 1, "Branch": 2, "Online": 3},
+}
+
+
+def encode(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Transactions = apps.get_model("transactions_app", "Transactions")
+    Transactions.objects.using(db).update(
+        **{f"{name}Cents": Round(F(name) * 100) for name in AMOUNTS},
+        **{
+            f"{name}Code": Case(
+                *(When(**{name: value}, then=Value(code)) for value, code in codes.items())
+            )
+            for name, codes in CODES.items()
+        },
+    )
+
+
+def decode(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Transactions = apps.get_model("transactions_app", "Transactions")
+    Transactions.objects.using(db).update(
+        **{
+            name: models.ExpressionWrapper(
+                F(f"{name}Cents") / Value(100.0), output_field=models.DecimalField()
+            )
+            for name in AMOUNTS
+        },
+        **{
+            name: Case(
+                *(
+                    When(**{f"{name}Code": code}, then=Value(value))
+                    for value, code in codes.items()
+                )
+            )
+            for name, codes in CODES.items()
+        },
+    )
+
+
+class Migration(migrations.Migration):
+    # The new columns are added and filled before they replace the old ones, so the
+    # conversion never depends on how a database casts a column in place
+
+    dependencies = [
+        ('transactions_app', '0011_changelog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transactions',
+            name='TransactionAmountCents',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='transactions',
+            name='AccountBalanceCents',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='transactions',
+            name='TransactionTypeCode',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='transactions',
+            name='ChannelCode',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        # Nullable, so that reversing the RemoveFields below can add them back
+        migrations.AlterField(
+            model_name='transactions',
+            name='TransactionAmount',
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='transactions',
+            name='AccountBalance',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, null=True, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='transactions',
+            name='TransactionType',
+            field=models.CharField(choices=[('Credit', 'Credit'), ('Debit', 'Debit')], max_length=10, null=True),
+        ),
+        migrations.AlterField(
+            model_name='transactions',
+            name='Channel',
+            field=models.CharField(choices=[('ATM', 'ATM'), ('Online', 'Online'), ('Branch', 'Branch')], max_length=50, null=True),
+        ),
+        migrations.RunPython(encode, decode),
+        migrations.RemoveField(model_name='transactions', name='TransactionAmount'),
+        migrations.RemoveField(model_name='transactions', name='AccountBalance'),
+        migrations.RemoveField(model_name='transactions', name='TransactionType'),
+        migrations.RemoveField(model_name='transactions', name='Channel'),
+        migrations.RenameField(
+            model_name='transactions',
+            old_name='TransactionAmountCents',
+            new_name='TransactionAmount',
+        ),
+        migrations.RenameField(
+            model_name='transactions',
+            old_name='AccountBalanceCents',
+            new_name='AccountBalance',
+        ),
+        migrations.RenameField(
+            model_name='transactions',
+            old_name='TransactionTypeCode',
+            new_name='TransactionType',
+        ),
+        migrations.RenameField(
+            model_name='transactions',
+            old_name='ChannelCode',
+            new_name='Channel',
+        ),
+        migrations.AlterField(
+            model_name='transactions',
+            name='TransactionAmount',
+            field=transactions_app.fields.CentsField(validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='transactions',
+            name='AccountBalance',
+            field=transactions_app.fields.CentsField(default=0, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='transactions',
+            name='TransactionType',
+            field=transactions_app.fields.EnumCodeField(choices=[('Credit', 'Credit'), ('Debit', 'Debit')], codes={'Credit': 1, 'Debit': 2}),
+        ),
+        migrations.AlterField(
+            model_name='transactions',
+            name='Channel',
+            field=transactions_app.fields.EnumCodeField(choices=[('ATM', 'ATM'), ('Branch', 'Branch'), ('Online', 'Online')], codes={'ATM': 1, 'Branch': 2, 'Online': 3}),
+        ),
+    ]
@@ -0,0 +1,109 @@
+# Generated by Django 5.1.4 on 2026-10-18 23:41
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+import transactions_app.fields
+
+# Transactions columns moved to a dimension table, and their table
+DIMENSIONS = {"Location": "Locations", "CustomerOccupation": "Occupations"}
+
+
+def encode(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Transactions = apps.get_model("transactions_app", "Transactions")
+    for name, model_name in DIMENSIONS.items():
+        Dimension = apps.get_model("transactions_app", model_name)
+        # Keys in alphabetical order, so ordering by key orders the existing names
+        names = sorted(set(Transactions.objects.using(db).values_list(name, flat=True)))
+        Dimension.objects.using(db).bulk_create([Dimension(Name=value) for value in names])
+        Transactions.objects.using(db).update(
+            **{
+                f"{name}Key": Subquery(
+                    Dimension.objects.using(db).filter(Name=OuterRef(name)).values("pk")[:1]
+                )
+            }
+        )
+
+
+def decode(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Transactions = apps.get_model("transactions_app", "Transactions")
+    for name, model_name in DIMENSIONS.items():
+        Dimension = apps.get_model("transactions_app", model_name)
+        Transactions.objects.using(db).update(
+            **{
+                name: Subquery(
+                    Dimension.objects.using(db).filter(pk=OuterRef(f"{name}Key")).values("Name")[:1]
+                )
+            }
+        )
+
+
+class Migration(migrations.Migration):
+    # Same steps as 0012: the key columns are filled before they replace the names
+
+    dependencies = [
+        ('transactions_app', '0012_compact_transaction_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Locations',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Name', models.CharField(max_length=50, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Occupations',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Name', models.CharField(max_length=50, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='transactions',
+            name='LocationKey',
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='transactions',
+            name='CustomerOccupationKey',
+            field=models.PositiveIntegerField(null=True),
+        ),
+        # Nullable, so that reversing the RemoveFields below can add them back
+        migrations.AlterField(
+            model_name='transactions',
+            name='Location',
+            field=models.CharField(max_length=50, null=True),
+        ),
+        migrations.AlterField(
+            model_name='transactions',
+            name='CustomerOccupation',
+            field=models.CharField(default='Other', max_length=50, null=True),
+        ),
+        migrations.RunPython(encode, decode),
+        migrations.RemoveField(model_name='transactions', name='Location'),
+        migrations.RemoveField(model_name='transactions', name='CustomerOccupation'),
+        migrations.RenameField(
+            model_name='transactions',
+            old_name='LocationKey',
+            new_name='Location',
+        ),
+        migrations.RenameField(
+            model_name='transactions',
+            old_name='CustomerOccupationKey',
+            new_name='CustomerOccupation',
+        ),
+        migrations.AlterField(
+            model_name='transactions',
+            name='Location',
+            field=transactions_app.fields.DimensionField(to='transactions_app.Locations'),
+        ),
+        migrations.AlterField(
+            model_name='transactions',
+            name='CustomerOccupation',
+            field=transactions_app.fields.DimensionField(default='Other', to='transactions_app.Occupations'),
+        ),
+    ]
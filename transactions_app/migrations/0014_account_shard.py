@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-18 23:45
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions_app', '0013_dimension_tables'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountShard',
+            fields=[
+                ('AccountID', models.CharField(max_length=10, primary_key=True, serialize=False)),
+                ('Shard', models.CharField(max_length=50)),
+                ('UpdatedAt', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
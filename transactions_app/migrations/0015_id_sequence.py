@@ -0,0 +1,20 @@
+# Generated by Django 5.1.4 on 2026-10-19 01:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions_app', '0014_account_shard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IDSequence',
+            fields=[
+                ('Name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('LastValue', models.BigIntegerField()),
+            ],
+        ),
+    ]
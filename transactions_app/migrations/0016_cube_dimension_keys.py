@@ -0,0 +1,121 @@
+# Generated by Django 5.1.4 on 2026-10-19 01:27
+
+from django.db import migrations
+from django.db.models import F
+
+import transactions_app.fields
+
+# TransactionCube columns coded with CubeDimensionValue, and their dimension there
+DIMENSIONS = {
+    "Channel": "channel",
+    "Location": "location",
+    "TransactionType": "transaction_type",
+    "Occupation": "occupation",
+}
+# New codes of the EnumCodeField columns
+ENUM_CODES = {
+    "Channel": {"ATM": 1, "Branch": 2, "Online": 3},
+    "TransactionType": {"Credit": 1, "Debit": 2},
+}
+# Dimension tables of the DimensionField columns
+DIMENSION_TABLES = {"Location": "Locations", "Occupation": "Occupations"}
+# Added to every code before it is replaced, so that no cell takes the old code of another
+OFFSET = 2**30
+
+
+def new_codes(apps, db, field, names):
+    """Codes of the new column for names, as {name: code}."""
+    if field in ENUM_CODES:
+        return ENUM_CODES[field]
+    Dimension = apps.get_model("transactions_app", DIMENSION_TABLES[field])
+    Dimension.objects.using(db).bulk_create(
+        [Dimension(Name=name) for name in names], ignore_conflicts=True
+    )
+    return dict(Dimension.objects.using(db).values_list("Name", "pk"))
+
+
+def recode(cells, field, codes):
+    """Replace the ``field`` codes of the cells, given as {old code: new code}."""
+    cells.update(**{field: F(field) + OFFSET})
+    for old, new in codes.items():
+        cells.filter(**{field: old + OFFSET}).update(**{field: new})
+    # Codes unknown to this database (e.g. the cells of a shard, coded on "default") are
+    # dropped: rebuild_rollups analytics_cube recomputes them from the table
+    cells.filter(**{f"{field}__gte": OFFSET}).delete()
+
+
+def to_dimension_keys(apps, schema_editor):
+    db = schema_editor.connection.alias
+    TransactionCube = apps.get_model("transactions_app", "TransactionCube")
+    CubeDimensionValue = apps.get_model("transactions_app", "CubeDimensionValue")
+    for field, dimension in DIMENSIONS.items():
+        names = dict(
+            CubeDimensionValue.objects.using(db)
+            .filter(Dimension=dimension)
+            .values_list("id", "Value")
+        )
+        codes = new_codes(apps, db, field, names.values())
+        recode(
+            TransactionCube.objects.using(db),
+            field,
+            {old: codes[name] for old, name in names.items() if name in codes},
+        )
+
+
+def to_cube_codes(apps, schema_editor):
+    db = schema_editor.connection.alias
+    TransactionCube = apps.get_model("transactions_app", "TransactionCube")
+    CubeDimensionValue = apps.get_model("transactions_app", "CubeDimensionValue")
+    for field, dimension in DIMENSIONS.items():
+        names = {
+            code: name for name, code in new_codes(apps, db, field, []).items()
+        }
+        CubeDimensionValue.objects.using(db).bulk_create(
+            [CubeDimensionValue(Dimension=dimension, Value=name) for name in names.values()],
+            ignore_conflicts=True,
+        )
+        codes = dict(
+            CubeDimensionValue.objects.using(db)
+            .filter(Dimension=dimension)
+            .values_list("Value", "id")
+        )
+        recode(
+            TransactionCube.objects.using(db),
+            field,
+            {new: codes[name] for new, name in names.items()},
+        )
+
+
+class Migration(migrations.Migration):
+    # The cells are recoded while the columns are still plain integers
+
+    dependencies = [
+        ('transactions_app', '0015_id_sequence'),
+    ]
+
+    operations = [
+        migrations.RunPython(to_dimension_keys, to_cube_codes),
+        migrations.DeleteModel(
+            name='CubeDimensionValue',
+        ),
+        migrations.AlterField(
+            model_name='transactioncube',
+            name='Channel',
+            field=transactions_app.fields.EnumCodeField(choices=[('ATM', 'ATM'), ('Branch', 'Branch'), ('Online', 'Online')], codes={'ATM': 1, 'Branch': 2, 'Online': 3}),
+        ),
+        migrations.AlterField(
+            model_name='transactioncube',
+            name='Location',
+            field=transactions_app.fields.DimensionField(to='transactions_app.Locations'),
+        ),
+        migrations.AlterField(
+            model_name='transactioncube',
+            name='Occupation',
+            field=transactions_app.fields.DimensionField(to='transactions_app.Occupations'),
+        ),
+        migrations.AlterField(
+            model_name='transactioncube',
+            name='TransactionType',
+            field=transactions_app.fields.EnumCodeField(choices=[('Credit', 'Credit'), ('Debit', 'Debit')], codes={'Credit': 1, 'Debit': 2}),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.4 on 2026-10-19 03:12
+
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Round
+
+
+def to_cents(apps, schema_editor):
+    TransactionCube = apps.get_model("transactions_app", "TransactionCube")
+    TransactionCube.objects.using(schema_editor.connection.alias).update(
+        AmountSquares=Round(F("AmountSquares") * 10000)
+    )
+
+
+def to_amounts(apps, schema_editor):
+    TransactionCube = apps.get_model("transactions_app", "TransactionCube")
+    TransactionCube.objects.using(schema_editor.connection.alias).update(
+        AmountSquares=F("AmountSquares") / 10000.0
+    )
+
+
+class Migration(migrations.Migration):
+    # Squares are converted to cents² while the column is still a float
+
+    dependencies = [
+        ('transactions_app', '0016_cube_dimension_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(to_cents, to_amounts),
+        migrations.AlterField(
+            model_name='transactioncube',
+            name='AmountSquares',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
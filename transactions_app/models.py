@@ -1,20 +1,44 @@
+import os
+import threading
+
 from django.utils import timezone
 
-from django.db import models  # type: ignore
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, models, transaction  # type: ignore
 from django.core.validators import MinValueValidator  # type: ignore
 
+from . import sharding
+from .fields import CentsField, DimensionField, EnumCodeField
+
+# Attempts made when the TransactionID allocated for a new row is taken, e.g. by a row
+# loaded with its own ID
+ID_ALLOCATION_ATTEMPTS = 10
+
+# TransactionID numbers reserved by this process and not used yet, as [next, end)
+_id_block = [0, 0]
+_id_block_lock = threading.Lock()
+
+
+def forget_id_block():
+    """Drop the unused TransactionIDs of the process: the next allocation reserves a block."""
+    with _id_block_lock:
+        _id_block[:] = [0, 0]
+
+
+# A forked process must not use the IDs of its parent's block
+os.register_at_fork(after_in_child=forget_id_block)
+
 
 # Transactions model
 class Transactions(models.Model):
     TransactionID = models.CharField(max_length=10, unique=True, primary_key=True)
     AccountID = models.ForeignKey("Accounts", on_delete=models.CASCADE)
-    TransactionAmount = models.DecimalField(
-        max_digits=10, decimal_places=2, validators=[MinValueValidator(0)]
-    )  # amount cannot be negative
+    TransactionAmount = CentsField(
+        validators=[MinValueValidator(0)]
+    )  # amount cannot be negative, stored in cents
     TransactionDate = models.DateTimeField(default=timezone.now)
-    TransactionType = models.CharField(
-        max_length=10, choices=[("Credit", "Credit"), ("Debit", "Debit")]
-    )
+    TransactionType = EnumCodeField(codes={"Credit": 1, "Debit": 2})
     TransactionDuration = models.IntegerField(
         validators=[MinValueValidator(0)]
     )  # duration cannot be negative
@@ -25,34 +49,88 @@ class Transactions(models.Model):
     CustomerAge = models.IntegerField(
         validators=[MinValueValidator(0)], default=15
     )  # age cannot be negative
-    CustomerOccupation = models.CharField(max_length=50, default="Other")
-    AccountBalance = models.DecimalField(
-        max_digits=10, decimal_places=2, default=0, validators=[MinValueValidator(0)]
-    )  # balance cannot be negative
+    CustomerOccupation = DimensionField(
+        to="transactions_app.Occupations", default="Other"
+    )  # stored as an Occupations key
+    AccountBalance = CentsField(
+        default=0, validators=[MinValueValidator(0)]
+    )  # balance cannot be negative, stored in cents
     PreviousTransactionDate = models.DateTimeField(default=timezone.now)
-    Location = models.CharField(max_length=50, null=False, blank=False)
+    Location = DimensionField(to="transactions_app.Locations")  # stored as a Locations key
 
     IPAddress = models.GenericIPAddressField(default="0.0.0.0", null=False, blank=False)
 
     MerchantID = models.ForeignKey("Merchants", on_delete=models.CASCADE)
 
-    Channel = models.CharField(
-        max_length=50, choices=[("ATM", "ATM"), ("Online", "Online"), ("Branch", "Branch")]
-    )
+    Channel = EnumCodeField(codes={"ATM": 1, "Branch": 2, "Online": 3})
     DeviceID = models.ForeignKey("Devices", on_delete=models.CASCADE)
 
+    @classmethod
+    def allocate_ids(cls, count):
+        """
+        Allocate ``count`` consecutive TransactionIDs, unique across shards and processes.
+
+        They are taken from a block of numbers reserved by the process in the IDSequence
+        table (TRANSACTION_ID_BLOCK_SIZE numbers, or ``count`` if more), so most
+        allocations run no query. IDs increase within a process, but not across processes.
+        """
+        with _id_block_lock:
+            if _id_block[1] - _id_block[0] < count:
+                _id_block[:] = IDSequence.reserve(
+                    "TransactionID",
+                    max(count, settings.TRANSACTION_ID_BLOCK_SIZE),
+                    initial=cls.last_id_number,
+                )
+            start = _id_block[0]
+            _id_block[0] += count
+        return [f"TX{number:06d}" for number in range(start, start + count)]
+
+    @classmethod
+    def last_id_number(cls):
+        """Highest TransactionID number on any shard (one query per shard), or 0."""
+        last_ids = sharding.scatter(
+            lambda: cls.objects.order_by("-TransactionID")
+            .values_list("TransactionID", flat=True)
+            .first()
+        )
+        # Extract the numeric part
+        return max((int(last_id[2:]) for last_id in last_ids if last_id), default=0)
+
+    @property
+    def transaction_datetime(self):
+        """TransactionDate as an aware datetime, even if it was assigned as a string."""
+        value = self._meta.get_field("TransactionDate").to_python(self.TransactionDate)
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value
+
     def save(self, *args, **kwargs):
-        if not self.TransactionID:
-            last_transaction = Transactions.objects.order_by("-TransactionID").first()
-            if last_transaction:
-                last_id = int(
-                    last_transaction.TransactionID[2:]
-                )  # Extract the numeric part
-                new_id = f"TX{last_id + 1:06d}"  # Increment and format
-            else:
-                new_id = "TX000001"  # Start the sequence
-            self.TransactionID = new_id
-        super().save(*args, **kwargs)
+        # Always on the shard of the account, with the receivers' queries (see sharding.py)
+        kwargs["using"] = sharding.shard_for(self.AccountID_id)
+        with sharding.use_shard(kwargs["using"]):
+            if self.TransactionID:
+                # Atomic so that the post_save receivers (change log, rollups) commit with it
+                with transaction.atomic(using=kwargs["using"]):
+                    return super().save(*args, **kwargs)
+
+            # Force an INSERT so that a row already holding the ID makes this save fail
+            # (instead of overwriting the row) and retry with an ID of a new block
+            kwargs["force_insert"] = True
+            for attempt in range(1, ID_ALLOCATION_ATTEMPTS + 1):
+                self.TransactionID = Transactions.allocate_ids(1)[0]
+                try:
+                    with transaction.atomic(using=kwargs["using"]):
+                        return super().save(*args, **kwargs)
+                except IntegrityError:
+                    self.TransactionID = None
+                    forget_id_block()
+                    if attempt == ID_ALLOCATION_ATTEMPTS:
+                        raise
+
+    def delete(self, *args, **kwargs):
+        kwargs.setdefault("using", self._state.db or sharding.shard_for(self.AccountID_id))
+        with sharding.use_shard(kwargs["using"]):
+            return super().delete(*args, **kwargs)
 
 
 # Accounts model
@@ -111,3 +189,217 @@ class Devices(models.Model):
     def __str__(self):
         return self.DeviceID
 
+
+# Last number reserved of each sequence of IDs, e.g. of the TransactionIDs. Stored on
+# "default", for every shard
+class IDSequence(models.Model):
+    Name = models.CharField(max_length=50, primary_key=True)
+    LastValue = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.Name} {self.LastValue}"
+
+    @classmethod
+    def reserve(cls, name, count, initial):
+        """
+        Reserve the next ``count`` numbers of a sequence. A missing sequence is created
+        after the number returned by ``initial()``.
+
+        Returns:
+            list: [first number, last number + 1]
+        """
+        sequences = cls.objects.using(DEFAULT_DB_ALIAS)
+        # The UPDATE locks the row until the commit, so reservations never overlap
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            if not sequences.filter(Name=name).update(
+                LastValue=models.F("LastValue") + count
+            ):
+                try:
+                    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                        sequences.create(Name=name, LastValue=initial() + count)
+                except IntegrityError:  # Created meanwhile by another process
+                    sequences.filter(Name=name).update(
+                        LastValue=models.F("LastValue") + count
+                    )
+            last = sequences.values_list("LastValue", flat=True).get(Name=name)
+        return [last - count + 1, last + 1]
+
+
+# Shard of the accounts moved off the shard their AccountID hashes to, written by the
+# rebalance_shards command (see sharding.py). Stored on "default"
+class AccountShard(models.Model):
+    AccountID = models.CharField(max_length=10, primary_key=True)
+    Shard = models.CharField(max_length=50)
+    UpdatedAt = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.AccountID} {self.Shard}"
+
+
+# Dimension tables of the DimensionField columns of Transactions: each name is stored once
+# and transactions hold its integer key (see dimensions.py)
+class Locations(models.Model):
+    Name = models.CharField(max_length=50, unique=True)
+
+    def __str__(self):
+        return self.Name
+
+
+class Occupations(models.Model):
+    Name = models.CharField(max_length=50, unique=True)
+
+    def __str__(self):
+        return self.Name
+
+
+# Number of transactions per account and day, maintained as transactions are inserted
+# and deleted (see rollups.py) and rebuildable with the rebuild_rollups command
+class AccountDailyActivity(models.Model):
+    AccountID = models.ForeignKey("Accounts", on_delete=models.CASCADE)
+    Day = models.DateField()
+    TransactionCount = models.PositiveIntegerField(default=0)
+    UpdatedAt = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["AccountID", "Day"], name="unique_account_day_activity"
+            )
+        ]
+        # Serves "sum of counts per account since a day" from the index alone
+        indexes = [
+            models.Index(
+                fields=["Day", "AccountID", "TransactionCount"],
+                name="activity_day_account_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.AccountID_id} {self.Day}"
+
+
+# Transaction count and amount per merchant and day, maintained like AccountDailyActivity
+class MerchantDailySummary(models.Model):
+    MerchantID = models.ForeignKey("Merchants", on_delete=models.CASCADE)
+    Day = models.DateField()
+    TransactionCount = models.PositiveIntegerField(default=0)
+    TotalAmount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["MerchantID", "Day"], name="unique_merchant_day_summary"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["Day", "MerchantID"], name="merchant_summary_day_idx")
+        ]
+
+    def __str__(self):
+        return f"{self.MerchantID_id} {self.Day}"
+
+
+# Transaction count and amount per time bucket, transaction type and channel. Buckets are
+# kept at several resolutions (see rollups.py); weekly series are summed from daily buckets
+class TimeSeriesBucket(models.Model):
+    GRANULARITIES = [("hour", "hour"), ("day", "day"), ("month", "month")]
+
+    Granularity = models.CharField(max_length=5, choices=GRANULARITIES)
+    Start = models.DateTimeField()
+    TransactionType = models.CharField(max_length=10)
+    Channel = models.CharField(max_length=50)
+    TransactionCount = models.PositiveIntegerField(default=0)
+    TotalAmount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        abstract = True
+
+
+class AccountTimeSeries(TimeSeriesBucket):
+    AccountID = models.ForeignKey("Accounts", on_delete=models.CASCADE)
+
+    class Meta:
+        # Also serves "buckets of an account at a resolution between two dates"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["AccountID", "Granularity", "Start", "TransactionType", "Channel"],
+                name="unique_account_timeseries_bucket",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.AccountID_id} {self.Granularity} {self.Start}"
+
+
+class MerchantTimeSeries(TimeSeriesBucket):
+    MerchantID = models.ForeignKey("Merchants", on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["MerchantID", "Granularity", "Start", "TransactionType", "Channel"],
+                name="unique_merchant_timeseries_bucket",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.MerchantID_id} {self.Granularity} {self.Start}"
+
+
+# Transaction count, amount and amount squared per day and combination of dimensions,
+# maintained like the other rollups (see cube.py). Dimensions are stored as the codes and
+# dimension keys of the Transactions columns
+class TransactionCube(models.Model):
+    Day = models.DateField()
+    Channel = EnumCodeField(codes=Transactions.Channel.field.codes)
+    Location = DimensionField(to="transactions_app.Locations")
+    TransactionType = EnumCodeField(codes=Transactions.TransactionType.field.codes)
+    Occupation = DimensionField(to="transactions_app.Occupations")
+    AgeBand = models.PositiveSmallIntegerField()  # Index in cube.AGE_BANDS
+    TransactionCount = models.PositiveIntegerField(default=0)
+    AmountCents = models.BigIntegerField(default=0)
+    AmountSquares = models.BigIntegerField(default=0)  # Sum of the squared amounts, in cents²
+
+    class Meta:
+        # Leads with Day, so it also serves date range scans
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    "Day",
+                    "Channel",
+                    "Location",
+                    "TransactionType",
+                    "Occupation",
+                    "AgeBand",
+                ],
+                name="unique_transaction_cube_cell",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.Day} {self.TransactionCount}"
+
+
+# Append-only log of the inserts, updates and deletes of Transactions, written in the
+# same database transaction as the change (see changelog.py) and tailed by Sequence
+class TransactionChange(models.Model):
+    OPERATIONS = [("insert", "insert"), ("update", "update"), ("delete", "delete")]
+
+    Sequence = models.BigAutoField(primary_key=True)
+    TransactionID = models.CharField(max_length=10)
+    Operation = models.CharField(max_length=6, choices=OPERATIONS)
+    Data = models.JSONField(encoder=DjangoJSONEncoder)  # The row after (or before a delete)
+    CreatedAt = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.Sequence} {self.Operation} {self.TransactionID}"
+
+
+# Sequence of the last TransactionChange applied by each change log consumer
+class ChangeCursor(models.Model):
+    Consumer = models.CharField(max_length=50, primary_key=True)
+    Sequence = models.BigIntegerField(default=0)
+    UpdatedAt = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.Consumer} {self.Sequence}"
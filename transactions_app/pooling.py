@@ -0,0 +1,55 @@
+"""
+Warm-up of the database connections of a worker.
+
+The first stage of the warm-up of a worker (see startup.py), so its first requests do not
+pay for opening connections: the pooled databases (see DATABASE_POOL in settings.py) open
+their pool and wait for its DATABASE_POOL_MIN_SIZE connections. The other databases are
+left alone: their connections belong to a thread, and the thread loading the application
+may serve no request (ASGI, threaded workers).
+
+Connections must not be shared by forked processes: with gunicorn --preload, the master
+closes them before forking and each worker opens its own pools (see gunicorn.conf.py).
+"""
+
+import logging
+import time
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up_connections(timeout=10):
+    """
+    Open the connection pools of the pooled databases.
+
+    A database that cannot be reached is logged and skipped: the worker still starts,
+    and its requests connect as usual.
+
+    Returns:
+        dict: Seconds taken per database alias, for the pools opened.
+    """
+    timings = {}
+    for alias in connections:
+        connection = connections[alias]
+        start = time.perf_counter()
+        try:
+            # Only the PostgreSQL backend has a pool, None unless pooling is enabled
+            pool = getattr(connection, "pool", None)
+            if pool is None:
+                continue
+            pool.open(wait=True, timeout=timeout)
+        except Exception:
+            logger.warning("Could not warm up the connections to %s", alias, exc_info=True)
+            continue
+        timings[alias] = time.perf_counter() - start
+    return timings
+
+
+def close_connections():
+    """Close the current thread's connections and the connection pools, e.g. before a fork."""
+    for alias in connections:
+        connection = connections[alias]
+        connection.close()
+        if getattr(connection, "pool", None) is not None:
+            connection.close_pool()
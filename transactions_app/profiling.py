@@ -0,0 +1,229 @@
+"""
+Opt-in profiling of single requests.
+
+A request is profiled when an admin (a staff user, logged in through /admin/ or with
+HTTP Basic credentials) asks for it with an ``X-Profile`` header or a ``?profile=`` query
+parameter, or when it is drawn by PROFILE_SAMPLE_RATE. The value chooses the profiler:
+
+- ``cprofile`` (or ``1``): cProfile, every function call of the request's thread, saved
+  as a pstats file (``python -m pstats``, snakeviz). Exact but slows the request down;
+  one request at a time, the others fall back to the sampler.
+- ``sample``: a thread recording the stack of the request's thread every
+  PROFILE_SAMPLE_INTERVAL seconds, saved as collapsed stacks for flamegraph.pl or
+  speedscope. Cheap enough for the sampled requests.
+
+Profiles are saved under PROFILES_DIR by a profile ID generated here, never taken from
+the client (a sampled request could otherwise overwrite another profile), sent back in
+the ``X-Profile-ID`` response header, and listed and downloaded by admins at profiles/.
+The request's ``X-Request-ID``, if valid, is only recorded with the profile. Only the
+PROFILES_KEEP most recent are kept.
+
+Requests served by the async entry point run on the event loop thread, shared with the
+other requests it serves at the same time: their profiles can include those requests.
+"""
+
+import cProfile
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_PARAMETER = "profile"
+REQUEST_ID = re.compile(r"^[A-Za-z0-9-]{1,64}$")
+PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+# Profilers by requested value, and the extension of the file they save
+MODES = {"1": "cprofile", "cprofile": "cprofile", "sample": "sample"}
+EXTENSIONS = {"cprofile": "prof", "sample": "collapsed"}
+
+# cProfile can only profile one thread at a time on Python 3.12+
+_cprofile_lock = threading.Lock()
+
+
+class StackSampler:
+    """Counts the stacks of a thread, sampled from another thread at a fixed interval."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def save(self, path):
+        # flamegraph.pl collapsed format: "root;caller;callee count"
+        path.write_text(
+            "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+        )
+
+
+def collapse(frame):
+    """A stack as "outermost;...;innermost" frames, each "function (file:line)"."""
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+def is_admin(request):
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        try:
+            authenticated = BasicAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        user = authenticated[0] if authenticated else None
+    return bool(user and user.is_staff)
+
+
+def requested_mode(request):
+    """Profiler to run on a request, or None."""
+    value = request.headers.get(PROFILE_HEADER) or request.GET.get(PROFILE_PARAMETER)
+    if value:
+        mode = MODES.get(value.lower())
+        if mode and is_admin(request):
+            return mode
+    if settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE:
+        return "sample"
+    return None
+
+
+def request_id(request):
+    """The request's X-Request-ID, recorded with its profile, or None if missing or invalid."""
+    value = request.headers.get("X-Request-ID", "")
+    return value if REQUEST_ID.match(value) else None
+
+
+def profile_path(profile_id):
+    """Metadata file of a profile (<profile ID>.json), or None if the ID is invalid."""
+    if not PROFILE_ID.match(profile_id):
+        return None
+    return Path(settings.PROFILES_DIR) / f"{profile_id}.json"
+
+
+def list_profiles():
+    """Metadata of the saved profiles, most recent first."""
+    profiles = []
+    for path in Path(settings.PROFILES_DIR).glob("*.json"):
+        try:
+            profiles.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue  # Removed or being written
+    return sorted(profiles, key=lambda profile: profile["created"], reverse=True)
+
+
+def save(profile_id, mode, profiler, request, response, seconds):
+    directory = Path(settings.PROFILES_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    file_name = f"{profile_id}.{EXTENSIONS[mode]}"
+    if mode == "cprofile":
+        profiler.dump_stats(directory / file_name)
+    else:
+        profiler.save(directory / file_name)
+    # Metadata last: a profile is listed once its file is complete
+    (directory / f"{profile_id}.json").write_text(
+        json.dumps(
+            {
+                "profile_id": profile_id,
+                "request_id": request_id(request),
+                "method": request.method,
+                "path": request.get_full_path(),
+                "status": response.status_code,
+                "duration_ms": round(seconds * 1000, 1),
+                "profiler": mode,
+                "file": file_name,
+                "created": timezone.now().isoformat(),
+            }
+        )
+    )
+    for old in list_profiles()[settings.PROFILES_KEEP :]:
+        for name in (f"{old['profile_id']}.json", old["file"]):
+            (directory / name).unlink(missing_ok=True)
+
+
+class ProfilingMiddleware:
+    """Profiles the requests asking for it (see module docstring)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        mode = requested_mode(request)
+        if mode is None:
+            return self.get_response(request)
+        if mode == "cprofile" and _cprofile_lock.acquire(blocking=False):
+            try:
+                profiler = cProfile.Profile()
+                start = time.perf_counter()
+                response = profiler.runcall(self.get_response, request)
+            finally:
+                _cprofile_lock.release()
+        else:
+            mode = "sample"
+            profiler = self.sampler()
+            start = time.perf_counter()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.stop()
+        return self.finish(mode, profiler, request, response, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        mode = requested_mode(request)
+        if mode is None:
+            return await self.get_response(request)
+        # cProfile would follow the event loop, not the request: always sample
+        profiler = self.sampler()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(profiler.stop)()
+        # Writes the files and prunes the old profiles: off the event loop
+        return await sync_to_async(self.finish)(
+            "sample", profiler, request, response, time.perf_counter() - start
+        )
+
+    def sampler(self):
+        profiler = StackSampler(threading.get_ident(), settings.PROFILE_SAMPLE_INTERVAL)
+        profiler.start()
+        return profiler
+
+    def finish(self, mode, profiler, request, response, seconds):
+        profile_id = uuid.uuid4().hex
+        save(profile_id, mode, profiler, request, response, seconds)
+        response["X-Profile-ID"] = profile_id
+        return response
@@ -0,0 +1,26 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Renders a list as newline-delimited JSON (one item per line) and anything else as a
+    single line.
+
+    Views that stream large results return a StreamingHttpResponse instead; listing this
+    renderer lets clients ask for NDJSON with the Accept header or ?format=ndjson.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        items = data if isinstance(data, list) else [data]
+        return "".join(ndjson_line(item) for item in items).encode()
+
+
+def ndjson_line(item):
+    return json.dumps(item, cls=JSONEncoder, separators=(",", ":")) + "\n"
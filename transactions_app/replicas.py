@@ -0,0 +1,108 @@
+"""
+Read replicas of the databases, used by the analytics endpoints.
+
+TRANSACTIONS_REPLICAS maps a database alias ("default" or a shard) to the aliases of its
+replicas. Inside use_replicas(), ShardRouter sends the reads of a database to its
+replicas, taken in turn; writes, and reads outside use_replicas(), go to the primary.
+
+Replicas lag behind their primary, so a client that just wrote is pinned to the
+primaries: replica_pin_middleware sets the PIN_COOKIE cookie on the response of every
+successful write for REPLICA_PIN_SECONDS, and for_request() skips the replicas while the
+cookie is sent back.
+"""
+
+import itertools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+PIN_COOKIE = "pin_primary"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_reading = ContextVar("transactions_replicas", default=False)
+_cycles = {}
+_cycles_lock = threading.Lock()
+
+
+def replicas(alias):
+    """Aliases of the replicas of a database."""
+    return list(settings.TRANSACTIONS_REPLICAS.get(alias, ()))
+
+
+def primary(alias):
+    """Alias of the primary of a replica (``alias`` itself for a primary)."""
+    for primary_alias, replica_aliases in settings.TRANSACTIONS_REPLICAS.items():
+        if alias in replica_aliases:
+            return primary_alias
+    return alias
+
+
+@contextmanager
+def use_replicas(enabled=True):
+    """Let the reads inside the block go to the replicas."""
+    token = _reading.set(enabled)
+    try:
+        yield
+    finally:
+        _reading.reset(token)
+
+
+def pinned(request):
+    """Whether the client wrote less than REPLICA_PIN_SECONDS ago."""
+    return PIN_COOKIE in request.COOKIES
+
+
+def for_request(request):
+    """use_replicas(), unless the client making the request is pinned to the primaries."""
+    return use_replicas(not pinned(request))
+
+
+def read_alias(alias):
+    """Database the reads of ``alias`` go to: one of its replicas inside use_replicas()."""
+    if not _reading.get():
+        return alias
+    aliases = replicas(alias)
+    if not aliases:
+        return alias
+    # Round robin over the replicas, restarted when the setting changes
+    key = (alias, tuple(aliases))
+    with _cycles_lock:
+        if key not in _cycles:
+            _cycles[key] = itertools.cycle(aliases)
+        return next(_cycles[key])
+
+
+def pin(request, response):
+    if (
+        settings.TRANSACTIONS_REPLICAS
+        and request.method not in SAFE_METHODS
+        and response.status_code < 400
+    ):
+        response.set_cookie(
+            PIN_COOKIE,
+            "1",
+            max_age=settings.REPLICA_PIN_SECONDS,
+            httponly=True,
+            samesite="Lax",
+        )
+    return response
+
+
+@sync_and_async_middleware
+def replica_pin_middleware(get_response):
+    """Pins the clients whose writes succeed to the primaries (read-your-writes)."""
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            return pin(request, await get_response(request))
+
+    else:
+
+        def middleware(request):
+            return pin(request, get_response(request))
+
+    return middleware
@@ -0,0 +1,390 @@
+"""
+Pre-aggregated rollups of the Transactions table.
+
+Rollups are updated incrementally, in the same database transaction as the insert,
+update or delete that changes them, and can be rebuilt from scratch with the
+rebuild_rollups management command. An update takes the stored version of the
+transaction out of the rollups and adds the new one, so an edited date, account,
+merchant or amount moves the transaction to its new buckets. Changes made with queryset
+update() or raw SQL bypass the rollups (as they bypass the change log).
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import BigIntegerField, Count, F, Sum
+from django.db.models.functions import TruncDate, TruncDay, TruncHour, TruncMonth
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import cube
+from .models import (
+    AccountDailyActivity,
+    AccountTimeSeries,
+    MerchantDailySummary,
+    MerchantTimeSeries,
+    TransactionCube,
+    Transactions,
+)
+from .signals import transactions_inserted
+from .timeseries import bucket_start
+
+# Resolutions of the time-series buckets, finest first: each level is rebuilt from the
+# previous one
+TIMESERIES_LEVELS = {"hour": TruncHour, "day": TruncDay, "month": TruncMonth}
+TIMESERIES_MODELS = {AccountTimeSeries: "AccountID", MerchantTimeSeries: "MerchantID"}
+
+
+def to_decimal(amount):
+    # Amounts may still be floats or strings on instances built by hand
+    return amount if isinstance(amount, Decimal) else Decimal(str(amount))
+
+
+def increment_rollup(model, lookups, deltas, values=None):
+    """
+    Add ``deltas`` to the counters of the rollup row matching ``lookups``.
+
+    The row is created when it does not exist yet, unless the deltas are negative.
+    ``values`` are plain fields set on every update (e.g. a modification time).
+    """
+    values = values or {}
+    rows = model.objects.filter(**lookups)
+    increments = {field: F(field) + delta for field, delta in deltas.items()}
+    if rows.update(**increments, **values) or any(d < 0 for d in deltas.values()):
+        return
+    try:
+        with transaction.atomic(using=router.db_for_write(model)):
+            model.objects.create(**lookups, **deltas, **values)
+    except IntegrityError:
+        # A concurrent insert created the row first
+        rows.update(**increments, **values)
+
+
+def increment_rollups(model, key_fields, counter_fields, increments, values=None):
+    """
+    Add deltas to the counters of many rows of a rollup table.
+
+    On databases that support it, the rows are upserted with one
+    INSERT ... ON CONFLICT DO UPDATE statement per batch instead of an UPDATE (and maybe
+    an INSERT) per row. Negative deltas go through increment_rollup, which never creates
+    rows.
+
+    Args:
+        key_fields (tuple): Fields of the model's unique constraint.
+        counter_fields (tuple): Fields the deltas are added to.
+        increments (dict): Maps a tuple of key values to the deltas of the counter fields.
+        values (dict): Plain fields set on every row (e.g. a modification time).
+    """
+    values = values or {}
+    if not increments:
+        return
+    # The database of the model: the current shard for the sharded rollups
+    connection = connections[router.db_for_write(model)]
+    if not connection.features.supports_update_conflicts_with_target or any(
+        delta < 0 for deltas in increments.values() for delta in deltas
+    ):
+        attnames = [model._meta.get_field(name).attname for name in key_fields]
+        for key, deltas in increments.items():
+            increment_rollup(
+                model,
+                dict(zip(attnames, key)),
+                dict(zip(counter_fields, deltas)),
+                values,
+            )
+        return
+
+    fields = [
+        model._meta.get_field(name) for name in (*key_fields, *counter_fields, *values)
+    ]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    columns = ", ".join(quote(field.column) for field in fields)
+    conflict = ", ".join(quote(model._meta.get_field(name).column) for name in key_fields)
+    updates = [
+        f"{quote(field.column)} = {table}.{quote(field.column)} + EXCLUDED.{quote(field.column)}"
+        for field in fields[len(key_fields) : len(key_fields) + len(counter_fields)]
+    ]
+    updates += [
+        f"{quote(field.column)} = EXCLUDED.{quote(field.column)}"
+        for field in fields[len(key_fields) + len(counter_fields) :]
+    ]
+    placeholders = f"({', '.join(['%s'] * len(fields))})"
+
+    rows = [(*key, *deltas, *values.values()) for key, deltas in increments.items()]
+    batch_size = connection.ops.bulk_batch_size(fields, rows)
+    with connection.cursor() as cursor:
+        for offset in range(0, len(rows), batch_size):
+            batch = rows[offset : offset + batch_size]
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) VALUES "
+                f"{', '.join([placeholders] * len(batch))} "
+                f"ON CONFLICT ({conflict}) DO UPDATE SET {', '.join(updates)}",
+                [
+                    field.get_db_prep_save(value, connection)
+                    for row in batch
+                    for field, value in zip(fields, row)
+                ],
+            )
+
+
+def add_account_activity(transactions, sign=1):
+    """Add (or with sign=-1, remove) transactions to the per-account daily counts."""
+    counts = defaultdict(lambda: [0])
+    for tx in transactions:
+        counts[(tx.AccountID_id, timezone.localdate(tx.transaction_datetime))][0] += sign
+
+    increment_rollups(
+        AccountDailyActivity,
+        ("AccountID", "Day"),
+        ("TransactionCount",),
+        counts,
+        values={"UpdatedAt": timezone.now()},
+    )
+
+
+def add_merchant_summary(transactions, sign=1):
+    """Add (or with sign=-1, remove) transactions to the per-merchant daily totals."""
+    totals = defaultdict(lambda: [0, Decimal(0)])
+    for tx in transactions:
+        key = (tx.MerchantID_id, timezone.localdate(tx.transaction_datetime))
+        totals[key][0] += sign
+        totals[key][1] += sign * to_decimal(tx.TransactionAmount)
+
+    increment_rollups(
+        MerchantDailySummary,
+        ("MerchantID", "Day"),
+        ("TransactionCount", "TotalAmount"),
+        totals,
+    )
+
+
+def add_timeseries(transactions, sign=1):
+    """Add (or with sign=-1, remove) transactions to the account and merchant time series."""
+    for model, key_field in TIMESERIES_MODELS.items():
+        totals = defaultdict(lambda: [0, Decimal(0)])
+        for tx in transactions:
+            for granularity in TIMESERIES_LEVELS:
+                key = (
+                    getattr(tx, f"{key_field}_id"),
+                    granularity,
+                    bucket_start(tx.transaction_datetime, granularity),
+                    tx.TransactionType,
+                    tx.Channel,
+                )
+                totals[key][0] += sign
+                totals[key][1] += sign * to_decimal(tx.TransactionAmount)
+
+        increment_rollups(
+            model,
+            (key_field, "Granularity", "Start", "TransactionType", "Channel"),
+            ("TransactionCount", "TotalAmount"),
+            totals,
+        )
+
+
+def add_analytics_cube(transactions, sign=1):
+    """Add (or with sign=-1, remove) transactions to the analytics cube."""
+    rows = [
+        (
+            timezone.localdate(tx.transaction_datetime),
+            {field: getattr(tx, field) for field in cube.SOURCE_FIELDS},
+            to_decimal(tx.TransactionAmount),
+        )
+        for tx in transactions
+    ]
+    totals = defaultdict(lambda: [0, 0, 0])
+    for day, values, amount in rows:
+        key = cube.cell_key(day, values)
+        cents = int(amount * 100)
+        totals[key][0] += sign
+        totals[key][1] += sign * cents
+        totals[key][2] += sign * cents * cents
+
+    increment_rollups(
+        TransactionCube,
+        cube.CELL_FIELDS,
+        ("TransactionCount", "AmountCents", "AmountSquares"),
+        totals,
+    )
+
+
+def daily_totals(key_fields, **aggregates):
+    """Group the Transactions table by ``key_fields`` and calendar day."""
+    return (
+        Transactions.objects.annotate(day=TruncDate("TransactionDate"))
+        .values(*key_fields, "day")
+        .annotate(**aggregates)
+        .order_by()
+        .iterator()
+    )
+
+
+def rebuild_account_activity():
+    """Recompute every per-account daily count from the Transactions table."""
+    with transaction.atomic(using=router.db_for_write(AccountDailyActivity)):
+        AccountDailyActivity.objects.all().delete()
+        now = timezone.now()
+        AccountDailyActivity.objects.bulk_create(
+            (
+                AccountDailyActivity(
+                    AccountID_id=row["AccountID"],
+                    Day=row["day"],
+                    TransactionCount=row["count"],
+                    UpdatedAt=now,
+                )
+                for row in daily_totals(("AccountID",), count=Count("TransactionID"))
+            ),
+            batch_size=1000,
+        )
+
+
+def rebuild_merchant_summary():
+    """Recompute every per-merchant daily total from the Transactions table."""
+    with transaction.atomic(using=router.db_for_write(MerchantDailySummary)):
+        MerchantDailySummary.objects.all().delete()
+        MerchantDailySummary.objects.bulk_create(
+            (
+                MerchantDailySummary(
+                    MerchantID_id=row["MerchantID"],
+                    Day=row["day"],
+                    TransactionCount=row["count"],
+                    TotalAmount=row["amount"],
+                )
+                for row in daily_totals(
+                    ("MerchantID",),
+                    count=Count("TransactionID"),
+                    amount=Sum("TransactionAmount"),
+                )
+            ),
+            batch_size=1000,
+        )
+
+
+def rebuild_timeseries():
+    """
+    Recompute the time-series buckets: hourly buckets from the Transactions table, then
+    daily buckets from the hourly ones and monthly buckets from the daily ones.
+    """
+    with transaction.atomic(using=router.db_for_write(Transactions)):
+        for model, key_field in TIMESERIES_MODELS.items():
+            model.objects.all().delete()
+            source, date_field = Transactions.objects.all(), "TransactionDate"
+            count, amount = Count("TransactionID"), Sum("TransactionAmount")
+            for granularity, trunc in TIMESERIES_LEVELS.items():
+                rows = (
+                    source.annotate(start=trunc(date_field))
+                    .values(key_field, "start", "TransactionType", "Channel")
+                    .annotate(count=count, amount=amount)
+                    .order_by()
+                    .iterator()
+                )
+                model.objects.bulk_create(
+                    (
+                        model(
+                            **{f"{key_field}_id": row[key_field]},
+                            Granularity=granularity,
+                            Start=row["start"],
+                            TransactionType=row["TransactionType"],
+                            Channel=row["Channel"],
+                            TransactionCount=row["count"],
+                            TotalAmount=row["amount"],
+                        )
+                        for row in rows
+                    ),
+                    batch_size=1000,
+                )
+                # The next (coarser) level is summed from this one
+                source = model.objects.filter(Granularity=granularity)
+                date_field = "Start"
+                count, amount = Sum("TransactionCount"), Sum("TotalAmount")
+
+
+def rebuild_analytics_cube():
+    """Recompute every cell of the analytics cube from the Transactions table."""
+    with transaction.atomic(using=router.db_for_write(TransactionCube)):
+        TransactionCube.objects.all().delete()
+        # Grouped by exact age, then merged into age bands
+        rows = list(
+            daily_totals(
+                cube.SOURCE_FIELDS,
+                count=Count("TransactionID"),
+                amount=Sum("TransactionAmount"),
+                # In cents², from the integer column
+                squares=Sum(
+                    F("TransactionAmount") * F("TransactionAmount"),
+                    output_field=BigIntegerField(),
+                ),
+            )
+        )
+        totals = defaultdict(lambda: [0, 0, 0])
+        for row in rows:
+            key = cube.cell_key(row["day"], row)
+            totals[key][0] += row["count"]
+            totals[key][1] += int(to_decimal(row["amount"]) * 100)
+            totals[key][2] += int(row["squares"])
+
+        TransactionCube.objects.bulk_create(
+            (
+                TransactionCube(
+                    **dict(zip(cube.CELL_FIELDS, key)),
+                    TransactionCount=count,
+                    AmountCents=cents,
+                    AmountSquares=squares,
+                )
+                for key, (count, cents, squares) in totals.items()
+            ),
+            batch_size=1000,
+        )
+
+
+# Rollups rebuilt by the rebuild_rollups command, by name
+REBUILDERS = {
+    "account_activity": rebuild_account_activity,
+    "merchant_summary": rebuild_merchant_summary,
+    "timeseries": rebuild_timeseries,
+    "analytics_cube": rebuild_analytics_cube,
+}
+
+
+@receiver(transactions_inserted)
+def update_rollups_on_insert(sender, transactions, **kwargs):
+    add_account_activity(transactions)
+    add_merchant_summary(transactions)
+    add_timeseries(transactions)
+    add_analytics_cube(transactions)
+
+
+@receiver(pre_save, sender=Transactions)
+def remember_stored_version(sender, instance, raw, using, **kwargs):
+    # Read before an UPDATE overwrites it, for update_rollups_on_update. New
+    # rows already carry their allocated TransactionID, so test _state instead
+    instance._stored_version = None
+    if not instance._state.adding and not raw:
+        instance._stored_version = (
+            Transactions.objects.using(using).filter(pk=instance.pk).first()
+        )
+
+
+@receiver(post_save, sender=Transactions)
+def update_rollups_on_update(sender, instance, created, **kwargs):
+    stored, instance._stored_version = getattr(instance, "_stored_version", None), None
+    if created or stored is None:  # Inserts are handled by update_rollups_on_insert
+        return
+    for add in (
+        add_account_activity,
+        add_merchant_summary,
+        add_timeseries,
+        add_analytics_cube,
+    ):
+        add([stored], sign=-1)
+        add([instance])
+
+
+@receiver(post_delete, sender=Transactions)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    add_account_activity([instance], sign=-1)
+    add_merchant_summary([instance], sign=-1)
+    add_timeseries([instance], sign=-1)
+    add_analytics_cube([instance], sign=-1)
@@ -0,0 +1,74 @@
+"""
+Fraud rules evaluated when a transaction is inserted.
+
+Unlike the rules of SuspiciousTransactions, which are recomputed from the account's
+history on every request, these rules only use in-memory state and run once per
+inserted transaction, once its insert commits: rolled back inserts are neither counted by
+the velocity tracker nor flagged.
+"""
+
+import logging
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.dispatch import receiver
+
+from . import sharding
+from .models import Transactions
+from .signals import transaction_flagged, transactions_inserted
+from .velocity import get_velocity_tracker
+
+logger = logging.getLogger(__name__)
+
+
+def velocity_rule(transaction):
+    """Flag the transaction when its account exceeds the limit of a window of VELOCITY_LIMITS."""
+    tracker = get_velocity_tracker()
+    return any(
+        tracker.window(transaction.AccountID_id, seconds)["transaction_count"] > limit
+        for seconds, limit in settings.VELOCITY_LIMITS.items()
+    )
+
+
+def login_attempts_rule(transaction):
+    """Flag the transaction when it took more than 3 login attempts (as SuspiciousTransactions)."""
+    return transaction.LoginAttempts > 3
+
+
+INSERT_RULES = {
+    "velocity": velocity_rule,
+    "login_attempts": login_attempts_rule,
+}
+
+
+def evaluate_insert_rules(transaction):
+    """Return the names of the insert-time rules that flag the transaction."""
+    return [name for name, rule in INSERT_RULES.items() if rule(transaction)]
+
+
+@receiver(transactions_inserted)
+def check_inserted_transactions(sender, transactions, **kwargs):
+    db_transaction.on_commit(
+        lambda: check_committed_transactions(transactions), using=sharding.current_db()
+    )
+
+
+def check_committed_transactions(transactions):
+    tracker = get_velocity_tracker()
+    for transaction in transactions:
+        tracker.record(
+            transaction.AccountID_id,
+            transaction.transaction_datetime.timestamp(),
+            float(transaction.TransactionAmount),
+        )
+        rules = evaluate_insert_rules(transaction)
+        if rules:
+            logger.info(
+                "Transaction %s of account %s flagged by %s",
+                transaction.TransactionID,
+                transaction.AccountID_id,
+                ", ".join(rules),
+            )
+            transaction_flagged.send(
+                sender=Transactions, transaction=transaction, rules=rules
+            )
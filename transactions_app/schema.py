@@ -0,0 +1,134 @@
+"""
+OpenAPI schema of the API, generated once instead of on every request.
+
+The generate_schema command writes the schema as JSON and YAML to API_SCHEMA_DIR, e.g.
+when the image is built. A process started without those files generates the schema on
+first use. Either way each format is serialized once per process and served from memory
+by SchemaDocumentView, with an ETag so clients revalidate it instead of downloading it
+again.
+
+The Swagger UI and ReDoc pages are drf_yasg's templates rendered once per process, without
+the per-user session login links: they never introspect the API and do not depend on the
+request, and the page loads the schema from swagger.json.
+"""
+
+import functools
+import hashlib
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils.http import quote_etag
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.generators import OpenAPISchemaGenerator
+from drf_yasg.renderers import ReDocRenderer, SwaggerUIRenderer
+
+API_VERSION = "v1"
+API_INFO = openapi.Info(
+    title="API Documentation",
+    default_version=API_VERSION,
+    description="""API documentation for Bank transactions Endpoints
+                    Python version: 3.12.4
+                    Django version: 5.1.4
+                    Django Rest Framework version: 3.15.2
+                    Pagination size: 5
+                    """,
+)
+API_URL = "https://financial-api-wdns.onrender.com"
+
+# Serialized formats: codec and content type
+FORMATS = {
+    "json": (OpenAPICodecJson, "application/json"),
+    "yaml": (OpenAPICodecYaml, "application/yaml"),
+}
+# Documentation pages: drf_yasg renderer providing the template and its settings
+PAGES = {"swagger": SwaggerUIRenderer, "redoc": ReDocRenderer}
+
+_documents = {}
+_documents_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=1)
+def generate_schema():
+    """Introspect every endpoint into a drf_yasg Swagger object (done once per process)."""
+    return OpenAPISchemaGenerator(API_INFO, url=API_URL).get_schema(
+        request=None, public=True
+    )
+
+
+def encode_schema(schema, format):
+    codec, _ = FORMATS[format]
+    return codec(validators=[]).encode(schema)
+
+
+def schema_path(format):
+    return Path(settings.API_SCHEMA_DIR) / f"openapi.{format}"
+
+
+def write_schema_files():
+    """
+    Generate the schema and write it in every format to API_SCHEMA_DIR.
+
+    Returns:
+        list: Paths written.
+    """
+    schema = generate_schema()
+    paths = []
+    for format in FORMATS:
+        path = schema_path(format)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(encode_schema(schema, format))
+        paths.append(path)
+    return paths
+
+
+def schema_document(format):
+    """
+    Serialized schema, read from API_SCHEMA_DIR or else generated.
+
+    Returns:
+        tuple: (content bytes, content type, ETag)
+    """
+    with _documents_lock:
+        if format not in _documents:
+            path = schema_path(format)
+            if path.exists():
+                content = path.read_bytes()
+            else:
+                content = encode_schema(generate_schema(), format)
+            _documents[format] = (
+                content,
+                FORMATS[format][1],
+                quote_etag(hashlib.md5(content).hexdigest()),
+            )
+        return _documents[format]
+
+
+@functools.lru_cache(maxsize=None)
+def documentation_page(page):
+    """
+    HTML of a documentation page, rendered once (see module docstring).
+
+    Returns:
+        tuple: (content bytes, ETag)
+    """
+    renderer = PAGES[page]()
+    context = {}
+    renderer.set_context(context)
+    context.update(
+        title=API_INFO.title,
+        version=API_VERSION,
+        USE_SESSION_AUTH=False,
+    )
+    content = render_to_string(renderer.template, context).encode()
+    return content, quote_etag(hashlib.md5(content).hexdigest())
+
+
+def forget_schema():
+    """Make the next request read (or generate) the schema again."""
+    with _documents_lock:
+        _documents.clear()
+    generate_schema.cache_clear()
+    documentation_page.cache_clear()
@@ -60,6 +60,20 @@ class TransactionsSerializer(serializers.ModelSerializer):
         },
     )
 
+    # Amounts are stored in cents; read and written as decimals, like the former
+    # DecimalField(max_digits=10, decimal_places=2) columns
+    TransactionAmount = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=Decimal(0)
+    )
+    AccountBalance = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=Decimal(0), required=False
+    )
+
+    # Stored as keys of the Locations and Occupations tables; read and written as the
+    # names, like the former CharField(max_length=50) columns
+    Location = serializers.CharField(max_length=50)
+    CustomerOccupation = serializers.CharField(max_length=50, required=False)
+
     Channel = serializers.ChoiceField(
         choices=[("ATM", "ATM"), ("Online", "Online"), ("Branch", "Branch")],
         error_messages={
@@ -74,24 +88,35 @@ class TransactionsSerializer(serializers.ModelSerializer):
         },
     )
 
+    def get_related(self, model, pk):
+        # Bulk ingest fetches every referenced row up front (one IN query per
+        # model) and passes them in the context instead of querying per item.
+        prefetched = self.context.get("prefetched")
+        if prefetched is None:
+            return model.objects.get(pk=pk)
+        try:
+            return prefetched[model][pk]
+        except KeyError:
+            raise model.DoesNotExist
+
     def validate_AccountID(self, value):
         # Check if the AccountID exists in the database
         try:
-            return Accounts.objects.get(AccountID=value)
+            return self.get_related(Accounts, value)
         except Accounts.DoesNotExist:
             raise serializers.ValidationError("Invalid AccountID. Account does not exist.")
     
     def validate_MerchantID(self, value):
         # Check if the MerchantID exists in the database
         try:
-            return Merchants.objects.get(MerchantID=value)
+            return self.get_related(Merchants, value)
         except Merchants.DoesNotExist:
             raise serializers.ValidationError("Invalid MerchantID. Merchant does not exist.")
     
     def validate_DeviceID(self, value):
         # Check if the DeviceID exists in the database
         try:
-            return Devices.objects.get(DeviceID=value)
+            return self.get_related(Devices, value)
         except Devices.DoesNotExist:
             raise serializers.ValidationError("Invalid DeviceID. Device does not exist.")
 
@@ -0,0 +1,361 @@
+"""
+Sharding of the account data across databases.
+
+TRANSACTIONS_SHARDS lists the database aliases holding transactions, "default" first.
+Each account lives on one shard: the one recorded for it in the AccountShard directory
+(written by the rebalance_shards command), or else the one its AccountID hashes to.
+
+The rows of SHARDED_MODELS (transactions and everything written in the same database
+transaction as them: rollups, change log, cube cells) live on the shard of their
+transaction. The other models stay on "default", including the dimension tables, shared
+by the transactions and cube cells of every shard. The rows of REFERENCE_MODELS are copied
+to every shard, so that foreign keys and joins from the sharded tables still work there.
+
+Each shard has its own change log, numbered by its own Sequence: consumers keep a cursor
+per shard, and readers of the changes feed name the shard they follow.
+
+Code runs against one shard at a time: use_shard() selects it for the ORM (through
+ShardRouter) and for code needing a connection (current_db()). Per-account endpoints
+select the shard of their account; cross-account endpoints run a function on every shard
+in parallel with scatter() and merge the partial results.
+
+With a single shard (the default), every account is on "default" and scatter() calls the
+function directly.
+
+Reads may also go to the replicas of a shard, see replicas.py.
+"""
+
+import contextvars
+import copy
+import os
+import threading
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import monotonic
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import metrics, replicas
+
+APP_LABEL = "transactions_app"
+# Models whose rows live on the shard of their transactions (lowercase model names)
+SHARDED_MODELS = {
+    "transactions",
+    "accountdailyactivity",
+    "accounttimeseries",
+    "merchantdailysummary",
+    "merchanttimeseries",
+    "transactioncube",
+    "transactionchange",
+    "changecursor",
+}
+# Models stored on "default" and copied to every other shard
+REFERENCE_MODELS = {"accounts", "merchants", "devices"}
+# Sharded models holding rows of a single account, moved with it by move_account()
+ACCOUNT_MODELS = ("transactions", "accountdailyactivity", "accounttimeseries")
+
+_current = ContextVar("transactions_shard", default=None)
+
+
+def shards():
+    """Aliases of the shard databases, "default" first."""
+    return list(settings.TRANSACTIONS_SHARDS)
+
+
+def current_db():
+    """Alias of the shard selected with use_shard(), or "default"."""
+    return _current.get() or DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def use_shard(alias):
+    """Run the sharded models' queries on ``alias`` inside the block."""
+    token = _current.set(alias)
+    try:
+        yield alias
+    finally:
+        _current.reset(token)
+
+
+def hashed_shard(account_id):
+    """Shard an account is placed on when the directory has no entry for it."""
+    aliases = shards()
+    return aliases[zlib.crc32(account_id.encode()) % len(aliases)]
+
+
+_directory = {}
+_directory_loaded_at = None
+_directory_lock = threading.Lock()
+
+
+def directory():
+    """AccountShard entries as {AccountID: alias}, re-read every SHARD_MAP_REFRESH seconds."""
+    global _directory, _directory_loaded_at
+    from .models import AccountShard
+
+    with _directory_lock:
+        stale = (
+            _directory_loaded_at is None
+            or monotonic() - _directory_loaded_at > settings.SHARD_MAP_REFRESH
+        )
+        metrics.cache_lookup("shard_directory", not stale)
+        if stale:
+            _directory = dict(
+                AccountShard.objects.using(DEFAULT_DB_ALIAS).values_list(
+                    "AccountID", "Shard"
+                )
+            )
+            _directory_loaded_at = monotonic()
+        return _directory
+
+
+def forget_directory():
+    """Make the next shard_for() read the directory again."""
+    global _directory_loaded_at
+    with _directory_lock:
+        _directory_loaded_at = None
+
+
+def shard_for(account_id):
+    """Alias of the shard holding an account."""
+    aliases = shards()
+    if len(aliases) == 1:
+        return aliases[0]
+    alias = directory().get(account_id)
+    return alias if alias in aliases else hashed_shard(account_id)
+
+
+@contextmanager
+def account_shard(account_id):
+    """use_shard() on the shard holding an account."""
+    with use_shard(shard_for(account_id)) as alias:
+        yield alias
+
+
+# Threads of scatter(), shared by the requests of the process so that their connections
+# are reused (CONN_MAX_AGE, or the pool of DATABASE_POOL) instead of opened on every call
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.SHARD_SCATTER_THREADS, thread_name_prefix="scatter"
+            )
+        return _executor
+
+
+def forget_executor():
+    # The threads do not survive a fork: a forked worker starts its own
+    global _executor, _executor_lock
+    _executor, _executor_lock = None, threading.Lock()
+
+
+os.register_at_fork(after_in_child=forget_executor)
+
+
+def run_on_shard(alias, func):
+    # Like at the end of a request: connections past CONN_MAX_AGE, broken or pooled (whose
+    # CONN_MAX_AGE is 0) are closed, which gives pooled connections back to the pool
+    try:
+        with use_shard(alias):
+            return func()
+    finally:
+        close_old_connections()
+
+
+def scatter(func):
+    """
+    Call ``func()`` on every shard, in parallel threads when there are several.
+
+    Returns:
+        list: The results, in the order of TRANSACTIONS_SHARDS.
+    """
+    aliases = shards()
+    if len(aliases) == 1:
+        with use_shard(aliases[0]):
+            return [func()]
+    # Each thread runs in a copy of the caller's context, e.g. within its use_replicas()
+    contexts = [contextvars.copy_context() for _ in aliases]
+    return list(
+        executor().map(
+            lambda alias, context: context.run(run_on_shard, alias, func),
+            aliases,
+            contexts,
+        )
+    )
+
+
+def add_values(a, b):
+    # Sums over no rows are None
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a + b
+
+
+def merge_sums(rows, fields):
+    """One row adding up the ``fields`` of ``rows``, e.g. the aggregate() of every shard."""
+    merged = dict(rows[0])
+    for row in rows[1:]:
+        for field in fields:
+            merged[field] = add_values(merged[field], row[field])
+    return merged
+
+
+def merge_groups(partials, key, fields):
+    """
+    Merge the grouped rows of every shard (a list of lists of rows): the rows with the same
+    ``key`` value are added up with merge_sums. Rows are returned in no particular order.
+    """
+    groups = defaultdict(list)
+    for rows in partials:
+        for row in rows:
+            groups[row[key]].append(row)
+    return [merge_sums(rows, fields) for rows in groups.values()]
+
+
+class ShardRouter:
+    """
+    Sends the sharded models to the selected shard and the rest of the app to "default".
+
+    Outside use_shard(), instances of sharded models are written back to the database
+    they were read from, and new ones go to "default". Inside use_replicas(), reads go to
+    the replicas of the database.
+    """
+
+    def db_for_model(self, model, instance=None, **hints):
+        if model._meta.app_label != APP_LABEL:
+            return None
+        if model._meta.model_name not in SHARDED_MODELS:
+            return DEFAULT_DB_ALIAS
+        alias = _current.get()
+        if alias is None and instance is not None:
+            alias = replicas.primary(instance._state.db)
+        return alias or DEFAULT_DB_ALIAS
+
+    def db_for_read(self, model, **hints):
+        alias = self.db_for_model(model, **hints)
+        return alias and replicas.read_alias(alias)
+
+    db_for_write = db_for_model
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Reference rows are copied to every shard, so they can be related to any shard
+        if obj1._meta.app_label == APP_LABEL and obj2._meta.app_label == APP_LABEL:
+            return True
+        return None
+
+
+@receiver(post_save)
+def copy_reference_row(sender, instance, raw, using, **kwargs):
+    if sender._meta.app_label != APP_LABEL or sender._meta.model_name not in REFERENCE_MODELS:
+        return
+    for alias in shards():
+        if alias != using:
+            # A copy, since bulk_create records the database on the instances
+            sender.objects.using(alias).bulk_create(
+                [copy.copy(instance)], ignore_conflicts=True
+            )
+
+
+def copy_reference_rows(batch_size=1000):
+    """
+    Copy the reference rows of "default" missing from the other shards (e.g. rows
+    created with bulk_create, which sends no post_save).
+
+    Returns:
+        int: Number of rows copied.
+    """
+    copied = 0
+    for alias in shards():
+        if alias == DEFAULT_DB_ALIAS:
+            continue
+        for model_name in sorted(REFERENCE_MODELS):
+            model = apps.get_model(APP_LABEL, model_name)
+            present = set(model.objects.using(alias).values_list("pk", flat=True))
+            missing = [
+                row
+                for row in model.objects.using(DEFAULT_DB_ALIAS).iterator(batch_size)
+                if row.pk not in present
+            ]
+            model.objects.using(alias).bulk_create(
+                missing, batch_size=batch_size, ignore_conflicts=True
+            )
+            copied += len(missing)
+    return copied
+
+
+def misplaced_accounts():
+    """
+    Accounts with rows on another shard than shard_for(), e.g. after adding a shard.
+
+    Returns:
+        list: (AccountID, shard holding rows, shard_for()) tuples.
+    """
+    misplaced = []
+    for alias in shards():
+        account_ids = set()
+        for model_name in ACCOUNT_MODELS:
+            model = apps.get_model(APP_LABEL, model_name)
+            account_ids.update(
+                model.objects.using(alias).values_list("AccountID", flat=True).distinct()
+            )
+        for account_id in sorted(account_ids):
+            target = shard_for(account_id)
+            if target != alias:
+                misplaced.append((account_id, alias, target))
+    return misplaced
+
+
+def move_account(account_id, source, target, batch_size=1000):
+    """
+    Move the rows of an account's ACCOUNT_MODELS from shard ``source`` to ``target``.
+
+    Rows are copied and deleted without signals, so no rollup or change log is updated:
+    the account's own rollups move with it, and the merchant rollups stay on the source
+    shard, where they still add up to the right totals across shards. Writes to the
+    account should be paused while it moves.
+
+    Returns:
+        int: Number of rows moved.
+    """
+    moved = 0
+    with transaction.atomic(using=target), transaction.atomic(using=source):
+        for model_name in ACCOUNT_MODELS:
+            model = apps.get_model(APP_LABEL, model_name)
+            rows = model.objects.using(source).filter(AccountID=account_id)
+            objects = list(rows)
+            if model._meta.pk.auto_created:
+                for row in objects:
+                    row.pk = None  # Numbered again by the target shard
+            model.objects.using(target).bulk_create(objects, batch_size=batch_size)
+            rows._raw_delete(source)
+            moved += len(objects)
+    return moved
+
+
+def assign_account(account_id, alias):
+    """Record in the directory that an account lives on ``alias``."""
+    from .models import AccountShard
+
+    if alias == hashed_shard(account_id):
+        AccountShard.objects.filter(AccountID=account_id).delete()
+    else:
+        AccountShard.objects.update_or_create(
+            AccountID=account_id,
+            defaults={"Shard": alias, "UpdatedAt": timezone.now()},
+        )
+    forget_directory()
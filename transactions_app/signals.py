@@ -0,0 +1,17 @@
+from django.db.models.signals import post_save
+from django.dispatch import Signal, receiver
+
+from .models import Transactions
+
+# Sent with transactions=[...] whenever new transactions are stored, whether by
+# Model.save() or by the bulk insert path (bulk_create does not send post_save)
+transactions_inserted = Signal()
+
+# Sent with transaction=... and rules=[...] when insert-time fraud rules flag a transaction
+transaction_flagged = Signal()
+
+
+@receiver(post_save, sender=Transactions)
+def transaction_saved(sender, instance, created, **kwargs):
+    if created:
+        transactions_inserted.send(sender=Transactions, transactions=[instance])
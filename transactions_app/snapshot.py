@@ -0,0 +1,351 @@
+"""
+Columnar, memory-mapped snapshot of the Transactions table.
+
+build_snapshot writes one .npy file per column into a new directory under
+TRANSACTIONS_SNAPSHOT_DIR, then points the CURRENT file at it. Workers open the columns
+with np.load(mmap_mode="r"): the pages live in the OS page cache and are shared by every
+process instead of being copied into each worker, and slices of a column are views, not
+copies.
+
+Text columns are dictionary-encoded: ``<column>.npy`` holds integer codes and
+``<column>_values.npy`` the sorted distinct values. Rows are sorted by account and date,
+so ``account_offsets[code]:account_offsets[code + 1]`` are the rows of an account.
+
+A snapshot reflects the table when it was built, plus the changes applied since then
+by the change log consumer (see changelog.py); endpoints only read it when asked to with
+?source=snapshot.
+"""
+
+import json
+import os
+import shutil
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import sharding
+from .models import Transactions
+from .startup import lazy_import
+
+np = lazy_import("numpy")  # Only imported once a snapshot is built or read
+
+# Dictionary-encoded columns and the Transactions field they come from
+ENCODED_COLUMNS = {
+    "account": "AccountID",
+    "merchant": "MerchantID",
+    "device": "DeviceID",
+    "location": "Location",
+    "channel": "Channel",
+    "transaction_type": "TransactionType",
+}
+# Other columns, their Transactions field and dtype
+PLAIN_COLUMNS = {
+    "transaction_id": ("TransactionID", "U10"),
+    "timestamp": ("TransactionDate", "int64"),  # Microseconds since the epoch
+    "amount_cents": ("TransactionAmount", "int64"),
+    "login_attempts": ("LoginAttempts", "int32"),
+}
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+CURRENT_FILE = "CURRENT"
+# Snapshots kept on disk; older ones are removed (open memory maps stay valid)
+KEEP_SNAPSHOTS = 2
+
+
+def convert(field, value):
+    # Values come from the database or, as strings, from the change log
+    if field == "TransactionDate":
+        if isinstance(value, str):
+            value = parse_datetime(value)
+        return (value - EPOCH) // timedelta(microseconds=1)
+    if field == "TransactionAmount":
+        return int(Decimal(str(value)) * 100)
+    return value
+
+
+def row_values(rows):
+    """Column values of an iterable of {field: value} rows, as {column: list}."""
+    fields = {
+        **ENCODED_COLUMNS,
+        **{name: field for name, (field, _) in PLAIN_COLUMNS.items()},
+    }
+    values = {name: [] for name in fields}
+    for row in rows:
+        for name, field in fields.items():
+            values[name].append(convert(field, row[field]))
+    return values
+
+
+def encode(values):
+    """
+    Encode and sort columns of raw values.
+
+    Args:
+        values (dict): Column name to a list or array of raw values.
+
+    Returns:
+        dict: Column name to array, as saved in a snapshot directory.
+    """
+    columns = {}
+    for name in ENCODED_COLUMNS:
+        distinct, codes = np.unique(
+            np.asarray(values[name], dtype=str), return_inverse=True
+        )
+        columns[f"{name}_values"] = distinct
+        columns[name] = codes.astype(np.min_scalar_type(max(len(distinct) - 1, 0)))
+    for name, (field, dtype) in PLAIN_COLUMNS.items():
+        columns[name] = np.asarray(values[name], dtype=dtype)
+
+    # Sort the rows by account, then date, and index where each account starts
+    order = np.lexsort((columns["timestamp"], columns["account"]))
+    for name in (*ENCODED_COLUMNS, *PLAIN_COLUMNS):
+        columns[name] = columns[name][order]
+    columns["account_offsets"] = account_offsets(columns)
+    return columns
+
+
+def account_offsets(columns):
+    counts = np.bincount(columns["account"], minlength=len(columns["account_values"]))
+    return np.concatenate(([0], np.cumsum(counts))).astype("int64")
+
+
+def publish(columns, sequences, previous=None):
+    """
+    Write columns as a new snapshot directory and make it the current snapshot.
+
+    Args:
+        columns (dict): Column name to array (see encode()).
+        sequences (dict): Last change log Sequence reflected in the columns, by shard.
+        previous (Snapshot): Snapshot the columns were patched from: its files are
+            hard-linked for the columns that are still the same arrays.
+
+    Returns:
+        Path: The new snapshot directory.
+    """
+    directory = Path(settings.TRANSACTIONS_SNAPSHOT_DIR)
+    built_at = timezone.now()
+    path = directory / built_at.strftime("%Y%m%dT%H%M%S%fZ")
+    path.mkdir(parents=True)
+    for name, column in columns.items():
+        if previous is not None and column is previous.columns.get(name):
+            try:
+                os.link(previous.path / f"{name}.npy", path / f"{name}.npy")
+                continue
+            except OSError:
+                pass  # No hard links on this file system: written again
+        np.save(path / f"{name}.npy", column)
+    (path / "meta.json").write_text(
+        json.dumps(
+            {
+                "built_at": built_at.isoformat(),
+                "rows": len(columns["transaction_id"]),
+                "sequences": sequences,
+            }
+        )
+    )
+
+    # Switch atomically, so workers never see a half-written snapshot
+    pointer = directory / f"{CURRENT_FILE}.tmp"
+    pointer.write_text(path.name)
+    pointer.replace(directory / CURRENT_FILE)
+
+    for old in sorted(p for p in directory.iterdir() if p.is_dir())[:-KEEP_SNAPSHOTS]:
+        shutil.rmtree(old, ignore_errors=True)
+    return path
+
+
+def build_snapshot():
+    """
+    Write a snapshot of the whole Transactions table and make it the current one.
+
+    Returns:
+        Path: The new snapshot directory.
+    """
+    from .changelog import head, set_cursor
+
+    # Changes committed while the table is read are applied again by the change log
+    # consumer, which is harmless since applying a change is idempotent
+    fields = [*ENCODED_COLUMNS.values(), *(f for f, _ in PLAIN_COLUMNS.values())]
+    partials = sharding.scatter(
+        lambda: (
+            head(),
+            list(Transactions.objects.values(*fields).order_by().iterator(2000)),
+        )
+    )
+    sequences = dict(zip(sharding.shards(), (sequence for sequence, _ in partials)))
+    values = row_values(row for _, rows in partials for row in rows)
+    path = publish(encode(values), sequences)
+    for alias, sequence in sequences.items():
+        with sharding.use_shard(alias):
+            set_cursor("snapshot", sequence)
+    return path
+
+
+def apply_changes(changes):
+    """
+    Change log consumer: apply TransactionChange rows of the current shard to the
+    current snapshot.
+
+    Only the changed rows are touched: the other rows keep their codes and order, and
+    dictionaries only grow (remapping the codes when a new value sorts before existing
+    ones). An update that keeps its transaction's account and date is written over its
+    row; other changes remove rows and insert their latest version where the account and
+    date order puts it. Columns left unchanged are hard-linked from the current snapshot
+    instead of being written again. Never reads the Transactions table, and does nothing
+    until a snapshot has been built.
+    """
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return
+    latest = {change.TransactionID: change for change in changes}
+    columns = dict(snapshot.columns)
+    added = row_values(
+        change.Data for change in latest.values() if change.Operation != "delete"
+    )
+    count = len(added["transaction_id"])
+
+    # Codes of the changed rows, growing the dictionaries with their new values
+    new = {}
+    for name in ENCODED_COLUMNS:
+        distinct = columns[f"{name}_values"]
+        values = np.asarray(added[name], dtype=str)
+        missing = np.setdiff1d(values, distinct)
+        if len(missing):
+            merged = np.union1d(distinct, missing)
+            dtype = np.min_scalar_type(len(merged) - 1)
+            columns[f"{name}_values"] = merged
+            columns[name] = np.searchsorted(merged, distinct).astype(dtype)[columns[name]]
+        new[name] = np.searchsorted(columns[f"{name}_values"], values)
+    for name, (_, dtype) in PLAIN_COLUMNS.items():
+        new[name] = np.asarray(added[name], dtype=dtype)
+
+    # Rows of the changed transactions, by position of the changed row
+    ids = np.asarray(list(latest), dtype=columns["transaction_id"].dtype)
+    stored = np.flatnonzero(np.isin(columns["transaction_id"], ids))
+    position = dict(zip(columns["transaction_id"][stored].tolist(), stored.tolist()))
+    targets = [position.get(tx_id) for tx_id in added["transaction_id"]]
+
+    in_place = len(stored) == count and all(
+        row is not None
+        and columns["account"][row] == new["account"][index]
+        and columns["timestamp"][row] == new["timestamp"][index]
+        for index, row in enumerate(targets)
+    )
+    if in_place:
+        # Same rows, same order: only the changed values are written
+        for name in (*ENCODED_COLUMNS, *PLAIN_COLUMNS):
+            column = columns[name]
+            if not np.array_equal(column[targets], new[name].astype(column.dtype)):
+                column = np.array(column)
+                column[targets] = new[name]
+                columns[name] = column
+        if columns["account_values"] is not snapshot.columns["account_values"]:
+            columns["account_offsets"] = account_offsets(columns)
+    else:
+        keep = np.ones(len(columns["transaction_id"]), dtype=bool)
+        keep[stored] = False
+        for name in (*ENCODED_COLUMNS, *PLAIN_COLUMNS):
+            columns[name] = columns[name][keep]
+        columns["account_offsets"] = account_offsets(columns)
+
+        # Insert the new rows in account, then date order
+        order = np.lexsort((new["timestamp"], new["account"]))
+        offsets = columns["account_offsets"]
+        at = [
+            int(offsets[account])
+            + int(
+                np.searchsorted(
+                    columns["timestamp"][offsets[account] : offsets[account + 1]],
+                    timestamp,
+                    side="right",
+                )
+            )
+            for account, timestamp in zip(new["account"][order], new["timestamp"][order])
+        ]
+        for name in (*ENCODED_COLUMNS, *PLAIN_COLUMNS):
+            columns[name] = np.insert(
+                columns[name], at, new[name][order].astype(columns[name].dtype)
+            )
+        columns["account_offsets"] = account_offsets(columns)
+    alias = sharding.current_db()
+    sequences = {
+        **snapshot.sequences,
+        alias: max(snapshot.sequences.get(alias, 0), changes[-1].Sequence),
+    }
+    publish(columns, sequences, previous=snapshot)
+
+
+class Snapshot:
+    """
+    A snapshot opened read-only with memory maps.
+
+    Attributes:
+        columns (dict): Column name to read-only array.
+        built_at (str): ISO 8601 time the snapshot was built.
+        rows (int): Number of transactions.
+        sequences (dict): Last change log Sequence reflected in the snapshot, by shard.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        meta = json.loads((self.path / "meta.json").read_text())
+        self.built_at = meta["built_at"]
+        self.rows = meta["rows"]
+        self.sequences = meta.get("sequences", {})  # Last change log Sequence by shard
+        self.columns = {
+            file.stem: np.load(file, mmap_mode="r") for file in self.path.glob("*.npy")
+        }
+
+    def code(self, column, value):
+        """Code of ``value`` in a dictionary-encoded column, or None if absent."""
+        distinct = self.columns[f"{column}_values"]
+        index = int(np.searchsorted(distinct, value))
+        if index < len(distinct) and distinct[index] == value:
+            return index
+        return None
+
+    def decode(self, column, code):
+        return str(self.columns[f"{column}_values"][code])
+
+    def account_rows(self, account_id):
+        """Rows of an account as a slice (empty when the account has no transactions)."""
+        code = self.code("account", account_id)
+        if code is None:
+            return slice(0, 0)
+        offsets = self.columns["account_offsets"]
+        return slice(int(offsets[code]), int(offsets[code + 1]))
+
+    def value_counts(self, column, rows, key):
+        """
+        Number of rows per value of an encoded column, most frequent first, shaped like
+        ``queryset.values(key).annotate(count=Count(...)).order_by("-count")``.
+        """
+        counts = np.bincount(self.columns[column][rows])
+        codes = np.flatnonzero(counts)
+        codes = codes[np.argsort(-counts[codes], kind="stable")]
+        return [
+            {key: self.decode(column, code), "count": int(counts[code])}
+            for code in codes
+        ]
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot():
+    """Return the current snapshot, reopening it after a rebuild, or None if none was built."""
+    global _snapshot
+    directory = Path(settings.TRANSACTIONS_SNAPSHOT_DIR)
+    try:
+        name = (directory / CURRENT_FILE).read_text().strip()
+    except FileNotFoundError:
+        return None
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot.path != directory / name:
+            _snapshot = Snapshot(directory / name)
+        return _snapshot
@@ -0,0 +1,125 @@
+"""
+Startup of a web worker: lazy imports of heavy modules and the warm-up run before the
+first request.
+
+NumPy is only needed by the ?source=snapshot reads and the archived partitions, so the
+modules using it import it with lazy_import() and a worker that never serves those does
+not pay for it. pandas is only used by the populate_db command.
+
+wsgi.py and asgi.py call warm_up() once the application is loaded (see WARM_UP in
+settings.py), so the work a worker would otherwise do on its first requests is done
+before it takes traffic. Each stage is timed and logged; a stage that fails is logged
+and skipped, and the worker still starts. The benchmark_startup command measures the
+result.
+"""
+
+import importlib
+import logging
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LazyModule:
+    """Stand-in for a module, imported on the first access to one of its attributes."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, attribute):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name):
+    """The module ``name`` if already imported, else a LazyModule importing it on use."""
+    return sys.modules.get(name) or LazyModule(name)
+
+
+def warm_up_urls():
+    # Imports every view and compiles the URL patterns
+    from django.urls import get_resolver
+
+    get_resolver().reverse_dict
+
+
+def warm_up_validators():
+    # RegexValidator compiles its pattern on first use, and serializers copy their
+    # fields per instance: compiled once here, the copies share the compiled pattern
+    from .serializer import TransactionsSerializer
+
+    for field in TransactionsSerializer._declared_fields.values():
+        for validator in field.validators:
+            regex = getattr(validator, "regex", None)
+            if regex is not None:
+                regex.pattern
+
+
+def warm_up_dimensions():
+    # Name <-> key dictionaries of the dimension tables, read by every transaction
+    from .fields import DimensionField
+    from .models import Transactions
+
+    for field in Transactions._meta.concrete_fields:
+        if isinstance(field, DimensionField):
+            field.dimension.load()
+
+
+def warm_up_schema():
+    # OpenAPI schema served by swagger.json/swagger.yaml (read from API_SCHEMA_DIR)
+    from . import schema
+
+    for format in schema.FORMATS:
+        schema.schema_document(format)
+
+
+def warm_up_connections():
+    from . import pooling
+
+    pooling.warm_up_connections()
+
+
+# Stages in the order they run: connections first, so the later stages' queries do not
+# pay for opening them
+STAGES = {
+    "connections": warm_up_connections,
+    "urls": warm_up_urls,
+    "validators": warm_up_validators,
+    "dimensions": warm_up_dimensions,
+    "schema": warm_up_schema,
+}
+
+
+def warm_up():
+    """
+    Run every warm-up stage.
+
+    Returns:
+        dict: Seconds taken per stage, for the stages that succeeded.
+    """
+    timings = {}
+    for name, stage in STAGES.items():
+        start = time.perf_counter()
+        try:
+            stage()
+        except Exception:
+            logger.warning("Warm-up stage %s failed", name, exc_info=True)
+            continue
+        timings[name] = time.perf_counter() - start
+    logger.info(
+        "Warmed up in %.3fs (%s)",
+        sum(timings.values()),
+        ", ".join(f"{name} {seconds:.3f}s" for name, seconds in timings.items()),
+    )
+    return timings
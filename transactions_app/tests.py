@@ -1,12 +1,56 @@
-from datetime import timedelta
-from django.test import TestCase
+import asyncio
+import base64
+import json
+import os
+import pstats
+import runpy
+import statistics as st
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from io import StringIO
+from pathlib import Path
+from datetime import date, datetime, timedelta
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
 from rest_framework.test import APITestCase
 from django.urls import reverse
 from .models import *
+from drf_yasg.generators import OpenAPISchemaGenerator
 from rest_framework import status
 from django.utils import timezone
 from .helpers import *
+from .writebehind import IngestQueueFull, WriteBehindBuffer
+from .velocity import VelocityTracker, get_velocity_tracker
+from .signals import transaction_flagged
+from .broadcast import DROPPED, get_broadcaster
+from .dimensions import DimensionCache, get_dimension_cache
+from .pooling import warm_up_connections
+from .profiling import StackSampler
+from . import (
+    archive,
+    instrumentation,
+    metrics,
+    profiling,
+    replicas,
+    schema,
+    sharding,
+    startup,
+)
+from asgiref.sync import sync_to_async
+from .snapshot import ENCODED_COLUMNS, PLAIN_COLUMNS, apply_changes, get_snapshot
+from .changelog import compact, consume, pending_changes
+import numpy as np
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from decimal import Decimal
+from django.db import OperationalError, connection, connections, router, transaction
+from django.db.models import Count, F, Sum
+from django.test.utils import CaptureQueriesContext
 
 
 class TransactionsByAccountTests(APITestCase):
@@ -178,6 +222,459 @@ class AddTransactionTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
+class CompactStorageTests(APITestCase):
+    # Tests for the cents and enum code columns of Transactions
+    @classmethod
+    def setUpTestData(cls):
+        cls.account, cls.merchant, cls.device, cls.transaction1 = create_test_data()
+        create_transactions(
+            cls.account,
+            cls.merchant,
+            cls.device,
+            num_transactions=1,
+            transaction_amount=0.29,
+            channel="Online",
+            transaction_type="Debit",
+        )
+        create_transactions(
+            cls.account, cls.merchant, cls.device, num_transactions=1, channel="Branch"
+        )
+
+    def test_stored_as_integers(self):
+        """Test success: Amounts are stored in cents and choices as small integer codes."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT TransactionAmount, AccountBalance, TransactionType, Channel "
+                "FROM transactions_app_transactions ORDER BY TransactionID"
+            )
+            rows = cursor.fetchall()
+        self.assertEqual(rows[1], (29, 490000, 2, 3))
+
+        tx = Transactions.objects.get(TransactionID="TX000002")
+        self.assertEqual(tx.TransactionAmount, Decimal("0.29"))
+        self.assertEqual(tx.Channel, "Online")
+        self.assertEqual(tx.TransactionType, "Debit")
+
+    def test_api_output_unchanged(self):
+        """Test success: Amounts are still serialized as decimals and choices as strings."""
+        response = self.client.get(reverse("transactions_by_account", args=["AC00128"]))
+        result = response.data["results"][1]
+        self.assertEqual(result["TransactionAmount"], "0.29")
+        self.assertEqual(result["AccountBalance"], "4900.00")
+        self.assertEqual(result["Channel"], "Online")
+
+        summary = Transactions.objects.aggregate(total=Sum("TransactionAmount"))
+        self.assertEqual(summary["total"], Decimal("201.29"))
+
+    def test_lookups(self):
+        """Test success: Lookups compare exact amounts and filter and order by choice."""
+        amounts = Transactions.objects.values_list("TransactionAmount", flat=True)
+        self.assertEqual(amounts.filter(TransactionAmount__gte=100.5).count(), 2)
+        self.assertEqual(amounts.filter(TransactionAmount__gt=100.495).count(), 2)
+        self.assertEqual(amounts.filter(TransactionAmount__lt=0.295).count(), 1)
+        self.assertEqual(amounts.filter(TransactionAmount=Decimal("0.29")).count(), 1)
+
+        self.assertEqual(
+            list(Transactions.objects.order_by("Channel").values_list("Channel", flat=True)),
+            ["ATM", "Branch", "Online"],
+        )
+        self.assertEqual(Transactions.objects.filter(Channel__in=["ATM", "Online"]).count(), 2)
+        self.assertEqual(
+            list(
+                Transactions.objects.values("TransactionType")
+                .annotate(count=Count("TransactionID"))
+                .order_by("TransactionType")
+            ),
+            [
+                {"TransactionType": "Credit", "count": 2},
+                {"TransactionType": "Debit", "count": 1},
+            ],
+        )
+        with self.assertRaises(ValueError):
+            Transactions.objects.filter(Channel="Phone").count()
+
+
+class DimensionTableTests(APITestCase):
+    # Tests for the Location and CustomerOccupation keys of the dimension tables
+    @classmethod
+    def setUpTestData(cls):
+        cls.account, cls.merchant, cls.device, cls.transaction1 = create_test_data()
+        create_transactions(
+            cls.account,
+            cls.merchant,
+            cls.device,
+            num_transactions=2,
+            location="Boston",
+            customer_occupation="Doctor",
+        )
+
+    def test_stored_as_keys(self):
+        """Test success: Names are stored once, and transactions hold their keys."""
+        self.assertEqual(Locations.objects.filter(Name="Boston").count(), 1)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT Location, CustomerOccupation FROM transactions_app_transactions "
+                "ORDER BY TransactionID"
+            )
+            rows = cursor.fetchall()
+        self.assertEqual(
+            rows[1],
+            (Locations.objects.get(Name="Boston").pk, Occupations.objects.get(Name="Doctor").pk),
+        )
+
+        tx = Transactions.objects.get(TransactionID="TX000002")
+        self.assertEqual((tx.Location, tx.CustomerOccupation), ("Boston", "Doctor"))
+
+    def test_api_unchanged(self):
+        """Test success: Names are still accepted and returned as strings."""
+        data = {
+            "AccountID": "AC00128",
+            "TransactionAmount": 10,
+            "TransactionType": "Debit",
+            "TransactionDuration": 60,
+            "Location": "Denver",
+            "LoginAttempts": 1,
+            "MerchantID": "M015",
+            "Channel": "Online",
+            "DeviceID": "D000051",
+            "CustomerOccupation": "Student",
+            "PreviousTransactionDate": "2023-01-01 12:00:00",
+        }
+        response = self.client.post(reverse("add_transaction"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Locations.objects.filter(Name="Denver").count(), 1)
+
+        response = self.client.get(reverse("transactions_by_account", args=["AC00128"]))
+        result = response.data["results"][-1]
+        self.assertEqual(result["Location"], "Denver")
+        self.assertEqual(result["CustomerOccupation"], "Student")
+
+    def test_lookups(self):
+        """Test success: Lookups and group-bys use the names; unknown names match nothing."""
+        self.assertEqual(Transactions.objects.filter(Location="Boston").count(), 2)
+        self.assertEqual(
+            Transactions.objects.filter(Location__in=["Boston", "New York"]).count(), 3
+        )
+        self.assertEqual(Transactions.objects.filter(Location="Atlantis").count(), 0)
+        self.assertFalse(Locations.objects.filter(Name="Atlantis").exists())
+        self.assertEqual(
+            list(
+                Transactions.objects.values("Location")
+                .annotate(count=Count("TransactionID"))
+                .order_by("Location")
+            ),
+            [{"Location": "New York", "count": 1}, {"Location": "Boston", "count": 2}],
+        )
+
+    def test_rolled_back_names_forgotten(self):
+        """Test success: Keys of names added by a rolled back savepoint are not reused."""
+        with self.assertRaises(ZeroDivisionError), transaction.atomic():
+            create_transactions(
+                self.account, self.merchant, self.device, num_transactions=1, location="Atlantis"
+            )
+            1 / 0
+        self.assertFalse(Locations.objects.filter(Name="Atlantis").exists())
+
+        # The next name may get the key of the rolled back one
+        create_transactions(
+            self.account, self.merchant, self.device, num_transactions=1, location="Lemuria"
+        )
+        tx = Transactions.objects.latest("TransactionID")
+        self.assertEqual(tx.Location, "Lemuria")
+        self.assertEqual(Transactions.objects.filter(Location="Atlantis").count(), 0)
+
+    def test_committed_names_cached(self):
+        """Test success: Names added by a transaction are cached once it commits."""
+        cache = get_dimension_cache("transactions_app.Locations")
+        # Restore the process-wide dictionaries: the test database is rolled back
+        with mock.patch.dict(cache.keys), mock.patch.dict(cache.names):
+            with self.captureOnCommitCallbacks(execute=True):
+                create_transactions(
+                    self.account, self.merchant, self.device, num_transactions=1, location="Reno"
+                )
+            key = Locations.objects.get(Name="Reno").pk
+            self.assertEqual(cache.keys["Reno"], key)
+
+            with self.assertNumQueries(0):
+                self.assertEqual(cache.name(key), "Reno")
+
+
+    def test_unknown_names_reload_throttled(self):
+        """Test success: Unknown names read the table at most once per interval."""
+        cache = get_dimension_cache("transactions_app.Locations")
+        with mock.patch.object(cache, "loaded_at", None):
+            with self.assertNumQueries(1):
+                for number in range(10):
+                    self.assertIsNone(cache.key(f"Atlantis {number}"))
+            with mock.patch(
+                "transactions_app.dimensions.monotonic",
+                return_value=cache.loaded_at + settings.DIMENSION_RELOAD_INTERVAL,
+            ), self.assertNumQueries(1):
+                self.assertIsNone(cache.key("Atlantis"))
+
+            # Saving a new name still reads the table again
+            create_transactions(
+                self.account, self.merchant, self.device, num_transactions=1, location="Mu"
+            )
+            self.assertEqual(Transactions.objects.filter(Location="Mu").count(), 1)
+
+
+class BulkAddTransactionTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = Accounts.objects.create(AccountID="AC00128")
+        cls.merchant = Merchants.objects.create(MerchantID="M015")
+        cls.device = Devices.objects.create(DeviceID="D000051")
+
+    def get_transaction_data(self, overrides=None):
+        """Helper method to create transaction data."""
+        data = {
+            "AccountID": self.account.AccountID,
+            "TransactionDate": "2024-04-11 16:29:14",
+            "TransactionAmount": 100.50,
+            "TransactionType": "Credit",
+            "TransactionDuration": 120,
+            "Location": "New York",
+            "LoginAttempts": 1,
+            "IPAddress": "192.168.1.1",
+            "MerchantID": self.merchant.MerchantID,
+            "Channel": "ATM",
+            "DeviceID": self.device.DeviceID,
+            "CustomerAge": 30,
+            "CustomerOccupation": "Engineer",
+            "AccountBalance": 4900,
+            "PreviousTransactionDate": "2023-01-01 12:00:00",
+        }
+        if overrides:
+            data.update(overrides)
+        return data
+
+    def test_bulk_add_transactions(self):
+        """Test success: Add a batch of transactions with consecutive IDs."""
+        url = reverse("add_transaction_bulk")
+        data = [self.get_transaction_data() for _ in range(3)]
+        response = self.client.post(url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["created"], 3)
+        self.assertEqual(
+            response.data["transaction_ids"], ["TX000001", "TX000002", "TX000003"]
+        )
+        self.assertEqual(response.data["errors"], [])
+        self.assertEqual(Transactions.objects.count(), 3)
+
+    def test_bulk_add_ndjson(self):
+        """Test success: Add a batch sent as newline-delimited JSON."""
+        url = reverse("add_transaction_bulk")
+        body = "\n".join(json.dumps(self.get_transaction_data()) for _ in range(2))
+        response = self.client.post(
+            url, body + "\n", content_type="application/x-ndjson"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Transactions.objects.count(), 2)
+
+    def test_bulk_per_item_errors(self):
+        """Test edge case: Invalid items are reported while valid ones are inserted."""
+        url = reverse("add_transaction_bulk")
+        data = [
+            self.get_transaction_data(),
+            self.get_transaction_data({"AccountID": "AC99999"}),
+            self.get_transaction_data({"Channel": "INVALID"}),
+        ]
+        response = self.client.post(url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(
+            [error["index"] for error in response.data["errors"]], [1, 2]
+        )
+        self.assertIn("AccountID", response.data["errors"][0]["errors"])
+        self.assertEqual(Transactions.objects.count(), 1)
+
+    def test_bulk_queries_do_not_grow_with_batch(self):
+        """Test success: Foreign keys are validated with one query per table."""
+        url = reverse("add_transaction_bulk")
+        # The first batch also creates the account's rollup rows
+        self.client.post(url, [self.get_transaction_data()], format="json")
+        query_counts = []
+        for batch_size in (5, 50):
+            data = [self.get_transaction_data() for _ in range(batch_size)]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(url, data, format="json")
+            self.assertEqual(response.data["created"], batch_size)
+            query_counts.append(len(queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    def test_bulk_all_invalid(self):
+        """Test error: No valid item in the batch."""
+        url = reverse("add_transaction_bulk")
+        data = [self.get_transaction_data({"DeviceID": "INVALID"})]
+        response = self.client.post(url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Transactions.objects.count(), 0)
+
+    def test_bulk_requires_list(self):
+        """Test error: The body must be a list of transactions."""
+        url = reverse("add_transaction_bulk")
+        response = self.client.post(url, self.get_transaction_data(), format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class WriteBehindTests(APITestCase):
+    # Tests for the write-behind mode of the AddTransaction endpoint
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = Accounts.objects.create(AccountID="AC00128")
+        cls.merchant = Merchants.objects.create(MerchantID="M015")
+        cls.device = Devices.objects.create(DeviceID="D000051")
+
+    def get_transaction_data(self):
+        """Helper method to create transaction data."""
+        return {
+            "AccountID": self.account.AccountID,
+            "TransactionDate": "2024-04-11 16:29:14",
+            "TransactionAmount": 100.50,
+            "TransactionType": "Credit",
+            "TransactionDuration": 120,
+            "Location": "New York",
+            "LoginAttempts": 1,
+            "IPAddress": "192.168.1.1",
+            "MerchantID": self.merchant.MerchantID,
+            "Channel": "ATM",
+            "DeviceID": self.device.DeviceID,
+            "CustomerAge": 30,
+            "CustomerOccupation": "Engineer",
+            "AccountBalance": 4900,
+            "PreviousTransactionDate": "2023-01-01 12:00:00",
+        }
+
+    def test_buffer_group_commits(self):
+        """Test success: Queued transactions are committed together and acknowledged."""
+        batches = []
+        buffer = WriteBehindBuffer(
+            capacity=100,
+            max_rows=10,
+            max_delay=0.5,
+            flush=batches.append,
+            shard_of=lambda item: "default",
+        )
+        futures = [buffer.submit(f"tx{i}") for i in range(10)]
+        self.assertEqual(
+            [future.result(timeout=5) for future in futures],
+            [f"tx{i}" for i in range(10)],
+        )
+        self.assertEqual(batches, [[f"tx{i}" for i in range(10)]])
+
+    def test_buffer_isolates_failing_rows(self):
+        """Test edge case: A failing row does not fail the rest of its batch."""
+
+        def flush(batch):
+            if "bad" in batch:
+                raise ValueError("bad row")
+
+        buffer = WriteBehindBuffer(
+            capacity=100,
+            max_rows=3,
+            max_delay=0.5,
+            flush=flush,
+            shard_of=lambda item: "default",
+        )
+        futures = [buffer.submit(item) for item in ("good", "bad", "also good")]
+        self.assertEqual(futures[0].result(timeout=5), "good")
+        self.assertRaises(ValueError, futures[1].result, timeout=5)
+        self.assertEqual(futures[2].result(timeout=5), "also good")
+
+    def test_buffer_retries_only_failed_shard(self):
+        """Test edge case: Rows committed on another shard are not flushed again."""
+        flushed = []
+
+        def flush(batch):
+            if "shard1:bad" in batch:
+                raise ValueError("bad row")
+            flushed.extend(batch)
+
+        buffer = WriteBehindBuffer(
+            capacity=100,
+            max_rows=3,
+            max_delay=0.5,
+            flush=flush,
+            shard_of=lambda item: item.split(":")[0],
+        )
+        futures = [
+            buffer.submit(item) for item in ("default:good", "shard1:bad", "shard1:good")
+        ]
+        self.assertEqual(futures[0].result(timeout=5), "default:good")
+        self.assertRaises(ValueError, futures[1].result, timeout=5)
+        self.assertEqual(futures[2].result(timeout=5), "shard1:good")
+        self.assertEqual(sorted(flushed), ["default:good", "shard1:good"])
+
+    @override_settings(TRANSACTIONS_WRITE_BEHIND=True)
+    def test_add_transaction_write_behind(self):
+        """Test success: The transaction is acknowledged once its batch is flushed."""
+        flushed = []
+        buffer = WriteBehindBuffer(
+            capacity=10, max_rows=10, max_delay=0.01, flush=flushed.extend
+        )
+        with mock.patch(
+            "transactions_app.views.get_write_behind_buffer", return_value=buffer
+        ):
+            response = self.client.post(
+                reverse("add_transaction"), self.get_transaction_data(), format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(flushed), 1)
+        self.assertEqual(flushed[0].AccountID, self.account)
+
+    @override_settings(TRANSACTIONS_WRITE_BEHIND=True, WRITE_BEHIND_RETRY_AFTER=2)
+    def test_add_transaction_queue_full(self):
+        """Test error: A full queue is reported with 503 and Retry-After."""
+        buffer = mock.Mock()
+        buffer.submit.side_effect = IngestQueueFull
+        with mock.patch(
+            "transactions_app.views.get_write_behind_buffer", return_value=buffer
+        ):
+            response = self.client.post(
+                reverse("add_transaction"), self.get_transaction_data(), format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response["Retry-After"], "2")
+        self.assertEqual(Transactions.objects.count(), 0)
+
+
+    @override_settings(TRANSACTIONS_WRITE_BEHIND=True, WRITE_BEHIND_TIMEOUT=0.05)
+    def test_add_transaction_commit_timeout(self):
+        """Test error: A stalled flusher is reported with 503 instead of hanging."""
+        release = threading.Event()
+        self.addCleanup(release.set)
+        buffer = WriteBehindBuffer(
+            capacity=10, max_rows=10, max_delay=0, flush=lambda batch: release.wait(5)
+        )
+        with mock.patch(
+            "transactions_app.views.get_write_behind_buffer", return_value=buffer
+        ):
+            response = self.client.post(
+                reverse("add_transaction"), self.get_transaction_data(), format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response["Retry-After"], "1")
+
+    @override_settings(TRANSACTIONS_WRITE_BEHIND=True)
+    def test_add_transaction_commit_error(self):
+        """Test error: A failed commit answers 500 without the database error."""
+        buffer = WriteBehindBuffer(
+            capacity=10,
+            max_rows=10,
+            max_delay=0,
+            flush=mock.Mock(side_effect=ValueError("secret")),
+        )
+        with mock.patch(
+            "transactions_app.views.get_write_behind_buffer", return_value=buffer
+        ), self.assertLogs("transactions_app.views", "ERROR"):
+            response = self.client.post(
+                reverse("add_transaction"), self.get_transaction_data(), format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertNotIn("secret", response.data["error"])
+
+
 class SuspiciousTransactionsTests(APITestCase):
     # Tests for SuspiciousTransactions endpoint
     @classmethod
@@ -323,156 +820,1652 @@ class SuspiciousTransactionsTests(APITestCase):
             num_transactions=1,
         )
 
-        # Call the endpoint
-        url = reverse("flagged_transactions", kwargs={"account_id": "AC00128"})
-        response = self.client.get(url)
+        # Call the endpoint
+        url = reverse("flagged_transactions", kwargs={"account_id": "AC00128"})
+        response = self.client.get(url)
+
+        # Verify the response
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 0)
+
+    def test_exact_threshold_for_login_attempts(self):
+        """Test edge case: Test with transactions having exactly 3 login attempts. These should not be flagged."""
+        # Add a transaction with the exact threshold of login attempts
+
+        create_transactions(self.account, self.merchant, self.device, login_attempts=3)
+
+        # Call the endpoint
+        url = reverse("flagged_transactions", kwargs={"account_id": "AC00128"})
+        response = self.client.get(url)
+
+        # Verify the response
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreaterEqual(len(response.data["results"]), 0)
+
+    def test_invalid_account_id(self):
+        """Test error: Invalid or non-existent account_id."""
+        url = reverse("flagged_transactions", kwargs={"account_id": "INVALID"})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 0)
+
+
+class HighFrequencyAccountsTests(APITestCase):
+    # Tests for HighFrequencyAccounts endpoint
+    @classmethod
+    def setUpTestData(cls):
+        cls.account, cls.merchant, cls.device, cls.transaction1 = create_test_data()
+
+    def test_high_frequency_account_detected(self):
+        """Test success: Retrieve high-frequency account."""
+        # Create multiple transactions for an account within a short period (e.g., 15 transactions within 1 hour).
+        create_transactions(
+            self.account, self.merchant, self.device, num_transactions=15
+        )
+
+        # Call the endpoint
+        url = reverse("high-frequency-accounts")
+        response = self.client.get(url)
+
+        # Verify the response
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreaterEqual(len(response.data["high_frequency_accounts"]), 1)
+
+    def test_multiple_accounts_with_high_frequency(self):
+        """Test success: Retrieve multiple accounts with high frequency."""
+        # Create two additional accounts
+        account1 = Accounts.objects.create(AccountID="AC00129")
+        account2 = Accounts.objects.create(AccountID="AC00130")
+        merchant = Merchants.objects.create(MerchantID="M016")
+        device = Devices.objects.create(DeviceID="D000052")
+
+        # Function to create multiple transactions for an account
+
+        # Create high-frequency transactions for multiple accounts
+        create_transactions(
+            self.account, merchant, device, num_transactions=20
+        )  # First account
+        create_transactions(
+            account1, merchant, device, num_transactions=25
+        )  # Second account
+        create_transactions(
+            account2, merchant, device, num_transactions=30
+        )  # Third account
+
+        # Call the endpoint
+        url = reverse("high-frequency-accounts")
+        response = self.client.get(url)
+
+        # Verify the response
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Verify that all three accounts are flagged
+        high_frequency_accounts = [
+            account["AccountID"] for account in response.data["high_frequency_accounts"]
+        ]
+        self.assertIn("AC00128", high_frequency_accounts)
+        self.assertIn("AC00129", high_frequency_accounts)
+        self.assertIn("AC00130", high_frequency_accounts)
+        self.assertEqual(len(high_frequency_accounts), 3)
+
+    def test_accounts_with_normal_frequency(self):
+        """Test success: Accounts with transactions spread over a larger time range are not flagged."""
+        # Create transactions spread over a larger time range
+        account1 = Accounts.objects.create(AccountID="AC00130")
+        account2 = Accounts.objects.create(AccountID="AC00131")
+        merchant = Merchants.objects.create(MerchantID="M017")
+        device = Devices.objects.create(DeviceID="D000053")
+
+        create_transactions(
+            self.account, merchant, device, time_gap="weeks", num_transactions=5
+        )
+        create_transactions(
+            account1, merchant, device, time_gap="weeks", num_transactions=5
+        )
+        create_transactions(
+            account2, merchant, device, time_gap="weeks", num_transactions=5
+        )
+
+        # Call the endpoint
+        url = reverse("high-frequency-accounts")
+        response = self.client.get(url)
+
+        # Verify the response
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        high_frequency_accounts = [
+            account["AccountID"] for account in response.data["high_frequency_accounts"]
+        ]
+        self.assertNotIn("AC00130", high_frequency_accounts)  # Should not be flagged
+        self.assertNotIn("AC00131", high_frequency_accounts)  # Should not be flagged
+
+    def test_single_account_and_trasaction(self):
+        """Test edge case: Only one transaction in the database.
+        The transaction should not be flagged under “high frequency” since there is only one transaction.
+        """
+
+        # Call the endpoint
+        url = reverse("high-frequency-accounts")
+        response = self.client.get(url)
+        print(response.data)
+
+        # Verify the response
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreaterEqual(
+            len(response.data["high_frequency_accounts"]), 0
+        )  # Should not be flagged
+
+    def test_exact_threshold_transactions(self):
+        """Test edge case: Test with transactions having exactly 10 transactions within 1 hour. These should not be flagged."""
+        # Create multiple transactions for an account within a short period (e.g., 10 transactions within 1 hour).
+        account = Accounts.objects.create(AccountID="AC00130")
+        merchant = Merchants.objects.create(MerchantID="M016")
+        device = Devices.objects.create(DeviceID="D000052")
+
+        create_transactions(account, merchant, device, num_transactions=10)
+
+        # Call the endpoint
+        url = reverse("high-frequency-accounts")
+        response = self.client.get(url)
+
+        # Verify the response
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["high_frequency_accounts"]), 0)
+
+    def test_invalid_parameters(self):
+        """Test error: days and threshold must be integers in range."""
+        url = reverse("high-frequency-accounts")
+        for params in (
+            {"days": "abc"},
+            {"days": 0},
+            {"days": -5},
+            {"days": 100000},
+            {"threshold": "ten"},
+            {"threshold": -1},
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn("error", response.data)
+
+
+class VelocityTrackerTests(APITestCase):
+    # Tests for the in-memory velocity tracker and the endpoint reading from it
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = Accounts.objects.create(AccountID="AC00128")
+        cls.merchant = Merchants.objects.create(MerchantID="M015")
+        cls.device = Devices.objects.create(DeviceID="D000051")
+
+    def setUp(self):
+        get_velocity_tracker().clear()
+
+    def test_window_counts_and_amounts(self):
+        """Test success: Counts and amounts per window."""
+        tracker = VelocityTracker(windows=(60, 3600), capacity=8, max_accounts=10)
+        now = time.time()
+        for seconds_ago, amount in ((1800, 10.0), (30, 20.5), (10, 5.25)):
+            tracker.record("AC00001", now - seconds_ago, amount)
+
+        self.assertEqual(
+            tracker.window("AC00001", 60, now=now),
+            {"transaction_count": 2, "total_amount": 25.75, "saturated": False},
+        )
+        self.assertEqual(tracker.window("AC00001", 3600, now=now)["total_amount"], 35.75)
+        # 40 seconds later the transaction of 30 seconds ago left the minute window
+        self.assertEqual(
+            tracker.window("AC00001", 60, now=now + 40)["transaction_count"], 1
+        )
+        self.assertEqual(tracker.window("AC00002", 60)["transaction_count"], 0)
+
+    def test_ring_buffer_saturation(self):
+        """Test edge case: More transactions than the buffer size."""
+        tracker = VelocityTracker(windows=(60,), capacity=4, max_accounts=10)
+        now = time.time()
+        for i in range(10):
+            tracker.record("AC00001", now, 1.0)
+
+        self.assertEqual(
+            tracker.window("AC00001", 60, now=now),
+            {"transaction_count": 4, "total_amount": 4.0, "saturated": True},
+        )
+
+    def test_buffers_grow_with_activity(self):
+        """Test success: A buffer only takes the slots of the transactions it holds."""
+        tracker = VelocityTracker(windows=(60,), capacity=256, max_accounts=10)
+        now = time.time()
+        for _ in range(3):
+            tracker.record("AC00001", now, 1.0)
+        self.assertEqual(tracker.memory_bytes, (3 + 3) * 8)
+
+        for _ in range(300):
+            tracker.record("AC00001", now, 1.0)
+        self.assertEqual(tracker.memory_bytes, (256 + 257) * 8)
+        self.assertEqual(
+            tracker.window("AC00001", 60, now=now),
+            {"transaction_count": 256, "total_amount": 256.0, "saturated": True},
+        )
+
+    def test_lru_eviction(self):
+        """Test edge case: The least recently active account is evicted at the cap."""
+        tracker = VelocityTracker(windows=(60,), capacity=4, max_accounts=2)
+        now = time.time()
+        for account_id in ("AC00001", "AC00002", "AC00001", "AC00003"):
+            tracker.record(account_id, now, 1.0)
+
+        self.assertEqual(len(tracker), 2)
+        self.assertEqual(tracker.window("AC00002", 60)["transaction_count"], 0)
+        self.assertEqual(tracker.window("AC00001", 60)["transaction_count"], 2)
+
+    def test_live_high_frequency_accounts(self):
+        """Test success: Accounts fed at insert time are reported by the live endpoint."""
+        with self.captureOnCommitCallbacks(execute=True):
+            create_transactions(
+                self.account, self.merchant, self.device, num_transactions=15
+            )
+
+        url = reverse("live-high-frequency-accounts")
+        response = self.client.get(url, {"window": "1h", "threshold": 10})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        accounts = response.data["high_frequency_accounts"]
+        self.assertEqual(len(accounts), 1)
+        self.assertEqual(accounts[0]["AccountID"], "AC00128")
+        self.assertEqual(accounts[0]["transaction_count"], 15)
+        self.assertEqual(accounts[0]["total_amount"], 15 * 100.50)
+
+    def test_live_high_frequency_invalid_window(self):
+        """Test error: Unsupported window."""
+        url = reverse("live-high-frequency-accounts")
+        response = self.client.get(url, {"window": "2h"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(VELOCITY_LIMITS={60: 3, 3600: 30})
+    def test_velocity_rule_flags_insert(self):
+        """Test success: The insert-time velocity rule flags the transaction over the limit."""
+        flagged = []
+
+        def on_flagged(sender, transaction, rules, **kwargs):
+            flagged.append((transaction.TransactionID, rules))
+
+        transaction_flagged.connect(on_flagged)
+        self.addCleanup(transaction_flagged.disconnect, on_flagged)
+        for _ in range(4):
+            with self.captureOnCommitCallbacks(execute=True):
+                create_transactions(
+                    self.account, self.merchant, self.device, num_transactions=1
+                )
+
+        self.assertEqual(flagged, [("TX000004", ["velocity"])])
+
+    def test_rolled_back_insert_not_counted(self):
+        """Test edge case: Only committed inserts are counted by the tracker."""
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            create_transactions(
+                self.account, self.merchant, self.device, num_transactions=2
+            )
+        tracker = get_velocity_tracker()
+        self.assertEqual(tracker.window("AC00128", 60)["transaction_count"], 0)
+
+        callbacks[0]()  # The first insert commits
+        self.assertEqual(tracker.window("AC00128", 60)["transaction_count"], 1)
+
+
+class AccountDailyActivityTests(APITestCase):
+    # Tests for the daily activity buckets backing HighFrequencyAccounts
+    @classmethod
+    def setUpTestData(cls):
+        cls.account, cls.merchant, cls.device, cls.transaction1 = create_test_data()
+
+    def test_buckets_maintained_on_insert_and_delete(self):
+        """Test success: Buckets follow single inserts, bulk inserts and deletes."""
+        create_transactions(
+            self.account, self.merchant, self.device, num_transactions=3, time_gap="days"
+        )
+        today = timezone.localdate()
+        bucket = AccountDailyActivity.objects.get(AccountID=self.account, Day=today)
+        self.assertEqual(bucket.TransactionCount, 2)
+        self.assertEqual(
+            AccountDailyActivity.objects.filter(AccountID=self.account).count(), 3
+        )
+
+        self.transaction1.delete()
+        bucket.refresh_from_db()
+        self.assertEqual(bucket.TransactionCount, 1)
+
+    def test_buckets_follow_updates(self):
+        """Test success: Editing a transaction moves it to its new buckets in every rollup."""
+        create_transactions(
+            self.account, self.merchant, self.device, num_transactions=3, time_gap="days"
+        )
+        edited = Transactions.objects.get(TransactionID=self.transaction1.TransactionID)
+        edited.TransactionAmount = Decimal("999.99")
+        edited.TransactionDate = timezone.make_aware(datetime(2020, 1, 15, 10, 30))
+        edited.Channel = "Online"
+        edited.save()
+
+        today = timezone.localdate()
+        bucket = AccountDailyActivity.objects.get(AccountID=self.account, Day=today)
+        self.assertEqual(bucket.TransactionCount, 1)
+        moved = AccountDailyActivity.objects.get(
+            AccountID=self.account, Day=date(2020, 1, 15)
+        )
+        self.assertEqual(moved.TransactionCount, 1)
+        # Today and yesterday: the transaction left today's bucket
+        response = self.client.get(
+            reverse("high-frequency-accounts"), {"days": 1, "threshold": 0}
+        )
+        self.assertEqual(
+            response.data["high_frequency_accounts"],
+            [{"AccountID": "AC00128", "transaction_count": 2}],
+        )
+
+        # Every rollup matches a rebuild from the table
+        models = (
+            AccountDailyActivity,
+            MerchantDailySummary,
+            AccountTimeSeries,
+            MerchantTimeSeries,
+            TransactionCube,
+        )
+
+        def rollup_rows():
+            # Emptied buckets may remain with a count of 0
+            rows = {}
+            for model in models:
+                fields = [
+                    field.attname
+                    for field in model._meta.concrete_fields
+                    if field.attname not in ("id", "UpdatedAt")
+                ]
+                rows[model] = set(
+                    model.objects.exclude(TransactionCount=0).values_list(*fields)
+                )
+            return rows
+
+        incremental = rollup_rows()
+        call_command(
+            "rebuild_rollups",
+            "account_activity",
+            "merchant_summary",
+            "timeseries",
+            "analytics_cube",
+            stdout=StringIO(),
+        )
+        self.assertEqual(rollup_rows(), incremental)
+
+    def test_insert_does_not_read_stored_version(self):
+        """Test success: Saving a new transaction does not look up a stored version."""
+        transaction = Transactions.objects.get(TransactionID=self.transaction1.TransactionID)
+        transaction.pk = None
+        transaction._state.adding = True
+        with CaptureQueriesContext(connection) as queries:
+            transaction.save()
+        lookup = f'FROM "{Transactions._meta.db_table}" WHERE'
+        self.assertFalse(
+            [query["sql"] for query in queries if lookup in query["sql"]]
+        )
+
+    def test_rebuild_matches_incremental(self):
+        """Test success: Rebuilding produces the incrementally maintained buckets."""
+        create_transactions(
+            self.account, self.merchant, self.device, num_transactions=5, time_gap="days"
+        )
+        incremental = set(
+            AccountDailyActivity.objects.values_list("AccountID", "Day", "TransactionCount")
+        )
+        call_command("rebuild_rollups", "account_activity", stdout=StringIO())
+        rebuilt = set(
+            AccountDailyActivity.objects.values_list("AccountID", "Day", "TransactionCount")
+        )
+        self.assertEqual(rebuilt, incremental)
+
+    def test_buckets_without_upsert_support(self):
+        """Test success: Buckets are maintained row by row on databases without upserts."""
+        with mock.patch.object(
+            connection.features, "supports_update_conflicts_with_target", False
+        ):
+            create_transactions(
+                self.account, self.merchant, self.device, num_transactions=3, time_gap="days"
+            )
+        bucket = AccountDailyActivity.objects.get(
+            AccountID=self.account, Day=timezone.localdate()
+        )
+        self.assertEqual(bucket.TransactionCount, 2)
+        self.assertEqual(
+            MerchantTimeSeries.objects.filter(Granularity="day").count(), 3
+        )
+
+    def test_configurable_threshold(self):
+        """Test success: The threshold is a query parameter."""
+        create_transactions(self.account, self.merchant, self.device, num_transactions=5)
+
+        url = reverse("high-frequency-accounts")
+        response = self.client.get(url, {"threshold": 5})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["threshold"], 5)
+        self.assertEqual(
+            response.data["high_frequency_accounts"],
+            [{"AccountID": "AC00128", "transaction_count": 6}],
+        )
+
+    def test_days_window(self):
+        """Test edge case: Only buckets inside the period are summed."""
+        create_transactions(
+            self.account, self.merchant, self.device, num_transactions=20, time_gap="days"
+        )
+
+        url = reverse("high-frequency-accounts")
+        response = self.client.get(url, {"days": 9, "threshold": 5})
+
+        # Today (2 transactions) and the 9 previous days
+        self.assertEqual(
+            response.data["high_frequency_accounts"][0]["transaction_count"], 11
+        )
+
+    def test_etag_revalidation(self):
+        """Test success: Unchanged results are revalidated with the ETag."""
+        url = reverse("high-frequency-accounts")
+        response = self.client.get(url)
+        etag = response["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # A new transaction changes the buckets and the ETag
+        create_transactions(self.account, self.merchant, self.device, num_transactions=1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class TimeSeriesTests(APITestCase):
+    # Tests for the account and merchant time-series endpoints
+    @classmethod
+    def setUpTestData(cls):
+        cls.account, cls.merchant, cls.device, cls.transaction1 = create_test_data()
+        for when, amount, channel in (
+            ("2024-03-01T10:00:00Z", 100, "ATM"),
+            ("2024-03-01T15:30:00Z", 50, "Online"),
+            ("2024-03-03T08:00:00Z", 25, "ATM"),
+        ):
+            Transactions.objects.create(
+                AccountID=cls.account,
+                MerchantID=cls.merchant,
+                DeviceID=cls.device,
+                TransactionAmount=amount,
+                TransactionDate=when,
+                TransactionType="Credit",
+                TransactionDuration=60,
+                LoginAttempts=1,
+                Location="New York",
+                Channel=channel,
+            )
+
+    def get_series(self, params, name="account-timeseries", **kwargs):
+        kwargs = kwargs or {"account_id": "AC00128"}
+        response = self.client.get(reverse(name, kwargs=kwargs), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_daily_series(self):
+        """Test success: Daily points, including empty days."""
+        data = self.get_series({"start": "2024-03-01", "end": "2024-03-03"})
+
+        self.assertEqual(data["bucket_size"], 1)
+        self.assertEqual(
+            [p["transaction_count"] for p in data["points"]], [2, 0, 1]
+        )
+        self.assertEqual([p["total_amount"] for p in data["points"]], [150, 0, 25])
+        self.assertEqual(data["points"][1]["start"].isoformat(), "2024-03-02T00:00:00+00:00")
+
+    def test_granularities(self):
+        """Test success: Hourly, weekly and monthly series add up to the same totals."""
+        hourly = self.get_series(
+            {"granularity": "hour", "start": "2024-03-01", "end": "2024-03-01"}
+        )
+        self.assertEqual(len(hourly["points"]), 24)
+        self.assertEqual(hourly["points"][10]["transaction_count"], 1)
+        self.assertEqual(hourly["points"][15]["total_amount"], 50)
+
+        # 2024-03-01 and 2024-03-03 are in the week starting on Monday 2024-02-26
+        weekly = self.get_series(
+            {"granularity": "week", "start": "2024-02-26", "end": "2024-03-10"}
+        )
+        self.assertEqual([p["transaction_count"] for p in weekly["points"]], [3, 0])
+
+        monthly = self.get_series(
+            {"granularity": "month", "start": "2024-01-01", "end": "2024-12-31"}
+        )
+        self.assertEqual(len(monthly["points"]), 12)
+        self.assertEqual(monthly["points"][2]["transaction_count"], 3)
+        self.assertEqual(monthly["points"][2]["total_amount"], 175)
+
+    def test_filters(self):
+        """Test success: Transaction type and channel filters."""
+        params = {"start": "2024-03-01", "end": "2024-03-03"}
+        online = self.get_series({**params, "channel": "Online"})
+        self.assertEqual([p["transaction_count"] for p in online["points"]], [1, 0, 0])
+
+        debit = self.get_series({**params, "transaction_type": "Debit"})
+        self.assertEqual([p["transaction_count"] for p in debit["points"]], [0, 0, 0])
+
+    def test_downsampling(self):
+        """Test edge case: Long ranges are merged into at most max_points points."""
+        data = self.get_series(
+            {
+                "granularity": "hour",
+                "start": "2024-03-01",
+                "end": "2024-03-03",
+                "max_points": 10,
+            }
+        )
+
+        # 72 hourly buckets, 8 per point
+        self.assertEqual(data["bucket_size"], 8)
+        self.assertEqual(len(data["points"]), 9)
+        self.assertEqual(sum(p["transaction_count"] for p in data["points"]), 3)
+        self.assertEqual(data["points"][1]["transaction_count"], 2)  # 08:00 to 16:00
+
+    def test_merchant_series_and_rebuild(self):
+        """Test success: Merchant series, and rebuilt buckets match the incremental ones."""
+        self.transaction1.delete()
+
+        def buckets(model):
+            return set(
+                model.objects.exclude(TransactionCount=0).values_list(
+                    "Granularity", "Start", "TransactionType", "Channel",
+                    "TransactionCount", "TotalAmount",
+                )
+            )
+
+        incremental = {m: buckets(m) for m in (AccountTimeSeries, MerchantTimeSeries)}
+        call_command("rebuild_rollups", "timeseries", stdout=StringIO())
+        for model, rows in incremental.items():
+            self.assertEqual(buckets(model), rows)
+
+        data = self.get_series(
+            {"granularity": "month", "start": "2024-03-01", "end": "2024-03-31"},
+            name="merchant-timeseries",
+            merchant_id="M015",
+        )
+        self.assertEqual(data["merchant_id"], "M015")
+        self.assertEqual(data["points"][0]["transaction_count"], 3)
+
+    def test_invalid_parameters(self):
+        """Test error: Invalid granularity, filters, max_points or range."""
+        url = reverse("account-timeseries", kwargs={"account_id": "AC00128"})
+        for params in (
+            {"granularity": "year"},
+            {"channel": "Phone"},
+            {"transaction_type": "Refund"},
+            {"max_points": 0},
+            {"start": "2024-03-03", "end": "2024-03-01"},
+            {"start": "yesterday"},
+        ):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AnalyticsCubeTests(APITestCase):
+    # Tests for the analytics cube endpoint
+    @classmethod
+    def setUpTestData(cls):
+        cls.account, cls.merchant, cls.device, cls.transaction1 = create_test_data()
+        create_transactions(
+            cls.account,
+            cls.merchant,
+            cls.device,
+            transaction_amount=10,
+            num_transactions=3,
+            transaction_type="Debit",
+            location="Boston",
+            channel="Online",
+            customer_age=20,
+            customer_occupation="Doctor",
+        )
+        create_transactions(
+            cls.account,
+            cls.merchant,
+            cls.device,
+            transaction_amount=30,
+            num_transactions=2,
+            transaction_type="Debit",
+            customer_age=70,
+        )
+
+    def get_cells(self, params):
+        response = self.client.get(reverse("analytics-cube"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["cells"]
+
+    def test_grand_total(self):
+        """Test success: Without group_by everything is rolled up into one cell."""
+        cells = self.get_cells({})
+        self.assertEqual(len(cells), 1)
+        self.assertEqual(cells[0]["transaction_count"], 6)
+        self.assertEqual(cells[0]["total_amount"], 190.5)
+
+    def test_roll_up_and_drill_down(self):
+        """Test success: Grouping by one, then two dimensions."""
+        cells = self.get_cells({"group_by": "channel"})
+        self.assertEqual(
+            [(c["channel"], c["transaction_count"]) for c in cells],
+            [("ATM", 3), ("Online", 3)],
+        )
+        self.assertEqual(cells[0]["average_amount"], 53.5)
+        self.assertEqual(cells[0]["stddev_amount"], round(st.pstdev([100.5, 30, 30]), 2))
+        self.assertEqual(cells[1]["stddev_amount"], 0)
+
+        cells = self.get_cells({"group_by": "channel,transaction_type,age_band"})
+        self.assertEqual(
+            [
+                (c["channel"], c["transaction_type"], c["age_band"], c["transaction_count"])
+                for c in cells
+            ],
+            [
+                ("ATM", "Credit", "25-34", 1),
+                ("ATM", "Debit", "65+", 2),
+                ("Online", "Debit", "18-24", 3),
+            ],
+        )
+
+    def test_filters(self):
+        """Test success: Filters on any subset of dimensions."""
+        cells = self.get_cells({"age_band": "18-24"})
+        self.assertEqual(cells[0]["transaction_count"], 3)
+
+        cells = self.get_cells(
+            {"channel": "ATM", "transaction_type": "Debit", "group_by": "occupation"}
+        )
+        self.assertEqual(len(cells), 1)
+        self.assertEqual(cells[0]["occupation"], "Engineer")
+        self.assertEqual(cells[0]["transaction_count"], 2)
+
+        self.assertEqual(self.get_cells({"location": "Paris"}), [])
+
+    def test_time_dimensions(self):
+        """Test success: Grouping by day and month, and a day range."""
+        today = timezone.localdate()
+        cells = self.get_cells({"group_by": "month"})
+        self.assertEqual(cells[0]["month"], today.replace(day=1))
+
+        tomorrow = today + timedelta(days=1)
+        self.assertEqual(self.get_cells({"start": tomorrow.isoformat()}), [])
+
+    def test_answered_from_cube(self):
+        """Test success: Slices never read the Transactions table."""
+        with CaptureQueriesContext(connection) as queries:
+            self.get_cells({"group_by": "location,day", "channel": "ATM,Online"})
+        self.assertLessEqual(len(queries), 3)
+        for query in queries:
+            self.assertNotIn("transactions_app_transactions", query["sql"])
+
+    def test_cells_keyed_on_dimension_tables(self):
+        """Test success: Cells store the dimension keys of their transactions."""
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT DISTINCT {quote('Location')}, {quote('Occupation')} "
+                f"FROM {quote(TransactionCube._meta.db_table)} WHERE {quote('Channel')} = %s",
+                [Transactions.Channel.field.codes["Online"]],
+            )
+            keys = cursor.fetchall()
+        self.assertEqual(
+            keys,
+            [
+                (
+                    Locations.objects.get(Name="Boston").pk,
+                    Occupations.objects.get(Name="Doctor").pk,
+                )
+            ],
+        )
+
+    def test_rebuild_matches_incremental(self):
+        """Test success: The incrementally maintained cube matches a full rebuild."""
+        self.transaction1.delete()
+        params = {"group_by": "channel,location,transaction_type,occupation,age_band,day"}
+        incremental = self.get_cells(params)
+        call_command("rebuild_rollups", "analytics_cube", stdout=StringIO())
+        self.assertEqual(self.get_cells(params), incremental)
+
+    def test_stddev_of_large_amounts(self):
+        """Test success: The standard deviation stays exact for large, close amounts."""
+        for amount in (10000000.01, 10000000.03):
+            create_transactions(
+                self.account,
+                self.merchant,
+                self.device,
+                transaction_amount=amount,
+                num_transactions=1,
+                location="Zurich",
+            )
+        params = {"location": "Zurich"}
+        self.assertEqual(self.get_cells(params)[0]["stddev_amount"], 0.01)
+        call_command("rebuild_rollups", "analytics_cube", stdout=StringIO())
+        self.assertEqual(self.get_cells(params)[0]["stddev_amount"], 0.01)
+
+    def test_invalid_parameters(self):
+        """Test error: Unknown dimension, age band or date."""
+        url = reverse("analytics-cube")
+        for params in (
+            {"group_by": "channel,merchant"},
+            {"age_band": "20-30"},
+            {"start": "2024-02-30"},
+        ):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SnapshotTests(APITestCase):
+    # Tests for the columnar snapshot and the ?source=snapshot endpoints
+    @classmethod
+    def setUpTestData(cls):
+        cls.account, cls.merchant, cls.device, cls.transaction1 = create_test_data()
+        create_transactions(cls.account, cls.merchant, cls.device, num_transactions=6)
+        create_transactions(
+            cls.account, cls.merchant, cls.device, num_transactions=1, location="Boston"
+        )
+        create_transactions(
+            cls.account,
+            cls.merchant,
+            cls.device,
+            transaction_amount=5000,
+            num_transactions=1,
+            login_attempts=5,
+            channel="Online",
+        )
+        account2 = Accounts.objects.create(AccountID="AC00129")
+        merchant2 = Merchants.objects.create(MerchantID="M016")
+        create_transactions(
+            account2, merchant2, cls.device, num_transactions=3, transaction_type="Debit"
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(TRANSACTIONS_SNAPSHOT_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.directory = directory.name
+
+    def build(self):
+        call_command("build_snapshot", stdout=StringIO())
+        return get_snapshot()
+
+    def assertSameResults(self, name, **kwargs):
+        url = reverse(name, kwargs=kwargs)
+        from_db = self.client.get(url)
+        from_snapshot = self.client.get(url, {"source": "snapshot"})
+        self.assertEqual(from_snapshot.status_code, status.HTTP_200_OK)
+        self.assertIn("X-Snapshot-Built-At", from_snapshot)
+        return from_db.data, from_snapshot.data
+
+    def test_endpoints_match_database(self):
+        """Test success: Fraud, insights and merchant endpoints give the same results."""
+        self.build()
+
+        from_db, from_snapshot = self.assertSameResults(
+            "flagged_transactions", account_id="AC00128"
+        )
+        self.assertEqual(from_snapshot["count"], 2)
+        self.assertCountEqual(from_snapshot["results"], from_db["results"])
+
+        for account_id in ("AC00128", "AC00129", "AC99999"):
+            from_db, from_snapshot = self.assertSameResults(
+                "transaction-spending-insights", account_id=account_id
+            )
+            self.assertEqual(from_snapshot, from_db)
+
+        for merchant_id in ("M015", "M016", "M999"):
+            from_db, from_snapshot = self.assertSameResults(
+                "merchant-summary", merchant_id=merchant_id
+            )
+            self.assertEqual(from_snapshot, from_db)
+
+    def test_account_offsets(self):
+        """Test success: Each account's rows are one slice, ordered by date."""
+        snapshot = self.build()
+        self.assertEqual(snapshot.rows, Transactions.objects.count())
+
+        for account_id in ("AC00128", "AC00129"):
+            rows = snapshot.account_rows(account_id)
+            self.assertEqual(
+                rows.stop - rows.start,
+                Transactions.objects.filter(AccountID=account_id).count(),
+            )
+            self.assertTrue(
+                all(snapshot.columns["account"][rows] == snapshot.code("account", account_id))
+            )
+            self.assertTrue(all(np.diff(snapshot.columns["timestamp"][rows]) >= 0))
+        self.assertEqual(snapshot.account_rows("AC99999"), slice(0, 0))
+
+    def test_memory_mapped(self):
+        """Test success: Columns are read-only memory maps and slices are views."""
+        snapshot = self.build()
+        amounts = snapshot.columns["amount_cents"]
+        self.assertIsInstance(amounts, np.memmap)
+        self.assertFalse(amounts.flags.writeable)
+        self.assertTrue(np.shares_memory(amounts[snapshot.account_rows("AC00129")], amounts))
+
+    def test_rebuild_switches_snapshot(self):
+        """Test success: A rebuilt snapshot replaces the current one; old ones are pruned."""
+        first = self.build()
+        create_transactions(self.account, self.merchant, self.device, num_transactions=1)
+        second = self.build()
+        self.assertNotEqual(second.path, first.path)
+        self.assertEqual(second.rows, first.rows + 1)
+
+        self.build()
+        directories = [p for p in os.scandir(self.directory) if p.is_dir()]
+        self.assertEqual(len(directories), 2)
+
+    def test_invalid_source(self):
+        """Test error: Unknown source, or no snapshot built yet."""
+        url = reverse("merchant-summary", kwargs={"merchant_id": "M015"})
+        response = self.client.get(url, {"source": "snapshot"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.build()
+        response = self.client.get(url, {"source": "cache"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ArchiveTests(APITestCase):
+    # Tests for the archive_transactions command and the endpoints reading the archive
+    @classmethod
+    def setUpTestData(cls):
+        cls.account, cls.merchant, cls.device, cls.transaction1 = create_test_data()
+        # One transaction a week over 12 weeks; the oldest gets the highest TransactionID
+        create_transactions(
+            cls.account, cls.merchant, cls.device, num_transactions=12, time_gap="weeks"
+        )
+        merchant2 = Merchants.objects.create(MerchantID="M016")
+        create_transactions(
+            cls.account,
+            merchant2,
+            cls.device,
+            transaction_amount=20.25,
+            num_transactions=6,
+            time_gap="weeks",
+        )
+        cls.before = (timezone.now() - timedelta(weeks=4)).date()
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(TRANSACTIONS_ARCHIVE_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(archive.forget_partitions)
+        self.directory = directory.name
+
+    def archive(self, before=None):
+        out = StringIO()
+        # Partitions are published once the archiving transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                "archive_transactions", "--before", str(before or self.before), stdout=out
+            )
+        return out.getvalue()
+
+    def history(self):
+        url = reverse("transactions_by_account", args=["AC00128"])
+        results, page = [], 1
+        while True:
+            response = self.client.get(url, {"page": page})
+            results.extend(response.data["results"])
+            if not response.data["next"]:
+                return results
+            page += 1
+
+    def test_archive_moves_old_transactions(self):
+        """Test success: Old transactions move to monthly files, except the highest ID."""
+        old = Transactions.objects.filter(
+            TransactionDate__date__lt=self.before
+        ).exclude(TransactionID="TX000019")
+        expected = old.count()
+        summaries = list(MerchantDailySummary.objects.values())
+        changes = TransactionChange.objects.count()
+
+        output = self.archive()
+
+        self.assertIn(f"Archived {expected} transactions", output)
+        self.assertFalse(old.exists())
+        self.assertTrue(Transactions.objects.filter(TransactionID="TX000019").exists())
+        self.assertTrue(os.listdir(self.directory))
+        self.assertTrue(all(name.endswith(".npy") for name in os.listdir(self.directory)))
+        # Archiving is not a delete: rollups and change log are unchanged
+        self.assertEqual(list(MerchantDailySummary.objects.values()), summaries)
+        self.assertEqual(TransactionChange.objects.count(), changes)
+
+    def test_endpoints_combine_table_and_archive(self):
+        """Test success: History and merchant summaries are the same after archiving."""
+        urls = [
+            (reverse("merchant-summary", args=["M015"]), {}),
+            (reverse("merchants-summary"), {}),
+            (
+                reverse("merchants-summary"),
+                {
+                    "merchant_ids": "M015,M016,M017",
+                    "start": str(self.before - timedelta(weeks=5)),
+                    "end": str(self.before + timedelta(days=10)),
+                },
+            ),
+        ]
+        history = self.history()
+        summaries = [self.client.get(url, params).data for url, params in urls]
+
+        self.archive()
+        self.assertEqual(self.history(), history)
+        for (url, params), summary in zip(urls, summaries):
+            self.assertEqual(self.client.get(url, params).data, summary)
+
+        # Archiving again merges with the existing partitions
+        self.archive(timezone.now().date() + timedelta(days=1))
+        self.assertEqual(Transactions.objects.count(), 1)
+        self.assertEqual(self.history(), history)
+        for (url, params), summary in zip(urls, summaries):
+            self.assertEqual(self.client.get(url, params).data, summary)
+
+    def test_async_endpoints_combine_table_and_archive(self):
+        """Test success: The async history and merchant summary include the archive."""
+        history_url = reverse("async_transactions_by_account", args=["AC00128"])
+        summary_url = reverse("async-merchant-summary", args=["M015"])
+        history = self.client.get(history_url, {"page": 2}).json()
+        summary = self.client.get(summary_url).json()
+
+        self.archive()
+        self.assertEqual(self.client.get(history_url, {"page": 2}).json(), history)
+        self.assertEqual(self.client.get(summary_url).json(), summary)
+
+    def test_history_page_reads_only_its_rows(self):
+        """Test success: A page of the history only builds and fetches its own rows."""
+        self.archive()
+        url = reverse("transactions_by_account", args=["AC00128"])
+        with mock.patch(
+            "transactions_app.archive.to_transaction", wraps=archive.to_transaction
+        ) as to_transaction:
+            response = self.client.get(url, {"page": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        page_size = settings.REST_FRAMEWORK["PAGE_SIZE"]
+        self.assertEqual(len(response.data["results"]), page_size)
+        self.assertLessEqual(to_transaction.call_count, page_size)
+        self.assertEqual(response.data["count"], len(self.history()))
+
+    def test_partitions_outside_range_skipped(self):
+        """Test success: Only the partitions of the requested months are read."""
+        self.archive(timezone.now().date() + timedelta(days=1))
+        start = timezone.now().date() - timedelta(days=2)
+        with mock.patch(
+            "transactions_app.archive.read_partition", wraps=archive.read_partition
+        ) as read_partition:
+            response = self.client.get(
+                reverse("merchants-summary"), {"start": str(start), "end": str(start)}
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        months = {os.path.basename(call.args[0]) for call in read_partition.call_args_list}
+        self.assertEqual(months, {f"{start:%Y-%m}.npy"})
+
+    def test_partitions_mapped_once(self):
+        """Test success: Partitions are memory-mapped once, however many months there are."""
+        columns = archive.row_columns(Transactions.objects.values(*archive.COLUMNS)[:1])
+        month = date(2020, 1, 1)
+        for _ in range(40):
+            archive.write_partition(archive.partition_path(month), columns).replace(
+                archive.partition_path(month)
+            )
+            month = archive.next_month(month)
+        with mock.patch("transactions_app.archive.np.load", wraps=np.load) as load:
+            for _ in range(2):
+                history = archive.AccountHistory("AC00128", Transactions.objects.none())
+                self.assertEqual(len(history), 40)
+        self.assertEqual(load.call_count, 40)
+        self.assertTrue(all(call.kwargs["mmap_mode"] == "r" for call in load.call_args_list))
+        columns = archive.read_partition(archive.partition_path(date(2020, 1, 1)))
+        self.assertIsInstance(columns["AccountID"], np.memmap)
+
+    def test_failed_commit_keeps_partition(self):
+        """Test failure: Rows stay out of the archive when their delete does not commit."""
+        with self.captureOnCommitCallbacks() as callbacks:
+            call_command("archive_transactions", "--before", str(self.before), stdout=StringIO())
+        # Not committed: nothing published, the transactions are only in the table
+        self.assertTrue(callbacks)
+        self.assertEqual(archive.partitions(), [])
+        self.assertTrue(all(".tmp." in name for name in os.listdir(self.directory)))
+
+    def test_invalid_date(self):
+        """Test edge case: --before must be a date."""
+        with self.assertRaises(CommandError):
+            self.archive("last week")
+
+
+class ShardingTests(APITestCase):
+    # Tests for the placement of accounts on shards and the routing of queries
+    @classmethod
+    def setUpTestData(cls):
+        cls.account, cls.merchant, cls.device, cls.transaction1 = create_test_data()
+
+    def setUp(self):
+        sharding.forget_directory()
+        self.addCleanup(sharding.forget_directory)
+
+    def test_single_shard(self):
+        """Test success: With one shard, everything is on "default" without a query."""
+        with self.assertNumQueries(0):
+            self.assertEqual(sharding.shard_for("AC00128"), "default")
+        self.assertEqual(router.db_for_write(Transactions), "default")
+        self.assertEqual(sharding.scatter(Transactions.objects.count), [1])
+
+    @override_settings(TRANSACTIONS_SHARDS=["default", "shard1"])
+    def test_directory_overrides_hash(self):
+        """Test success: Accounts are hashed to a shard unless the directory moved them."""
+        hashed = sharding.hashed_shard("AC00128")
+        other = "shard1" if hashed == "default" else "default"
+        self.assertEqual(sharding.shard_for("AC00128"), hashed)
+
+        sharding.assign_account("AC00128", other)
+        self.assertEqual(sharding.shard_for("AC00128"), other)
+
+        # Moving it back to its hashed shard removes the entry
+        sharding.assign_account("AC00128", hashed)
+        self.assertFalse(AccountShard.objects.exists())
+        self.assertEqual(sharding.shard_for("AC00128"), hashed)
+
+    @override_settings(TRANSACTIONS_SHARDS=["default", "shard1"])
+    def test_unknown_shard_in_directory(self):
+        """Test edge case: An entry naming a removed shard falls back to the hash."""
+        AccountShard.objects.create(AccountID="AC00128", Shard="shard9")
+        self.assertEqual(sharding.shard_for("AC00128"), sharding.hashed_shard("AC00128"))
+
+    def test_router(self):
+        """Test success: Sharded models follow use_shard(), the others stay on default."""
+        with sharding.use_shard("shard1"):
+            self.assertEqual(router.db_for_read(Transactions), "shard1")
+            self.assertEqual(router.db_for_write(AccountDailyActivity), "shard1")
+            self.assertEqual(router.db_for_write(Accounts), "default")
+        # Outside use_shard(), instances go back to the database they came from
+        instance = Transactions(TransactionID="TX000002")
+        instance._state.db = "shard1"
+        self.assertEqual(router.db_for_write(Transactions, instance=instance), "shard1")
+        self.assertEqual(router.db_for_write(Transactions), "default")
+
+    @override_settings(TRANSACTIONS_SHARDS=["default", "shard1"])
+    def test_scatter_reuses_threads_and_connections(self):
+        """Test success: Every scatter() runs on the same threads and keeps their connections."""
+        with mock.patch(
+            "transactions_app.sharding.close_old_connections"
+        ) as close_old_connections:
+            first = sharding.scatter(sharding.current_db)
+            executor = sharding.executor()
+            second = sharding.scatter(sharding.current_db)
+        self.assertEqual(first, ["default", "shard1"])
+        self.assertEqual(second, first)
+        self.assertIs(sharding.executor(), executor)
+        # Only the connections past CONN_MAX_AGE are closed, as after a request
+        self.assertEqual(close_old_connections.call_count, 4)
+
+    @override_settings(TRANSACTION_ID_BLOCK_SIZE=5)
+    def test_allocate_ids_in_blocks(self):
+        """Test success: IDs come from blocks reserved in the sequence, for every shard."""
+        forget_id_block()
+        self.addCleanup(forget_id_block)
+        # The sequence starts after the highest ID
+        self.assertEqual(Transactions.allocate_ids(2), ["TX000002", "TX000003"])
+        with self.assertNumQueries(0), sharding.use_shard("shard1"):
+            self.assertEqual(Transactions.allocate_ids(2), ["TX000004", "TX000005"])
+        # Not enough left in the block: the next one is reserved
+        self.assertEqual(Transactions.allocate_ids(2), ["TX000007", "TX000008"])
+        self.assertEqual(IDSequence.objects.get(Name="TransactionID").LastValue, 11)
+
+    @override_settings(TRANSACTION_ID_BLOCK_SIZE=5)
+    def test_taken_id_reserves_new_block(self):
+        """Test edge case: An insert hitting a taken ID retries with a new block."""
+        forget_id_block()
+        self.addCleanup(forget_id_block)
+        self.assertEqual(Transactions.allocate_ids(1), ["TX000002"])
+        taken = Transactions.objects.get(TransactionID=self.transaction1.TransactionID)
+        taken.TransactionID = "TX000003"
+        taken.save()
+
+        create_transactions(self.account, self.merchant, self.device, num_transactions=1)
+        self.assertTrue(Transactions.objects.filter(TransactionID="TX000007").exists())
+
+    def test_merge_partial_results(self):
+        """Test success: Partial aggregates of the shards are added up."""
+        self.assertEqual(
+            sharding.merge_sums(
+                [{"total": 10, "count": 2}, {"total": None, "count": 0}], ["total", "count"]
+            ),
+            {"total": 10, "count": 2},
+        )
+        merged = sharding.merge_groups(
+            [
+                [{"MerchantID": "M015", "total": 5}, {"MerchantID": "M016", "total": 1}],
+                [{"MerchantID": "M015", "total": 7}],
+            ],
+            "MerchantID",
+            ["total"],
+        )
+        self.assertEqual(
+            sorted(merged, key=lambda row: row["MerchantID"]),
+            [{"MerchantID": "M015", "total": 12}, {"MerchantID": "M016", "total": 1}],
+        )
+
+    def test_cross_shard_endpoints(self):
+        """Test success: Cross-account endpoints add up the results of every shard."""
+        create_transactions(self.account, self.merchant, self.device, num_transactions=4)
+        requests = {
+            "bursts": (
+                reverse("burst-accounts"),
+                {"min_transactions": 2, "window": "1h"},
+            ),
+            "timeseries": (
+                reverse("merchant-timeseries", args=["M015"]),
+                {"granularity": "month", "start": "2020-01-01"},
+            ),
+            "cube": (reverse("analytics-cube"), {"group_by": "channel"}),
+        }
+
+        def get_all():
+            return {
+                name: self.client.get(url, params).data
+                for name, (url, params) in requests.items()
+            }
+
+        single = get_all()
+
+        def two_shards(func):
+            # Two shards holding the same rows: every total doubles
+            with sharding.use_shard("default"):
+                return [func(), func()]
+
+        with mock.patch("transactions_app.sharding.scatter", side_effect=two_shards):
+            double = get_all()
+
+        self.assertEqual(
+            len(double["bursts"]["burst_accounts"]),
+            2 * len(single["bursts"]["burst_accounts"]),
+        )
+        self.assertEqual(
+            sum(p["transaction_count"] for p in double["timeseries"]["points"]),
+            2 * sum(p["transaction_count"] for p in single["timeseries"]["points"]),
+        )
+        self.assertEqual(
+            [cell["transaction_count"] for cell in double["cube"]["cells"]],
+            [2 * cell["transaction_count"] for cell in single["cube"]["cells"]],
+        )
+
+    @override_settings(TRANSACTIONS_SHARDS=["default", "shard1"])
+    def test_change_log_per_shard(self):
+        """Test failure: With several shards, change log readers name their shard."""
+        for name in ("changes-feed", "changelog-lag"):
+            response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("shard must be one of default, shard1", response.data["error"])
+            response = self.client.get(reverse(name), {"shard": "default"})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_rebalance_command(self):
+        """Test success: Nothing is misplaced with one shard; --to must name a shard."""
+        out = StringIO()
+        call_command("rebalance_shards", stdout=out)
+        self.assertIn("moved 0 accounts (0 rows)", out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("rebalance_shards", "AC00128", "--to", "shard9")
+        with self.assertRaises(CommandError):
+            call_command("rebalance_shards", "--to", "default")
+
+
+class ReplicaTests(APITestCase):
+    # Tests for the routing of the analytics reads to the read replicas
+    @classmethod
+    def setUpTestData(cls):
+        cls.account, cls.merchant, cls.device, cls.transaction1 = create_test_data()
+
+    def get_reading(self, url, params=None):
+        """GET ``url`` and return the response and whether each read could use a replica."""
+        reading = []
+
+        def read_alias(alias):
+            reading.append(replicas._reading.get())
+            return alias
+
+        with mock.patch("transactions_app.replicas.read_alias", side_effect=read_alias):
+            response = self.client.get(url, params)
+        return response, reading
+
+    @override_settings(TRANSACTIONS_REPLICAS={"default": ["replica1", "replica2"]})
+    def test_router(self):
+        """Test success: Reads take the replicas in turn, writes stay on the primary."""
+        self.assertEqual(router.db_for_read(Transactions), "default")
+        with replicas.use_replicas():
+            reads = [router.db_for_read(Transactions) for _ in range(4)]
+            self.assertEqual(router.db_for_read(Accounts)[:7], "replica")
+            self.assertEqual(router.db_for_write(Transactions), "default")
+        self.assertEqual(set(reads), {"replica1", "replica2"})
+        self.assertNotEqual(reads[0], reads[1])
+        # An instance read from a replica is written back to its primary
+        instance = Transactions(TransactionID="TX000002")
+        instance._state.db = "replica1"
+        self.assertEqual(router.db_for_write(Transactions, instance=instance), "default")
+
+    def test_analytics_views_use_replicas(self):
+        """Test success: Analytics endpoints read from the replicas, history does not."""
+        response, reading = self.get_reading(
+            reverse("transaction-spending-insights", args=["AC00128"])
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(reading)
+        self.assertTrue(all(reading))
+
+        response, reading = self.get_reading(
+            reverse("transactions_by_account", args=["AC00128"])
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(any(reading))
+
+    @override_settings(TRANSACTIONS_REPLICAS={"default": ["default"]})
+    def test_write_pins_client_to_primary(self):
+        """Test success: After a write, the client reads from the primary."""
+        data = {
+            "AccountID": "AC00128",
+            "TransactionDate": "2024-04-11 16:29:14",
+            "TransactionAmount": 100.50,
+            "TransactionType": "Credit",
+            "TransactionDuration": 120,
+            "Location": "New York",
+            "LoginAttempts": 1,
+            "IPAddress": "192.168.1.1",
+            "MerchantID": "M015",
+            "Channel": "ATM",
+            "DeviceID": "D000051",
+            "CustomerAge": 30,
+            "CustomerOccupation": "Engineer",
+            "AccountBalance": 4900,
+            "PreviousTransactionDate": "2023-01-01 12:00:00",
+        }
+        response = self.client.post(reverse("add_transaction"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.cookies[replicas.PIN_COOKIE]["max-age"], 5)
+
+        response, reading = self.get_reading(
+            reverse("transaction-spending-insights", args=["AC00128"])
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(reading)
+        self.assertFalse(any(reading))
+
+
+class ChangeLogTests(APITestCase):
+    # Tests for the Transactions change log and the incremental snapshot refresh
+    @classmethod
+    def setUpTestData(cls):
+        cls.account, cls.merchant, cls.device, cls.transaction1 = create_test_data()
+        create_transactions(cls.account, cls.merchant, cls.device, num_transactions=4)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(TRANSACTIONS_SNAPSHOT_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def operations(self):
+        return list(
+            TransactionChange.objects.order_by("Sequence").values_list(
+                "TransactionID", "Operation"
+            )
+        )
+
+    def test_changes_logged(self):
+        """Test success: Inserts, updates and deletes each append one change."""
+        TransactionChange.objects.all().delete()
+        create_transactions(self.account, self.merchant, self.device, num_transactions=1)
+        tx = Transactions.objects.latest("TransactionID")
+        tx_id = tx.TransactionID
+        tx.TransactionAmount = Decimal("12.34")
+        tx.save()
+        tx.delete()
+
+        self.assertEqual(
+            self.operations(),
+            [(tx_id, "insert"), (tx_id, "update"), (tx_id, "delete")],
+        )
+        update = TransactionChange.objects.get(Operation="update")
+        self.assertEqual(update.Data["TransactionAmount"], "12.34")
+        self.assertEqual(update.Data["AccountID"], "AC00128")
+
+    def test_bulk_insert_logged(self):
+        """Test success: A bulk insert logs one change per transaction."""
+        TransactionChange.objects.all().delete()
+        url = reverse("add_transaction_bulk")
+        data = [
+            {
+                "AccountID": "AC00128",
+                "TransactionDate": "2024-04-11 16:29:14",
+                "TransactionAmount": 100.50,
+                "TransactionType": "Credit",
+                "TransactionDuration": 120,
+                "Location": "New York",
+                "LoginAttempts": 1,
+                "IPAddress": "192.168.1.1",
+                "MerchantID": "M015",
+                "Channel": "ATM",
+                "DeviceID": "D000051",
+                "CustomerAge": 30,
+                "CustomerOccupation": "Engineer",
+                "AccountBalance": 4900,
+                "PreviousTransactionDate": "2023-01-01 12:00:00",
+            }
+            for _ in range(3)
+        ]
+        response = self.client.post(url, data, format="json")
+        self.assertEqual(
+            self.operations(),
+            [(tx_id, "insert") for tx_id in response.data["transaction_ids"]],
+        )
+
+    def test_rollback_not_logged(self):
+        """Test success: A rolled back change leaves nothing in the log."""
+        count = TransactionChange.objects.count()
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                create_transactions(self.account, self.merchant, self.device, num_transactions=2)
+                raise RuntimeError
+        self.assertEqual(TransactionChange.objects.count(), count)
 
-        # Verify the response
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data["results"]), 0)
+    def test_snapshot_refreshed_incrementally(self):
+        """Test success: Consuming the log brings the snapshot up to date."""
+        call_command("build_snapshot", stdout=StringIO())
+        self.assertEqual(consume("snapshot"), 0)
 
-    def test_exact_threshold_for_login_attempts(self):
-        """Test edge case: Test with transactions having exactly 3 login attempts. These should not be flagged."""
-        # Add a transaction with the exact threshold of login attempts
+        create_transactions(
+            self.account, self.merchant, self.device, num_transactions=2, location="Boston"
+        )
+        updated = Transactions.objects.get(TransactionID=self.transaction1.TransactionID)
+        updated.TransactionAmount = Decimal("999.99")
+        updated.save()
+        Transactions.objects.latest("TransactionID").delete()
+
+        self.assertEqual(consume("snapshot"), 4)
+        snapshot = get_snapshot()
+        self.assertEqual(snapshot.rows, Transactions.objects.count())
+        self.assertEqual(snapshot.sequences["default"], TransactionChange.objects.latest("Sequence").Sequence)
+        url = reverse("merchant-summary", kwargs={"merchant_id": "M015"})
+        self.assertEqual(
+            self.client.get(url, {"source": "snapshot"}).data, self.client.get(url).data
+        )
+        self.assertEqual(
+            snapshot.value_counts("location", slice(None), "Location")[-1],
+            {"Location": "Boston", "count": 1},
+        )
 
-        create_transactions(self.account, self.merchant, self.device, login_attempts=3)
+        # Applying the same changes again changes nothing
+        apply_changes(list(TransactionChange.objects.order_by("Sequence")))
+        self.assertEqual(get_snapshot().rows, Transactions.objects.count())
+
+    def test_snapshot_patch_matches_rebuild(self):
+        """Test success: Patching the snapshot gives the rows of a full rebuild."""
+        create_transactions(self.account, self.merchant, self.device, num_transactions=4)
+        call_command("build_snapshot", stdout=StringIO())
+
+        # An update keeping its account and date only rewrites the changed column
+        updated = Transactions.objects.get(TransactionID=self.transaction1.TransactionID)
+        updated.TransactionAmount = Decimal("12.34")
+        updated.save()
+        before = get_snapshot()
+        consume("snapshot")
+        after = get_snapshot()
+        self.assertNotEqual(after.path, before.path)
+        for name in before.columns:
+            same_file = os.path.samefile(
+                before.path / f"{name}.npy", after.path / f"{name}.npy"
+            )
+            self.assertEqual(same_file, name != "amount_cents", name)
+
+        # Inserts with new dictionary values, a moved date and a delete
+        create_transactions(
+            self.account, self.merchant, self.device, num_transactions=2, location="Austin"
+        )
+        updated.TransactionDate = timezone.now() - timedelta(days=400)
+        updated.save()
+        Transactions.objects.exclude(TransactionID=updated.TransactionID).first().delete()
+        consume("snapshot")
+
+        def decoded(snapshot):
+            columns = snapshot.columns
+            rows = {
+                name: [snapshot.decode(name, code) for code in columns[name]]
+                for name in ENCODED_COLUMNS
+            }
+            rows.update({name: columns[name].tolist() for name in PLAIN_COLUMNS})
+            rows["account_offsets"] = columns["account_offsets"].tolist()
+            return rows
 
-        # Call the endpoint
-        url = reverse("flagged_transactions", kwargs={"account_id": "AC00128"})
-        response = self.client.get(url)
+        patched = decoded(get_snapshot())
+        call_command("build_snapshot", stdout=StringIO())
+        self.assertEqual(patched, decoded(get_snapshot()))
 
-        # Verify the response
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertGreaterEqual(len(response.data["results"]), 0)
+    def test_freshness_and_compaction(self):
+        """Test success: Lag endpoint reports the backlog; compaction keeps unapplied changes."""
+        call_command("build_snapshot", stdout=StringIO())
+        create_transactions(self.account, self.merchant, self.device, num_transactions=3)
+        url = reverse("changelog-lag")
 
-    def test_invalid_account_id(self):
-        """Test error: Invalid or non-existent account_id."""
-        url = reverse("flagged_transactions", kwargs={"account_id": "INVALID"})
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data["results"]), 0)
+        head = response.data["head"]
+        self.assertEqual(response.data["consumers"]["snapshot"]["lag"], 3)
+        self.assertGreaterEqual(response.data["consumers"]["snapshot"]["lag_seconds"], 0)
 
+        applied = TransactionChange.objects.count() - 3
+        self.assertEqual(compact(), applied)
+        self.assertEqual(TransactionChange.objects.count(), 3)
 
-class HighFrequencyAccountsTests(APITestCase):
-    # Tests for HighFrequencyAccounts endpoint
-    @classmethod
-    def setUpTestData(cls):
-        cls.account, cls.merchant, cls.device, cls.transaction1 = create_test_data()
-
-    def test_high_frequency_account_detected(self):
-        """Test success: Retrieve high-frequency account."""
-        # Create multiple transactions for an account within a short period (e.g., 15 transactions within 1 hour).
-        create_transactions(
-            self.account, self.merchant, self.device, num_transactions=15
+        call_command("consume_changes", "--compact", stdout=StringIO())
+        self.assertEqual(TransactionChange.objects.count(), 0)
+        response = self.client.get(url)
+        self.assertEqual(response.data["head"], head)
+        self.assertEqual(
+            response.data["consumers"]["snapshot"],
+            {"applied": head, "lag": 0, "lag_seconds": 0},
         )
 
-        # Call the endpoint
-        url = reverse("high-frequency-accounts")
-        response = self.client.get(url)
+    def test_changes_feed(self):
+        """Test success: The feed pages through the changes in commit order."""
+        url = reverse("changes-feed")
+        head = TransactionChange.objects.latest("Sequence").Sequence
+        response = self.client.get(url, {"limit": 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        sequences = [change["sequence"] for change in response.data["changes"]]
+        self.assertEqual(sequences, sorted(sequences))
+        self.assertEqual(len(sequences), 3)
+        self.assertEqual(response.data["next"], sequences[-1])
+        self.assertEqual(response.data["changes"][0]["operation"], "insert")
+
+        response = self.client.get(url, {"since": response.data["next"]})
+        self.assertEqual(len(response.data["changes"]), 2)
+        self.assertEqual(response.data["next"], head)
+
+        response = self.client.get(url, {"since": head})
+        self.assertEqual(response.data, {"changes": [], "next": head})
+
+    @override_settings(CHANGELOG_BATCH_SIZE=2)
+    def test_changes_feed_ndjson(self):
+        """Test success: NDJSON streams every change, fetched in batches."""
+        response = self.client.get(
+            reverse("changes-feed"), HTTP_ACCEPT="application/x-ndjson"
+        )
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(
+            [json.loads(line)["transaction_id"] for line in lines],
+            list(
+                TransactionChange.objects.order_by("Sequence").values_list(
+                    "TransactionID", flat=True
+                )
+            ),
+        )
 
-        # Verify the response
+    def test_changes_feed_long_poll(self):
+        """Test success: A long-poll returns as soon as a change is committed."""
+        head = TransactionChange.objects.latest("Sequence").Sequence
+
+        def commit_change(seconds):
+            create_transactions(self.account, self.merchant, self.device, num_transactions=1)
+
+        with mock.patch("transactions_app.views.sleep", side_effect=commit_change) as sleep:
+            response = self.client.get(reverse("changes-feed"), {"since": head, "wait": 5})
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual(len(response.data["changes"]), 1)
+        self.assertEqual(response.data["next"], head + 1)
+
+    @override_settings(CHANGES_FEED_SYNC_MAX_WAIT=0)
+    def test_changes_feed_sync_wait_capped(self):
+        """Test success: The sync feed cuts long-polls short instead of holding a thread."""
+        head = TransactionChange.objects.latest("Sequence").Sequence
+        with mock.patch("transactions_app.views.sleep") as sleep:
+            response = self.client.get(reverse("changes-feed"), {"since": head, "wait": 30})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertGreaterEqual(len(response.data["high_frequency_accounts"]), 1)
+        sleep.assert_not_called()
+        self.assertEqual(response.data, {"changes": [], "next": head})
+
+    def test_async_changes_feed_long_poll(self):
+        """Test success: The async feed long-polls on the event loop."""
+        head = TransactionChange.objects.latest("Sequence").Sequence
+
+        async def commit_change(seconds):
+            await sync_to_async(create_transactions)(
+                self.account, self.merchant, self.device, num_transactions=1
+            )
+
+        url = reverse("async-changes-feed")
+        with mock.patch(
+            "transactions_app.async_views.asyncio.sleep", side_effect=commit_change
+        ) as sleep:
+            response = self.client.get(url, {"since": head, "wait": 30})
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        document = response.json()
+        self.assertEqual(len(document["changes"]), 1)
+        self.assertEqual(document["next"], head + 1)
+        # The same document as the sync feed
+        sync = self.client.get(reverse("changes-feed"), {"since": head}).json()
+        self.assertEqual(document, sync)
+
+        response = self.client.get(url, {"wait": 3600})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
-    def test_multiple_accounts_with_high_frequency(self):
-        """Test success: Retrieve multiple accounts with high frequency."""
-        # Create two additional accounts
-        account1 = Accounts.objects.create(AccountID="AC00129")
-        account2 = Accounts.objects.create(AccountID="AC00130")
-        merchant = Merchants.objects.create(MerchantID="M016")
-        device = Devices.objects.create(DeviceID="D000052")
+    def test_changes_feed_errors(self):
+        """Test error: Invalid parameters, and a cursor older than the compacted log."""
+        url = reverse("changes-feed")
+        for params in ({"since": "abc"}, {"since": -1}, {"limit": 0}, {"wait": 3600}):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        call_command("build_snapshot", stdout=StringIO())
+        compact()
+        response = self.client.get(url, {"since": 0})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        head = response.data["compacted"]
+        self.assertEqual(head, get_snapshot().sequences["default"])
+        response = self.client.get(url, {"since": head})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
 
-        # Function to create multiple transactions for an account
+    def test_sequence_gaps(self):
+        """Test success: A recent gap holds the batch back; an old gap is skipped."""
+        TransactionChange.objects.all().delete()
+        now = timezone.now()
+        for sequence in (1, 2, 4):
+            TransactionChange.objects.create(
+                Sequence=sequence, TransactionID="TX999999", Operation="delete", Data={}
+            )
+        self.assertEqual([c.Sequence for c in pending_changes(0, 10)], [1, 2])
 
-        # Create high-frequency transactions for multiple accounts
-        create_transactions(
-            self.account, merchant, device, num_transactions=20
-        )  # First account
-        create_transactions(
-            account1, merchant, device, num_transactions=25
-        )  # Second account
-        create_transactions(
-            account2, merchant, device, num_transactions=30
-        )  # Third account
+        TransactionChange.objects.filter(Sequence=4).update(CreatedAt=now - timedelta(minutes=1))
+        self.assertEqual([c.Sequence for c in pending_changes(0, 10)], [1, 2, 4])
 
-        # Call the endpoint
-        url = reverse("high-frequency-accounts")
-        response = self.client.get(url)
 
-        # Verify the response
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
+class BurstAccountsTests(APITestCase):
+    # Tests for BurstAccounts endpoint
+    @classmethod
+    def setUpTestData(cls):
+        cls.account, cls.merchant, cls.device, cls.transaction1 = create_test_data()
 
-        # Verify that all three accounts are flagged
-        high_frequency_accounts = [
-            account["AccountID"] for account in response.data["high_frequency_accounts"]
-        ]
-        self.assertIn("AC00128", high_frequency_accounts)
-        self.assertIn("AC00129", high_frequency_accounts)
-        self.assertIn("AC00130", high_frequency_accounts)
-        self.assertEqual(len(high_frequency_accounts), 3)
+    def test_burst_detected(self):
+        """Test success: 15 transactions within 15 minutes form one burst."""
+        account = Accounts.objects.create(AccountID="AC00129")
+        create_transactions(account, self.merchant, self.device, num_transactions=15)
 
-    def test_accounts_with_normal_frequency(self):
-        """Test success: Accounts with transactions spread over a larger time range are not flagged."""
-        # Create transactions spread over a larger time range
-        account1 = Accounts.objects.create(AccountID="AC00130")
-        account2 = Accounts.objects.create(AccountID="AC00131")
-        merchant = Merchants.objects.create(MerchantID="M017")
-        device = Devices.objects.create(DeviceID="D000053")
+        url = reverse("burst-accounts")
+        response = self.client.get(url, {"min_transactions": 10, "window": "15m"})
 
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["window_seconds"], 900)
+        burst_accounts = response.data["burst_accounts"]
+        self.assertEqual(len(burst_accounts), 1)
+        self.assertEqual(burst_accounts[0]["AccountID"], "AC00129")
+        self.assertEqual(burst_accounts[0]["max_transactions"], 15)
+        burst = burst_accounts[0]["bursts"][0]
+        self.assertEqual(burst["window_end"] - burst["window_start"], timedelta(minutes=14))
+
+    def test_separate_bursts(self):
+        """Test success: Windows that do not overlap are reported as separate bursts."""
+        create_transactions(self.account, self.merchant, self.device, num_transactions=3)
+        # Second cluster of transactions two hours earlier
         create_transactions(
-            self.account, merchant, device, time_gap="weeks", num_transactions=5
-        )
-        create_transactions(
-            account1, merchant, device, time_gap="weeks", num_transactions=5
+            self.account,
+            self.merchant,
+            self.device,
+            num_transactions=3,
+            location="Boston",
         )
-        create_transactions(
-            account2, merchant, device, time_gap="weeks", num_transactions=5
+        Transactions.objects.filter(Location="Boston").update(
+            TransactionDate=F("TransactionDate") - timedelta(hours=2)
         )
 
-        # Call the endpoint
-        url = reverse("high-frequency-accounts")
-        response = self.client.get(url)
+        url = reverse("burst-accounts")
+        response = self.client.get(url, {"min_transactions": 3, "window": "5m"})
 
-        # Verify the response
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        high_frequency_accounts = [
-            account["AccountID"] for account in response.data["high_frequency_accounts"]
-        ]
-        self.assertNotIn("AC00130", high_frequency_accounts)  # Should not be flagged
-        self.assertNotIn("AC00131", high_frequency_accounts)  # Should not be flagged
+        bursts = response.data["burst_accounts"][0]["bursts"]
+        self.assertEqual([burst["transaction_count"] for burst in bursts], [3, 4])
 
-    def test_single_account_and_trasaction(self):
-        """Test edge case: Only one transaction in the database.
-        The transaction should not be flagged under “high frequency” since there is only one transaction.
-        """
+    def test_spread_transactions_not_flagged(self):
+        """Test edge case: Transactions spread over days are not a burst."""
+        create_transactions(
+            self.account, self.merchant, self.device, num_transactions=15, time_gap="days"
+        )
 
-        # Call the endpoint
-        url = reverse("high-frequency-accounts")
-        response = self.client.get(url)
-        print(response.data)
+        url = reverse("burst-accounts")
+        response = self.client.get(url, {"min_transactions": 10, "window": "1h"})
 
-        # Verify the response
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertGreaterEqual(
-            len(response.data["high_frequency_accounts"]), 0
-        )  # Should not be flagged
-
-    def test_exact_threshold_transactions(self):
-        """Test edge case: Test with transactions having exactly 10 transactions within 1 hour. These should not be flagged."""
-        # Create multiple transactions for an account within a short period (e.g., 10 transactions within 1 hour).
-        account = Accounts.objects.create(AccountID="AC00130")
-        merchant = Merchants.objects.create(MerchantID="M016")
-        device = Devices.objects.create(DeviceID="D000052")
+        self.assertEqual(response.data["burst_accounts"], [])
 
-        create_transactions(account, merchant, device, num_transactions=10)
+    def test_date_range(self):
+        """Test edge case: Transactions outside the date range are ignored."""
+        create_transactions(self.account, self.merchant, self.device, num_transactions=15)
 
-        # Call the endpoint
-        url = reverse("high-frequency-accounts")
-        response = self.client.get(url)
+        url = reverse("burst-accounts")
+        yesterday = (timezone.now() - timedelta(days=1)).date().isoformat()
+        response = self.client.get(url, {"window": "1h", "end": yesterday})
 
-        # Verify the response
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data["high_frequency_accounts"]), 0)
+        self.assertEqual(response.data["burst_accounts"], [])
+
+    def test_invalid_parameters(self):
+        """Test error: Invalid window, threshold or date."""
+        url = reverse("burst-accounts")
+        for params in (
+            {"window": "ten minutes"},
+            {"window": "0"},
+            {"min_transactions": 1},
+            {"start": "01-01-2023"},
+        ):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
 class TransactionsSummaryByMerchantTests(APITestCase):
@@ -560,6 +2553,101 @@ class TransactionsSummaryByMerchantTests(APITestCase):
         self.assertEqual(response.data["total_transactions"], 0)
 
 
+class MerchantsSummaryTests(APITestCase):
+    # Tests for MerchantsSummaryView endpoint
+    @classmethod
+    def setUpTestData(cls):
+        cls.account, cls.merchant, cls.device, cls.transaction1 = create_test_data()
+        cls.merchant2 = Merchants.objects.create(MerchantID="M016")
+        cls.merchant3 = Merchants.objects.create(MerchantID="M017")
+        create_transactions(
+            cls.account, cls.merchant2, cls.device, transaction_amount=10, num_transactions=5
+        )
+        create_transactions(
+            cls.account, cls.merchant3, cls.device, transaction_amount=500, num_transactions=2
+        )
+
+    def test_selected_merchants(self):
+        """Test success: Totals for a list of merchants match the single merchant endpoint."""
+        url = reverse("merchants-summary")
+        response = self.client.get(url, {"merchant_ids": "M015,M016,M999"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        merchants = {m["merchant_id"]: m for m in response.data["merchants"]}
+        self.assertEqual(set(merchants), {"M015", "M016", "M999"})
+        for merchant_id in ("M015", "M016", "M999"):
+            single = self.client.get(
+                reverse("merchant-summary", kwargs={"merchant_id": merchant_id})
+            )
+            self.assertEqual(merchants[merchant_id]["total_amount"], single.data["total_amount"])
+            self.assertEqual(
+                merchants[merchant_id]["total_transactions"],
+                single.data["total_transactions"],
+            )
+
+    def test_all_merchants_single_query(self):
+        """Test success: All merchants are summarized with one query."""
+        url = reverse("merchants-summary")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"merchant_ids": "all"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(
+            [m["merchant_id"] for m in response.data["merchants"]], ["M015", "M016", "M017"]
+        )
+
+    def test_top_merchants(self):
+        """Test success: Leaderboard by amount and by count."""
+        url = reverse("merchants-summary")
+        response = self.client.get(url, {"top": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [m["merchant_id"] for m in response.data["merchants"]], ["M017", "M015"]
+        )
+        self.assertEqual(response.data["merchants"][0]["total_amount"], 1000)
+
+        response = self.client.get(url, {"top": 1, "order_by": "count"})
+        self.assertEqual(response.data["merchants"][0]["merchant_id"], "M016")
+        self.assertEqual(response.data["merchants"][0]["total_transactions"], 5)
+
+    def test_date_range(self):
+        """Test success: Days outside the range are excluded."""
+        url = reverse("merchants-summary")
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        for params in ({}, {"top": 3}):
+            response = self.client.get(url, {"start": tomorrow.isoformat(), **params})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data["merchants"], [])
+
+    def test_rollup_matches_rebuild(self):
+        """Test success: The incrementally maintained summary matches a full rebuild."""
+        self.transaction1.delete()
+
+        def rows():
+            return list(
+                MerchantDailySummary.objects.exclude(TransactionCount=0)
+                .order_by("MerchantID", "Day")
+                .values_list("MerchantID", "Day", "TransactionCount", "TotalAmount")
+            )
+
+        incremental = rows()
+        call_command("rebuild_rollups", "merchant_summary", stdout=StringIO())
+        self.assertEqual(incremental, rows())
+
+    def test_invalid_parameters(self):
+        """Test error: Invalid top, order_by or dates."""
+        url = reverse("merchants-summary")
+        for params in (
+            {"top": "abc"},
+            {"top": 0},
+            {"top": 3, "order_by": "name"},
+            {"start": "2024-13-01"},
+        ):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class SpendingInsightsTests(APITestCase):
     # Tests for SpendingInsights endpoint
     @classmethod
@@ -919,6 +3007,727 @@ class SpendingInsightsTests(APITestCase):
         self.assertIsNone(response.data["most_used_location"])
 
 
+class AsyncViewsTests(APITestCase):
+    # Tests for the native async versions of the read endpoints
+    @classmethod
+    def setUpTestData(cls):
+        cls.account, cls.merchant, cls.device, cls.transaction1 = create_test_data()
+        create_transactions(
+            cls.account,
+            cls.merchant,
+            cls.device,
+            num_transactions=11,
+            transaction_amount=50.25,
+            transaction_type="Debit",
+            location="Chicago",
+        )
+
+    async def assertSameResponse(self, sync_name, async_name, **kwargs):
+        """Compare the async endpoint with its sync counterpart."""
+        sync_response = await self.async_client.get(reverse(sync_name, kwargs=kwargs))
+        async_response = await self.async_client.get(reverse(async_name, kwargs=kwargs))
+        self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+        # Pagination links only differ by the /async prefix
+        self.assertEqual(
+            json.loads(async_response.content.replace(b"/async", b"")),
+            sync_response.json(),
+        )
+        return async_response.json()
+
+    async def test_async_transactions_by_account(self):
+        """Test success: Same paginated transactions as the sync endpoint."""
+        data = await self.assertSameResponse(
+            "transactions_by_account",
+            "async_transactions_by_account",
+            account_id="AC00128",
+        )
+        self.assertEqual(data["count"], 12)
+        self.assertEqual(len(data["results"]), 5)
+
+    async def test_async_transactions_by_account_invalid_page(self):
+        """Test error: Page out of range."""
+        url = reverse("async_transactions_by_account", kwargs={"account_id": "AC00128"})
+        response = await self.async_client.get(url, {"page": 10})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_async_merchant_summary(self):
+        """Test success: Same merchant summary as the sync endpoint."""
+        data = await self.assertSameResponse(
+            "merchant-summary", "async-merchant-summary", merchant_id="M015"
+        )
+        self.assertEqual(data["total_transactions"], 12)
+
+    async def test_async_spending_insights(self):
+        """Test success: Same spending insights as the sync endpoint."""
+        data = await self.assertSameResponse(
+            "transaction-spending-insights",
+            "async-transaction-spending-insights",
+            account_id="AC00128",
+        )
+        self.assertEqual(data["most_used_location"]["Location"], "Chicago")
+
+    async def test_async_high_frequency_accounts(self):
+        """Test success: Same high-frequency accounts as the sync endpoint."""
+        data = await self.assertSameResponse(
+            "high-frequency-accounts", "async-high-frequency-accounts"
+        )
+        self.assertEqual(data["high_frequency_accounts"][0]["AccountID"], "AC00128")
+
+    async def test_async_high_frequency_accounts_invalid_parameters(self):
+        """Test error: Same validation of days and threshold as the sync endpoint."""
+        url = reverse("async-high-frequency-accounts")
+        for params in ({"days": "abc"}, {"days": 0}, {"threshold": -1}):
+            with self.subTest(params=params):
+                response = await self.async_client.get(url, params)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn("error", response.json())
+
+
+class FlaggedStreamTests(APITestCase):
+    # Tests for the server-sent events stream of flagged transactions
+    @classmethod
+    def setUpTestData(cls):
+        cls.account, cls.merchant, cls.device, cls.transaction1 = create_test_data()
+        cls.account2 = Accounts.objects.create(AccountID="AC00129")
+
+    def setUp(self):
+        # A fresh broadcaster per test
+        patcher = mock.patch("transactions_app.broadcast._broadcaster", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def insert(self, account, login_attempts):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_transactions(
+                account,
+                self.merchant,
+                self.device,
+                num_transactions=1,
+                login_attempts=login_attempts,
+            )
+
+    async def test_stream_pushes_flagged_transactions(self):
+        """Test success: Matching flagged transactions are pushed as they commit."""
+        url = reverse("flagged-transactions-stream")
+        response = await self.async_client.get(
+            url, {"account": "AC00128", "rule": "login_attempts"}
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b": connected\n\n")
+
+        await sync_to_async(self.insert)(self.account2, login_attempts=5)  # Other account
+        await sync_to_async(self.insert)(self.account, login_attempts=1)  # Other rule
+        await sync_to_async(self.insert)(self.account, login_attempts=5)
+        event = (await asyncio.wait_for(anext(chunks), 5)).decode()
+
+        lines = event.strip().split("\n")
+        self.assertEqual(lines[:2], ["id: TX000004", "event: flagged"])
+        data = json.loads(lines[2].removeprefix("data: "))
+        self.assertEqual(data["account_id"], "AC00128")
+        self.assertIn("login_attempts", data["rules"])
+        self.assertEqual(data["transaction"]["LoginAttempts"], 5)
+        await chunks.aclose()
+
+    async def test_rule_and_channel_filters(self):
+        """Test success: Subscribers only receive events matching their filters."""
+        broadcaster = get_broadcaster()
+        by_rule = broadcaster.subscribe(rule="velocity")
+        by_channel = broadcaster.subscribe(channel="ATM")
+        event = {
+            "transaction_id": "TX000001",
+            "account_id": "AC00128",
+            "channel": "ATM",
+            "rules": ["login_attempts"],
+        }
+        broadcaster.publish(event)
+        await asyncio.sleep(0)
+        self.assertTrue(by_rule.queue.empty())
+        self.assertEqual(by_channel.queue.get_nowait(), event)
+
+    async def test_slow_subscriber_dropped(self):
+        """Test success: A subscriber whose queue is full is dropped."""
+        with self.settings(FLAGGED_STREAM_QUEUE_SIZE=2):
+            broadcaster = get_broadcaster()
+        subscription = broadcaster.subscribe()
+        for number in range(3):
+            broadcaster.publish({"transaction_id": f"TX{number:06}", "channel": "ATM"})
+        await asyncio.sleep(0)
+
+        self.assertTrue(subscription.dropped)
+        self.assertEqual(subscription.queue.get_nowait(), DROPPED)
+        self.assertTrue(subscription.queue.empty())
+
+    async def test_too_many_subscribers(self):
+        """Test error: Streams beyond FLAGGED_STREAM_MAX_SUBSCRIBERS are refused."""
+        with self.settings(FLAGGED_STREAM_MAX_SUBSCRIBERS=0):
+            response = await self.async_client.get(reverse("flagged-transactions-stream"))
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_rolled_back_insert_not_broadcast(self):
+        """Test success: Flagged transactions are only published once committed."""
+        broadcaster = get_broadcaster()
+        broadcaster.subscribers.add(mock.Mock())
+        with mock.patch.object(broadcaster, "publish") as publish:
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                create_transactions(
+                    self.account, self.merchant, self.device, num_transactions=1, login_attempts=5
+                )
+            publish.assert_not_called()
+            self.assertEqual(len(callbacks), 1)
+            callbacks[0]()
+            publish.assert_called_once()
+
+
+class MetricsTests(APITestCase):
+    # Tests for the metrics endpoint and the per-process metrics files
+    @classmethod
+    def setUpTestData(cls):
+        cls.account, cls.merchant, cls.device, cls.transaction1 = create_test_data()
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = override_settings(METRICS_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def scrape(self):
+        """GET metrics and return its samples as {line before the value: value}."""
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        return {
+            line.rpartition(" ")[0]: float(line.rpartition(" ")[2])
+            for line in response.content.decode().splitlines()
+            if line and not line.startswith("#")
+        }
+
+    def test_not_recorded_without_directory(self):
+        """Test success: Without METRICS_DIR, nothing is recorded nor written."""
+        with override_settings(METRICS_DIR=None):
+            self.client.get(reverse("transactions_by_account", args=[self.account.AccountID]))
+            self.assertIsNone(metrics.process_values())
+            self.assertEqual(self.scrape(), {})
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_request_metrics(self):
+        """Test success: Requests are counted and timed per URL name."""
+        url = reverse("transactions_by_account", args=[self.account.AccountID])
+        for _ in range(2):
+            self.client.get(url)
+        self.client.get("/no-such-endpoint/")
+        samples = self.scrape()
+        view = 'view="transactions_by_account"'
+        self.assertEqual(
+            samples[f'http_requests_total{{{view},method="GET",status="200"}}'], 2
+        )
+        self.assertEqual(
+            samples['http_requests_total{view="unmatched",method="GET",status="404"}'], 1
+        )
+        self.assertEqual(samples[f"http_request_duration_seconds_count{{{view}}}"], 2)
+        # Every bucket of a series is exposed, the last one counting every request
+        buckets = [
+            name
+            for name in samples
+            if name.startswith(f"http_request_duration_seconds_bucket{{{view}")
+        ]
+        self.assertEqual(len(buckets), len(metrics.LATENCY_BUCKETS) + 1)
+        self.assertEqual(
+            samples[f'http_request_duration_seconds_bucket{{{view},le="+Inf"}}'], 2
+        )
+        self.assertGreaterEqual(samples[f"db_queries_per_request_sum{{{view}}}"], 4)
+
+    def test_server_errors_counted(self):
+        """Test failure: Requests failing with a 5xx are counted as errors."""
+        url = reverse("transactions_by_account", args=[self.account.AccountID])
+        self.client.raise_request_exception = False
+        with mock.patch(
+            "transactions_app.views.TransactionsByAccount.get_queryset",
+            side_effect=RuntimeError("database down"),
+        ):
+            with self.assertLogs("django.request", "ERROR"):
+                response = self.client.get(url)
+        self.assertEqual(response.status_code, 500)
+        samples = self.scrape()
+        self.assertEqual(
+            samples['http_request_errors_total{view="transactions_by_account"}'], 1
+        )
+
+    def test_processes_added_up(self):
+        """Test success: The values of every process are added up, gauges of live ones only."""
+        labels = (("view", "x"), ("method", "GET"), ("status", "200"))
+        metrics.inc("http_requests_total", labels)
+        metrics.set_gauge("ingest_queue_depth", (), 2)
+        # A worker that wrote its values and exited
+        code = (
+            "import django; django.setup(); from transactions_app import metrics; "
+            "metrics.inc('http_requests_total', "
+            "(('view', 'x'), ('method', 'GET'), ('status', '200')), 3); "
+            "metrics.set_gauge('ingest_queue_depth', (), 5)"
+        )
+        process = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=settings.BASE_DIR,
+            env={
+                **os.environ,
+                "DJANGO_SETTINGS_MODULE": "financial_api.settings",
+                "METRICS_DIR": self.directory,
+                "WARM_UP": "0",
+            },
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+        samples = self.scrape()
+        self.assertEqual(
+            samples['http_requests_total{view="x",method="GET",status="200"}'], 4
+        )
+        self.assertEqual(samples["ingest_queue_depth"], 2)
+
+    def test_cache_hit_ratio(self):
+        """Test success: Cache lookups are published with their hit ratio."""
+        for hit in (True, True, True, False):
+            metrics.cache_lookup("test_cache", hit)
+        samples = self.scrape()
+        self.assertEqual(samples['cache_requests_total{cache="test_cache",result="hit"}'], 3)
+        self.assertEqual(samples['cache_requests_total{cache="test_cache",result="miss"}'], 1)
+        self.assertEqual(samples['cache_hit_ratio{cache="test_cache"}'], 0.75)
+        # Published once: a second scrape does not count them again
+        metrics.cache_lookup("test_cache", False)
+        samples = self.scrape()
+        self.assertEqual(samples['cache_requests_total{cache="test_cache",result="hit"}'], 3)
+        self.assertEqual(samples['cache_requests_total{cache="test_cache",result="miss"}'], 2)
+
+    def test_ingest_queue_depth(self):
+        """Test success: The depth of the write-behind queue is exposed."""
+        flushing, release = threading.Event(), threading.Event()
+
+        def flush(batch):
+            flushing.set()
+            release.wait(5)
+
+        buffer = WriteBehindBuffer(
+            capacity=10,
+            max_rows=10,
+            max_delay=0,
+            flush=flush,
+            shard_of=lambda item: "default",
+        )
+        futures = [buffer.submit("tx0")]
+        self.assertTrue(flushing.wait(5))
+        # Queued while the first batch is committed
+        futures += [buffer.submit("tx1"), buffer.submit("tx2")]
+        self.assertEqual(self.scrape()["ingest_queue_depth"], 2)
+        release.set()
+        for future in futures:
+            future.result(timeout=5)
+
+
+class ProfilingTests(APITestCase):
+    # Tests for the on-demand request profiler and the profiles endpoints
+    @classmethod
+    def setUpTestData(cls):
+        cls.account, cls.merchant, cls.device, cls.transaction1 = create_test_data()
+        cls.admin = User.objects.create_user("admin", password="secret", is_staff=True)
+        cls.user = User.objects.create_user("user", password="secret")
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = override_settings(PROFILES_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.url = reverse("transactions_by_account", args=[self.account.AccountID])
+
+    def test_admin_profile(self):
+        """Test success: An admin asking for a profile gets a pstats file."""
+        self.client.force_login(self.admin)
+        response = self.client.get(self.url, HTTP_X_PROFILE="cprofile")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        profile_id = response["X-Profile-ID"]
+        stats = pstats.Stats(os.path.join(self.directory, f"{profile_id}.prof"))
+        self.assertTrue(
+            any(function[2] == "get" for function in stats.stats),
+            "The view's get() was not profiled.",
+        )
+
+        response = self.client.get(reverse("profile-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        [profile] = response.data
+        self.assertEqual(profile["profile_id"], profile_id)
+        self.assertEqual(profile["path"], self.url)
+        self.assertEqual(profile["status"], 200)
+        self.assertEqual(profile["profiler"], "cprofile")
+
+        response = self.client.get(profile["url"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(
+            f'attachment; filename="{profile_id}.prof"', response["Content-Disposition"]
+        )
+        response.close()
+
+    def test_admins_only(self):
+        """Test failure: Other users can neither profile requests nor read profiles."""
+        self.client.force_login(self.user)
+        response = self.client.get(self.url + "?profile=1")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("X-Profile-ID", response)
+        self.assertEqual(os.listdir(self.directory), [])
+        response = self.client.get(reverse("profile-list"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.client.logout()
+        response = self.client.get(reverse("profile-list"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_basic_authentication(self):
+        """Test success: Admins may authenticate with HTTP Basic credentials."""
+        credentials = base64.b64encode(b"admin:secret").decode()
+        response = self.client.get(
+            self.url, HTTP_X_PROFILE="sample", HTTP_AUTHORIZATION=f"Basic {credentials}"
+        )
+        self.assertIn("X-Profile-ID", response)
+        profile_file = f"{response['X-Profile-ID']}.collapsed"
+        self.assertTrue(os.path.exists(os.path.join(self.directory, profile_file)))
+
+    @override_settings(PROFILE_SAMPLE_RATE=0.1, PROFILES_KEEP=2)
+    def test_sampled_requests(self):
+        """Test success: Sampled requests are profiled, only the latest ones kept."""
+        with mock.patch("transactions_app.profiling.random.random", return_value=0.5):
+            self.assertNotIn("X-Profile-ID", self.client.get(self.url))
+        with mock.patch("transactions_app.profiling.random.random", return_value=0.05):
+            profile_ids = []
+            for request_id in ("req-1", "req-2", "req-3", "../bad"):
+                response = self.client.get(self.url, HTTP_X_REQUEST_ID=request_id)
+                self.assertNotEqual(response["X-Profile-ID"], request_id)
+                profile_ids.append(response["X-Profile-ID"])
+        self.assertEqual(len(os.listdir(self.directory)), 4)
+        self.client.force_login(self.admin)
+        profiles = self.client.get(reverse("profile-list")).data
+        self.assertEqual([profile["profiler"] for profile in profiles], ["sample", "sample"])
+        # Client request IDs are only recorded, invalid ones dropped
+        self.assertEqual(
+            {profile["profile_id"]: profile["request_id"] for profile in profiles},
+            {profile_ids[2]: "req-3", profile_ids[3]: None},
+        )
+        self.assertEqual(
+            self.client.get(reverse("profile-download", args=[profile_ids[0]])).status_code,
+            status.HTTP_404_NOT_FOUND,
+        )
+
+    @override_settings(PROFILE_SAMPLE_RATE=1)
+    def test_client_cannot_choose_profile_id(self):
+        """Test failure: A sampled request naming an existing profile does not replace it."""
+        self.client.force_login(self.admin)
+        profile_id = self.client.get(self.url, HTTP_X_PROFILE="cprofile")["X-Profile-ID"]
+        self.client.logout()
+        response = self.client.get(self.url, HTTP_X_REQUEST_ID=profile_id)
+        self.assertNotEqual(response["X-Profile-ID"], profile_id)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, f"{profile_id}.prof")))
+
+    @override_settings(PROFILE_SAMPLE_RATE=1)
+    async def test_async_profile_saved_off_loop(self):
+        """Test success: Async requests save their profile outside the event loop thread."""
+        loop_thread, saved_in = threading.get_ident(), []
+        save = profiling.save
+
+        def record_thread(*args):
+            saved_in.append(threading.get_ident())
+            save(*args)
+
+        with mock.patch("transactions_app.profiling.save", side_effect=record_thread):
+            response = await self.async_client.get(
+                reverse("async_transactions_by_account", args=[self.account.AccountID])
+            )
+        self.assertIn("X-Profile-ID", response)
+        self.assertEqual(len(saved_in), 1)
+        self.assertNotEqual(saved_in[0], loop_thread)
+
+    def test_stack_sampler(self):
+        """Test success: The sampler records the collapsed stacks of a thread."""
+
+        def busy_function(stop):
+            while not stop.is_set():
+                time.sleep(0.0005)
+
+        stop = threading.Event()
+        thread = threading.Thread(target=busy_function, args=(stop,))
+        thread.start()
+        sampler = StackSampler(thread.ident, 0.001)
+        sampler.start()
+        time.sleep(0.05)
+        sampler.stop()
+        stop.set()
+        thread.join()
+        path = Path(self.directory) / "test.collapsed"
+        sampler.save(path)
+        lines = path.read_text().splitlines()
+        self.assertTrue(lines)
+        stack, count = lines[0].rsplit(" ", 1)
+        self.assertGreater(int(count), 0)
+        self.assertIn(";busy_function (tests.py:", stack)
+
+
+class InstrumentationTests(APITestCase):
+    # Tests for the per-request query instrumentation middleware
+    @classmethod
+    def setUpTestData(cls):
+        cls.account, cls.merchant, cls.device, cls.transaction1 = create_test_data()
+
+    def test_server_timing(self):
+        """Test success: The queries of a request are counted, timed and logged."""
+        url = reverse("transaction-spending-insights", args=[self.account.AccountID])
+        with CaptureQueriesContext(connection) as queries:
+            with self.assertLogs("transactions_app.instrumentation", "INFO") as logs:
+                response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timing = response["Server-Timing"]
+        self.assertIn(f'desc="{len(queries)} queries"', timing)
+        for metric in ("db;dur=", "db-slowest;dur=", "render;dur=", "total;dur="):
+            self.assertIn(metric, timing)
+        stats = logs.records[-1].request_stats
+        self.assertEqual(stats["path"], url)
+        self.assertEqual(stats["queries"], len(queries))
+        self.assertIn("SELECT", stats["slowest_sql"])
+
+    def test_async_view_queries_counted(self):
+        """Test success: Queries run by async views in sync_to_async threads are counted."""
+        response = self.client.get(
+            reverse("async_transactions_by_account", args=[self.account.AccountID])
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertRegex(response["Server-Timing"], r'desc="[1-9]\d* queries"')
+
+    def test_query_budget_raises_in_tests(self):
+        """Test success: The project's test runner turns QUERY_BUDGET_RAISE on."""
+        self.assertTrue(settings.QUERY_BUDGET_RAISE)
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def test_query_budget_raises(self):
+        """Test failure: A request over the query budget of its view raises."""
+        url = reverse("transaction-spending-insights", args=[self.account.AccountID])
+        self.client.get(url)  # Within the budget
+        with mock.patch("transactions_app.views.SpendingInsightsView.query_budget", 1):
+            with self.assertRaises(instrumentation.QueryBudgetExceeded):
+                self.client.get(url)
+
+    @override_settings(QUERY_BUDGET_RAISE=False)
+    def test_query_budget_logs(self):
+        """Test success: Outside the tests, exceeding the budget only logs a warning."""
+        url = reverse("transaction-spending-insights", args=[self.account.AccountID])
+        with mock.patch("transactions_app.views.SpendingInsightsView.query_budget", 1):
+            with self.assertLogs("transactions_app.instrumentation", "WARNING") as logs:
+                response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("over the budget of 1", logs.output[-1])
+
+
+class StartupTests(TestCase):
+    # Tests for the lazy imports and the warm-up run before a worker takes traffic
+    def test_lazy_import(self):
+        """Test success: A lazy module is only imported on first use."""
+        with mock.patch.dict(sys.modules):
+            sys.modules.pop("colorsys", None)
+            colorsys = startup.lazy_import("colorsys")
+            self.assertNotIn("colorsys", sys.modules)
+            self.assertEqual(colorsys.rgb_to_hsv(1, 0, 0), (0.0, 1.0, 1.0))
+            self.assertIn("colorsys", sys.modules)
+        # Modules already imported are returned as they are
+        self.assertIs(startup.lazy_import("json"), json)
+
+    def test_web_process_skips_heavy_imports(self):
+        """Test success: Loading the application and its URLs imports neither pandas nor NumPy."""
+        code = (
+            "import sys, financial_api.wsgi, transactions_app.urls; "
+            "print([name for name in ('pandas', 'numpy') if name in sys.modules])"
+        )
+        process = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=settings.BASE_DIR,
+            env={
+                **os.environ,
+                "DJANGO_SETTINGS_MODULE": "financial_api.settings",
+                "WARM_UP": "0",
+            },
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertEqual(process.stdout.strip().splitlines()[-1], "[]")
+
+    def test_warm_up(self):
+        """Test success: Every stage runs and is timed, loading the caches."""
+        schema.forget_schema()
+        self.addCleanup(schema.forget_schema)
+        with mock.patch.object(DimensionCache, "load", autospec=True) as load:
+            timings = startup.warm_up()
+        self.assertEqual(list(timings), list(startup.STAGES))
+        self.assertEqual(
+            {call.args[0].model.__name__ for call in load.call_args_list},
+            {"Locations", "Occupations"},
+        )
+        self.assertEqual(set(schema._documents), set(schema.FORMATS))
+
+    def test_failed_stage_skipped(self):
+        """Test success: A failing stage is logged and the others still run."""
+        failing = mock.Mock(side_effect=OperationalError("no such table"))
+        with mock.patch.dict(startup.STAGES, {"dimensions": failing}):
+            with self.assertLogs("transactions_app.startup", "WARNING"):
+                timings = startup.warm_up()
+        failing.assert_called_once()
+        self.assertNotIn("dimensions", timings)
+        self.assertIn("schema", timings)
+
+
+class ConnectionWarmUpTests(TestCase):
+    # Tests for the warm-up of the database connections when a worker starts
+    def test_unpooled_connections_left_alone(self):
+        """Test success: Databases without a pool do not connect the loading thread."""
+        with mock.patch.object(
+            type(connections["default"]), "ensure_connection"
+        ) as ensure_connection:
+            self.assertEqual(warm_up_connections(), {})
+        ensure_connection.assert_not_called()
+
+    def pooled(self, pool):
+        return mock.patch.object(
+            type(connections["default"]),
+            "pool",
+            new_callable=mock.PropertyMock,
+            return_value=pool,
+            create=True,
+        )
+
+    def test_warm_up_opens_pools(self):
+        """Test success: Pooled databases wait for their pool to open."""
+        pool = mock.Mock()
+        with self.pooled(pool):
+            timings = warm_up_connections(timeout=3)
+        pool.open.assert_called_with(wait=True, timeout=3)
+        self.assertIn("default", timings)
+
+    def test_unreachable_database_skipped(self):
+        """Test edge case: A database that cannot be reached does not stop the worker."""
+        pool = mock.Mock(**{"open.side_effect": OperationalError})
+        with self.pooled(pool), self.assertLogs("transactions_app.pooling", "WARNING"):
+            self.assertEqual(warm_up_connections(), {})
+
+    def test_preloaded_master_closes_pools_before_fork(self):
+        """Test success: With --preload, pools are closed before forking and reopened after."""
+        hooks = runpy.run_path(os.path.join(settings.BASE_DIR, "gunicorn.conf.py"))
+        server = mock.Mock(**{"cfg.preload_app": True})
+        connection_type = type(connections["default"])
+        with self.pooled(mock.Mock()) as pool, mock.patch.object(
+            connection_type, "close"
+        ), mock.patch.object(connection_type, "close_pool", create=True) as close_pool:
+            hooks["pre_fork"](server, None)
+            close_pool.assert_called()
+            hooks["post_fork"](server, None)
+            pool.return_value.open.assert_called()
+
+        # Without --preload, each worker loads (and warms up) the application itself
+        server.cfg.preload_app = False
+        with mock.patch("transactions_app.pooling.close_connections") as close:
+            hooks["pre_fork"](server, None)
+        close.assert_not_called()
+
+
+class SchemaTests(APITestCase):
+    # Tests for the precomputed OpenAPI schema and the documentation pages
+    def setUp(self):
+        schema.forget_schema()
+        self.addCleanup(schema.forget_schema)
+
+    def test_schema_json(self):
+        """Test success: The schema is served with an ETag and revalidated with a 304."""
+        url = reverse("schema-json")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertIn("max-age=86400", response["Cache-Control"])
+        document = json.loads(response.content)
+        self.assertEqual(document["swagger"], "2.0")
+        self.assertIn("/add_transaction/", document["paths"])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b"")
+
+    def test_schema_generated_once(self):
+        """Test success: Requests in every format share one generated schema."""
+        with mock.patch.object(
+            schema, "generate_schema", wraps=schema.generate_schema
+        ) as generate:
+            for _ in range(3):
+                self.client.get(reverse("schema-json"))
+            response = self.client.get(reverse("schema-yaml"))
+        self.assertEqual(response["Content-Type"], "application/yaml")
+        self.assertIn(b"/add_transaction/", response.content)
+        # One call per format serialized, the generation itself being cached
+        self.assertEqual(generate.call_count, 2)
+        self.assertEqual(schema.generate_schema.cache_info().misses, 1)
+
+    def test_generate_schema_command(self):
+        """Test success: The command writes the files the endpoints then serve."""
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(API_SCHEMA_DIR=directory):
+                call_command("generate_schema", stdout=StringIO())
+                self.assertEqual(
+                    sorted(os.listdir(directory)), ["openapi.json", "openapi.yaml"]
+                )
+                # Served as written, without generating the schema again
+                schema.forget_schema()
+                with mock.patch.object(schema, "generate_schema") as generate:
+                    response = self.client.get(reverse("schema-json"))
+                generate.assert_not_called()
+                with open(os.path.join(directory, "openapi.json"), "rb") as file:
+                    self.assertEqual(response.content, file.read())
+
+    def test_documentation_pages(self):
+        """Test success: The documentation pages load the precomputed schema."""
+        for name in ("schema-swagger-ui", "schema-redoc"):
+            response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIn(b"swagger.json", response.content)
+
+    def test_documentation_pages_never_introspect(self):
+        """Test success: The pages are rendered once, without generating the schema."""
+        with mock.patch.object(OpenAPISchemaGenerator, "get_schema") as get_schema:
+            for name in ("schema-swagger-ui", "schema-redoc"):
+                for cookie in ("a", "b"):
+                    self.client.cookies["theme"] = cookie
+                    response = self.client.get(reverse(name))
+                    self.assertEqual(response.status_code, status.HTTP_200_OK)
+                    self.assertNotIn("Cookie", response.get("Vary", ""))
+                    self.assertIn("max-age=86400", response["Cache-Control"])
+                response = self.client.get(reverse(name), HTTP_IF_NONE_MATCH=response["ETag"])
+                self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        get_schema.assert_not_called()
+        self.assertEqual(schema.documentation_page.cache_info().misses, 2)
+
+
+class SQLiteProfileTests(TestCase):
+    # Tests for the PRAGMAs run on each new SQLite connection
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_profile_applied(self):
+        """Test success: New connections get the settings' PRAGMAs and busy timeout."""
+        if connection.vendor != "sqlite":
+            self.skipTest("SQLite only")
+        self.assertEqual(self.pragma("synchronous"), 1)  # NORMAL
+        self.assertEqual(self.pragma("temp_store"), 2)  # MEMORY
+        self.assertEqual(self.pragma("cache_size"), -64 * 1024)
+        self.assertEqual(self.pragma("busy_timeout"), 20000)
+        self.assertEqual(connection.transaction_mode, "IMMEDIATE")
+
+
 class SeedDatabaseTests(TestCase):
 
     def test_seed_database_command(self):
@@ -0,0 +1,123 @@
+"""
+Time series of transaction counts and amounts, read from the multi-resolution buckets
+maintained in rollups.py.
+
+An account's buckets are all on its shard, while a merchant's are on the shards of the
+accounts it sold to, so merchant series add up the buckets of every shard.
+"""
+
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from itertools import chain
+from math import ceil
+
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import sharding
+
+# Resolution of the stored buckets each granularity is summed from
+SOURCE_LEVELS = {"hour": "hour", "day": "day", "week": "day", "month": "month"}
+
+
+def bucket_start(moment, granularity):
+    """Start of the hour, day, week (Monday) or month containing ``moment``, in local time."""
+    moment = timezone.localtime(moment)
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = moment.date()
+    if granularity == "week":
+        day -= timedelta(days=day.weekday())
+    elif granularity == "month":
+        day = day.replace(day=1)
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def bucket_index(start, origin, granularity):
+    """Number of buckets between the bucket starts ``origin`` and ``start``."""
+    if granularity == "hour":
+        return int((start - origin).total_seconds() // 3600)
+    if granularity == "month":
+        return (start.year - origin.year) * 12 + start.month - origin.month
+    days = (timezone.localdate(start) - timezone.localdate(origin)).days
+    return days // 7 if granularity == "week" else days
+
+
+def shift(origin, count, granularity):
+    """Start of the bucket ``count`` buckets after the bucket starting at ``origin``."""
+    if granularity == "hour":
+        return timezone.localtime(origin + timedelta(hours=count))
+    if granularity == "month":
+        months = origin.year * 12 + origin.month - 1 + count
+        day = date(months // 12, months % 12 + 1, 1)
+    else:
+        days = count * 7 if granularity == "week" else count
+        day = timezone.localdate(origin) + timedelta(days=days)
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def build_series(buckets, granularity, start, end, max_points):
+    """
+    Sum buckets into consecutive points covering the range [start, end].
+
+    When the range spans more than ``max_points`` buckets of the granularity, ``step``
+    consecutive buckets are merged into each point, so the series never has more than
+    ``max_points`` points. Empty points are included with zero totals.
+
+    Args:
+        buckets (iterable): (bucket start, transaction count, amount) tuples.
+
+    Returns:
+        tuple: (step, list of points with start, transaction_count and total_amount)
+    """
+    origin = bucket_start(start, granularity)
+    buckets_in_range = bucket_index(bucket_start(end, granularity), origin, granularity) + 1
+    step = ceil(buckets_in_range / max_points)
+
+    totals = [[0, Decimal(0)] for _ in range(ceil(buckets_in_range / step))]
+    for moment, count, amount in buckets:
+        index = bucket_index(bucket_start(moment, granularity), origin, granularity)
+        totals[index // step][0] += count
+        totals[index // step][1] += amount
+
+    return step, [
+        {
+            "start": shift(origin, i * step, granularity),
+            "transaction_count": count,
+            "total_amount": amount,
+        }
+        for i, (count, amount) in enumerate(totals)
+    ]
+
+
+def time_series(model, lookups, granularity, start, end, max_points, **filters):
+    """
+    Series of an account or merchant read from its time-series buckets.
+
+    Args:
+        model: AccountTimeSeries or MerchantTimeSeries.
+        lookups (dict): Selects the account or merchant, e.g. {"AccountID": "AC00128"}.
+        filters: Optional TransactionType and Channel values.
+
+    Returns:
+        tuple: (step, points), see build_series.
+    """
+    buckets = (
+        model.objects.filter(
+            **lookups,
+            **{field: value for field, value in filters.items() if value},
+            Granularity=SOURCE_LEVELS[granularity],
+            Start__gte=bucket_start(start, granularity),
+            Start__lte=end,
+        )
+        # Sum the buckets of the different transaction types and channels
+        .values("Start")
+        .annotate(count=Sum("TransactionCount"), amount=Sum("TotalAmount"))
+        .order_by()
+        .values_list("Start", "count", "amount")
+    )
+    if model._meta.model_name not in sharding.ACCOUNT_MODELS:
+        # Buckets of the same start on several shards are added up by build_series
+        partials = sharding.scatter(lambda: list(buckets.all()))
+        buckets = chain.from_iterable(partials)
+    return build_series(buckets, granularity, start, end, max_points)
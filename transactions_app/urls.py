@@ -1,32 +1,46 @@
 from django.urls import include, path, re_path  # type: ignore
-from . import views
+from django.conf import settings
+from . import views, async_views, schema
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 
 schema_view = get_schema_view(
-    openapi.Info(
-        title="API Documentation",
-        default_version="v1",
-        description="""API documentation for Bank transactions Endpoints
-                    Python version: 3.12.4
-                    Django version: 5.1.4
-                    Django Rest Framework version: 3.15.2
-                    Pagination size: 5 
-                    """,
-    ),
+    schema.API_INFO,
     public=True,
     permission_classes=(permissions.AllowAny,),
-    url="https://financial-api-wdns.onrender.com",
+    url=schema.API_URL,
 )
 
 urlpatterns = [
-    path("", schema_view.with_ui("swagger", cache_timeout=0), name="schema-swagger-ui"),
+    # Documentation pages, loading the precomputed schema (see schema.py)
+    path(
+        "",
+        views.DocumentationPageView.as_view(page="swagger"),
+        name="schema-swagger-ui",
+    ),
     path(
         "redoc/",
-        schema_view.with_ui("redoc", cache_timeout=0),
+        views.DocumentationPageView.as_view(page="redoc"),
         name="schema-redoc",
     ),
+    # Without a trailing slash: the path Prometheus scrapes by default
+    path("metrics", views.MetricsView.as_view(), name="metrics"),
+    path("profiles/", views.ProfileListView.as_view(), name="profile-list"),
+    path(
+        "profiles/<str:profile_id>/",
+        views.ProfileDownloadView.as_view(),
+        name="profile-download",
+    ),
+    path(
+        "swagger.json",
+        views.SchemaDocumentView.as_view(format="json"),
+        name="schema-json",
+    ),
+    path(
+        "swagger.yaml",
+        views.SchemaDocumentView.as_view(format="yaml"),
+        name="schema-yaml",
+    ),
     path(
         "transactions/<str:account_id>/",
         views.TransactionsByAccount.as_view(),
@@ -42,7 +56,22 @@ urlpatterns = [
         views.TransactionsSummaryByMerchant.as_view(),
         name="merchant-summary",
     ),
+    path(
+        "merchants/<str:merchant_id>/timeseries/",
+        views.MerchantTimeSeriesView.as_view(),
+        name="merchant-timeseries",
+    ),
+    path(
+        "merchants/summary/",
+        views.MerchantsSummaryView.as_view(),
+        name="merchants-summary",
+    ),
     path("add_transaction/", views.AddTransaction.as_view(), name="add_transaction"),
+    path(
+        "add_transaction/bulk/",
+        views.BulkAddTransaction.as_view(),
+        name="add_transaction_bulk",
+    ),
     path(
         "transactions/spending-insights/<str:account_id>/",
         views.SpendingInsightsView.as_view(),
@@ -53,4 +82,72 @@ urlpatterns = [
         views.HighFrequencyAccountsView.as_view(),
         name="high-frequency-accounts",
     ),
+    path(
+        "accounts/high-frequency/live/",
+        views.LiveHighFrequencyAccountsView.as_view(),
+        name="live-high-frequency-accounts",
+    ),
+    path(
+        "accounts/<str:account_id>/timeseries/",
+        views.AccountTimeSeriesView.as_view(),
+        name="account-timeseries",
+    ),
+    path(
+        "accounts/bursts/",
+        views.BurstAccountsView.as_view(),
+        name="burst-accounts",
+    ),
+    path(
+        "analytics/cube/",
+        views.AnalyticsCubeView.as_view(),
+        name="analytics-cube",
+    ),
+    path(
+        "changes/",
+        views.ChangesFeedView.as_view(),
+        name="changes-feed",
+    ),
+    path(
+        "changes/lag/",
+        views.ChangeLogFreshnessView.as_view(),
+        name="changelog-lag",
+    ),
+    # Native async versions of the read endpoints, served by the ASGI entry point
+    path(
+        "async/transactions/<str:account_id>/",
+        async_views.AsyncTransactionsByAccount.as_view(),
+        name="async_transactions_by_account",
+    ),
+    path(
+        "async/merchants/<str:merchant_id>/summary/",
+        async_views.AsyncTransactionsSummaryByMerchant.as_view(),
+        name="async-merchant-summary",
+    ),
+    path(
+        "async/transactions/spending-insights/<str:account_id>/",
+        async_views.AsyncSpendingInsightsView.as_view(),
+        name="async-transaction-spending-insights",
+    ),
+    path(
+        "async/accounts/high-frequency/",
+        async_views.AsyncHighFrequencyAccountsView.as_view(),
+        name="async-high-frequency-accounts",
+    ),
+    path(
+        "async/changes/",
+        async_views.AsyncChangesFeedView.as_view(),
+        name="async-changes-feed",
+    ),
+    # Server-sent events stream of flagged transactions (needs the ASGI entry point)
+    path(
+        "async/flagged/stream/",
+        async_views.FlaggedTransactionsStream.as_view(),
+        name="flagged-transactions-stream",
+    ),
 ]
+
+if settings.DEBUG:
+    # Schema generated on every request, reflecting code changes without generate_schema
+    urlpatterns.append(
+        path("swagger/live/", schema_view.without_ui(cache_timeout=0), name="schema-live")
+    )
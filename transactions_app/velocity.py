@@ -0,0 +1,195 @@
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class AccountRing:
+    """
+    Ring buffer of an account's most recent transactions, up to ``capacity``.
+
+    Timestamps are stored in one compact array and the running total of the amounts in
+    another, so the amount of any suffix of the buffer is a single subtraction. The arrays
+    grow with the account's transactions until the buffer is full, so a quiet account only
+    takes a few slots. For each
+    tracked window, ``heads`` holds the absolute index of the oldest transaction still
+    inside it; heads only move forward, so each query is amortized O(1).
+    """
+
+    __slots__ = ("capacity", "timestamps", "totals", "recorded", "heads")
+
+    def __init__(self, capacity, windows):
+        self.capacity = capacity
+        self.timestamps = array("d")
+        # One extra slot keeps the total *before* the oldest retained transaction
+        self.totals = array("d")
+        self.recorded = 0  # Number of transactions ever recorded
+        self.heads = dict.fromkeys(windows, 0)
+
+    @property
+    def last_timestamp(self):
+        return self.timestamps[(self.recorded - 1) % self.capacity]
+
+    def total_before(self, index):
+        return self.totals[(index - 1) % (self.capacity + 1)] if index else 0.0
+
+    def append(self, timestamp, amount):
+        # Keep timestamps ordered: a late transaction counts as the newest one
+        if self.recorded:
+            timestamp = max(timestamp, self.last_timestamp)
+        index = self.recorded
+        total = self.total_before(index) + amount
+        # Until an array is full, the next slot is its end
+        if len(self.timestamps) < self.capacity:
+            self.timestamps.append(timestamp)
+        else:
+            self.timestamps[index % self.capacity] = timestamp
+        if len(self.totals) <= self.capacity:
+            self.totals.append(total)
+        else:
+            self.totals[index % (self.capacity + 1)] = total
+        self.recorded += 1
+
+    def window(self, seconds, now):
+        """Return (transaction count, amount, saturated) for the last ``seconds``."""
+        oldest_retained = max(0, self.recorded - self.capacity)
+        head = max(self.heads[seconds], oldest_retained)
+        while head < self.recorded and self.timestamps[head % self.capacity] < now - seconds:
+            head += 1
+        self.heads[seconds] = head
+
+        count = self.recorded - head
+        amount = self.total_before(self.recorded) - self.total_before(head)
+        # The window may hold more transactions than the buffer retained
+        saturated = head == oldest_retained and oldest_retained > 0
+        return count, amount, saturated
+
+
+class VelocityTracker:
+    """
+    In-memory per-account transaction velocity, fed at insert time.
+
+    Answers "how many transactions / how much money in the last N seconds" for each of
+    the configured windows in amortized O(1) without querying the database. Accounts are
+    kept in LRU order and the least recently active ones are evicted once
+    ``max_accounts`` are tracked, which caps memory at roughly
+    ``max_accounts * capacity * 16`` bytes, reached only if every account fills its
+    buffer.
+
+    The tracker is per process: each worker only sees the transactions it inserted.
+
+    Attributes:
+        windows (tuple): Window lengths in seconds that can be queried.
+        capacity (int): Transactions retained per account.
+        max_accounts (int): Maximum number of tracked accounts.
+    """
+
+    def __init__(self, windows, capacity, max_accounts):
+        self.windows = tuple(sorted(windows))
+        self.capacity = capacity
+        self.max_accounts = max_accounts
+        self._accounts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._accounts)
+
+    @property
+    def memory_bytes(self):
+        """Approximate size of the ring buffers."""
+        with self._lock:
+            return sum(
+                (len(ring.timestamps) + len(ring.totals)) * 8
+                for ring in self._accounts.values()
+            )
+
+    def record(self, account_id, timestamp, amount):
+        """Record a transaction; transactions older than the largest window are ignored."""
+        if timestamp < time.time() - self.windows[-1]:
+            return
+        with self._lock:
+            ring = self._accounts.get(account_id)
+            if ring is None:
+                ring = self._accounts[account_id] = AccountRing(
+                    self.capacity, self.windows
+                )
+                if len(self._accounts) > self.max_accounts:
+                    self._accounts.popitem(last=False)  # Least recently active account
+            else:
+                self._accounts.move_to_end(account_id)
+            ring.append(timestamp, amount)
+
+    def window(self, account_id, seconds, now=None):
+        """
+        Activity of an account over one of the configured windows.
+
+        Returns:
+            dict: transaction_count, total_amount and saturated (True when the window holds
+            more transactions than the buffer retains, so the figures are lower bounds).
+        """
+        if seconds not in self.windows:
+            raise ValueError(f"window must be one of {self.windows}")
+        now = time.time() if now is None else now
+        with self._lock:
+            ring = self._accounts.get(account_id)
+            if ring is None:
+                return {"transaction_count": 0, "total_amount": 0.0, "saturated": False}
+            count, amount, saturated = ring.window(seconds, now)
+        return {
+            "transaction_count": count,
+            "total_amount": round(amount, 2),
+            "saturated": saturated,
+        }
+
+    def accounts_over(self, seconds, threshold, now=None):
+        """Accounts with more than ``threshold`` transactions in the window, busiest first."""
+        if seconds not in self.windows:
+            raise ValueError(f"window must be one of {self.windows}")
+        now = time.time() if now is None else now
+        results = []
+        with self._lock:
+            self._evict_idle(now)
+            for account_id, ring in self._accounts.items():
+                count, amount, saturated = ring.window(seconds, now)
+                if count > threshold:
+                    results.append(
+                        {
+                            "AccountID": account_id,
+                            "transaction_count": count,
+                            "total_amount": round(amount, 2),
+                            "saturated": saturated,
+                        }
+                    )
+        return sorted(results, key=lambda account: -account["transaction_count"])
+
+    def clear(self):
+        with self._lock:
+            self._accounts.clear()
+
+    def _evict_idle(self, now):
+        # Accounts are in LRU order, so idle ones are at the front
+        while self._accounts:
+            ring = next(iter(self._accounts.values()))
+            if ring.last_timestamp >= now - self.windows[-1]:
+                break
+            self._accounts.popitem(last=False)
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def get_velocity_tracker():
+    """Return the process-wide tracker configured by the VELOCITY_* settings."""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            # The windows of the velocity rule are tracked too
+            _tracker = VelocityTracker(
+                windows=set(settings.VELOCITY_WINDOWS) | set(settings.VELOCITY_LIMITS),
+                capacity=settings.VELOCITY_BUFFER_SIZE,
+                max_accounts=settings.VELOCITY_MAX_ACCOUNTS,
+            )
+        return _tracker
@@ -1,32 +1,141 @@
 # import datetime
-from datetime import datetime, timedelta
+import hashlib
+import logging
+import heapq
+import json
+import re
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from time import monotonic, sleep
 from rest_framework.generics import ListAPIView
 from rest_framework.views import APIView
 from rest_framework.reverse import reverse
-import statistics as st
 from django.shortcuts import render, HttpResponse
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.views import View
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from .models import Transactions
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import IsAdminUser
+from rest_framework.settings import api_settings
+from django.conf import settings
+from .models import (
+    AccountDailyActivity,
+    AccountTimeSeries,
+    MerchantDailySummary,
+    MerchantTimeSeries,
+    Transactions,
+)
 from .serializer import TransactionsSerializer
+from .parsers import NDJSONParser
+from .renderers import NDJSONRenderer, ndjson_line
+from .ingest import validate_transactions, insert_transactions
+from .writebehind import IngestQueueFull, get_write_behind_buffer
+from .velocity import get_velocity_tracker
+from .timeseries import time_series
+from .snapshot import get_snapshot
+from . import archive, changelog, metrics, profiling, replicas, schema, sharding
+from .async_views import bounded_int, high_frequency_params, most_used, requested_shard
+from . import cube
+from .startup import lazy_import
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from django.db.models import Sum, Count
+from django.db.models import Sum, Count, F, Max, Window
+from django.db.models.functions import Cast, Lag, RowNumber
 from django.db import models
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import quote_etag
+from django.core.cache import cache
+
+np = lazy_import("numpy")  # Only used by the ?source=snapshot reads
+
+logger = logging.getLogger(__name__)
 
 
 # Create your views here.
 
 
-class TransactionsByAccount(ListAPIView):
+def parse_day(value):
+    """Parse an optional YYYY-MM-DD query parameter."""
+    if not value:
+        return None
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(f"Invalid date: {value}. Expected YYYY-MM-DD.")
+    return day
+
+
+def parse_bound(value, default_time):
+    """Parse an optional date or datetime query parameter; dates cover the whole day."""
+    if not value:
+        return None
+    # parse_datetime also accepts a bare date (as midnight), so try dates first
+    day = parse_date(value)
+    parsed = datetime.combine(day, default_time) if day else parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f"Invalid date: {value}")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def requested_snapshot(request):
+    """
+    The columnar snapshot when the request asks for ?source=snapshot, else None.
+
+    Raises:
+        ValueError: Unknown source, or no snapshot has been built yet.
+    """
+    source = request.query_params.get("source", "db")
+    if source == "db":
+        return None
+    if source != "snapshot":
+        raise ValueError('source must be "db" or "snapshot".')
+    snapshot = get_snapshot()
+    if snapshot is None:
+        raise ValueError("No snapshot has been built yet (see the build_snapshot command).")
+    return snapshot
+
+
+class AccountShardMixin:
+    """Runs the view on the shard holding the account of the account_id URL argument."""
+
+    def dispatch(self, request, *args, **kwargs):
+        with sharding.account_shard(kwargs["account_id"]):
+            return super().dispatch(request, *args, **kwargs)
+
+
+class ReplicaReadMixin:
+    """Runs the view's reads on the replicas, unless the client wrote recently."""
+
+    def dispatch(self, request, *args, **kwargs):
+        with replicas.for_request(request):
+            return super().dispatch(request, *args, **kwargs)
+
+
+# Lets the endpoints computing on the columnar snapshot document the source parameter
+SOURCE_PARAMETER = openapi.Parameter(
+    "source",
+    openapi.IN_QUERY,
+    description='"db" (default) or "snapshot" to compute on the last columnar snapshot built by the build_snapshot command.',
+    type=openapi.TYPE_STRING,
+    required=False,
+)
+
+
+class TransactionsByAccount(AccountShardMixin, ListAPIView):
     """
     Endpoint to retrieve a paginated list of transactions for a specific account, ordered by date.
 
     This view handles GET requests to fetch transactions associated with a given account ID.
-    The transactions are ordered by their transaction date.
+    The transactions are ordered by their transaction date, and include the transactions
+    moved to the archive by the archive_transactions command.
 
     Attributes:
         serializer_class (TransactionsSerializer): The serializer class used for serializing the transactions data.
+        query_budget (int): Most queries a request may run (see instrumentation.py).
 
     Methods:
         get(request, *args, **kwargs):
@@ -37,6 +146,8 @@ class TransactionsByAccount(ListAPIView):
     """
 
     serializer_class = TransactionsSerializer
+    # Count and page, plus the shard directory and both dimension tables when not cached
+    query_budget = 5
 
     @swagger_auto_schema(
         operation_description="Retrieve a paginated list of transactions for a specific account, ordered by date",
@@ -56,14 +167,17 @@ class TransactionsByAccount(ListAPIView):
 
     def get_queryset(self):
         account_id = self.kwargs["account_id"]
-        return (
+        transactions = (
             Transactions.objects.filter(AccountID=account_id)
             .select_related("AccountID", "MerchantID", "DeviceID")
             .order_by("TransactionDate")
         )
+        history = archive.AccountHistory(account_id, transactions)
+        # Only paginated through the archive when the account has archived rows
+        return history if history.archived else transactions
 
 
-class SuspiciousTransactions(ListAPIView):
+class SuspiciousTransactions(AccountShardMixin, ListAPIView):
     serializer_class = TransactionsSerializer
 
     """
@@ -77,8 +191,17 @@ class SuspiciousTransactions(ListAPIView):
 
     3. Excessive Login Attempts: Flag as fraud if more than 3 login attempts.
 
+    With ?source=snapshot, the rules run on the account's rows of the columnar snapshot
+    (as of the X-Snapshot-Built-At response header) and only the flagged rows are read
+    from the database.
+
     """
 
+    snapshot = None
+    # Statistics, top locations, count and page, plus the shard directory and both
+    # dimension tables when not cached
+    query_budget = 7
+
     @swagger_auto_schema(
         operation_description="Returns transactions flagged as suspicious based on anomalies like high amounts, unusual locations, or excessive login attempts.",
         manual_parameters=[
@@ -88,15 +211,25 @@ class SuspiciousTransactions(ListAPIView):
                 description="Account ID (e.g.: AC00441)",
                 type=openapi.TYPE_STRING,
                 required=True,
-            )
+            ),
+            SOURCE_PARAMETER,
         ],
         responses={200: "List of suspicious transactions for the specified account"},
     )
     def get(self, request, *args, **kwargs):
-        return super().get(request, *args, **kwargs)
+        try:
+            self.snapshot = requested_snapshot(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+        response = super().get(request, *args, **kwargs)
+        if self.snapshot is not None:
+            response["X-Snapshot-Built-At"] = self.snapshot.built_at
+        return response
 
     def get_queryset(self):
         account_id = self.kwargs["account_id"]
+        if self.snapshot is not None:
+            return self.get_snapshot_queryset(account_id)
 
         # Get all transactions for the account
         transactions = Transactions.objects.filter(AccountID=account_id).select_related(
@@ -106,14 +239,17 @@ class SuspiciousTransactions(ListAPIView):
         # Initialize empty querysets for suspicious transactions
         high_deviation = Transactions.objects.none()
 
-        # High Deviation from Average Spending
-        amounts = list(transactions.values_list("TransactionAmount", flat=True))
+        # High Deviation from Average Spending, on the integer cents of the column
+        amounts = np.fromiter(
+            transactions.values_list(
+                Cast("TransactionAmount", models.BigIntegerField()), flat=True
+            ),
+            dtype=np.int64,
+        )
 
         if len(amounts) > 1:  # Ensure there are enough transactions to calculate stdev
-            avg_amount = st.mean(amounts)
-            std_dev = st.stdev(amounts)
-            threshold = avg_amount + 2 * std_dev
-            high_deviation = transactions.filter(TransactionAmount__gt=threshold)
+            threshold = amounts.mean() + 2 * amounts.std(ddof=1)
+            high_deviation = transactions.filter(TransactionAmount__gt=float(threshold) / 100)
 
         # Unusual Locations
         location_counts = list(
@@ -147,13 +283,43 @@ class SuspiciousTransactions(ListAPIView):
 
         return high_deviation | unusual_locations | excessive_login_attempts
 
+    def get_snapshot_queryset(self, account_id):
+        # The same rules, on views of the account's slice of the snapshot columns
+        snapshot = self.snapshot
+        rows = snapshot.account_rows(account_id)
+        amounts = snapshot.columns["amount_cents"][rows]
+
+        # Excessive Login Attempts
+        flagged = snapshot.columns["login_attempts"][rows] > 3
+
+        # High Deviation from Average Spending
+        if len(amounts) > 1:
+            flagged |= amounts > amounts.mean() + 2 * amounts.std(ddof=1)
+
+        # Unusual Locations (all locations are normal if each is used once)
+        location_counts = snapshot.value_counts("location", rows, "Location")
+        if not all(loc["count"] == 1 for loc in location_counts):
+            top_3_locations = [
+                snapshot.code("location", loc["Location"])
+                for loc in location_counts[:3]
+                if loc["count"] >= 2
+            ]
+            flagged |= ~np.isin(snapshot.columns["location"][rows], top_3_locations)
+
+        flagged_ids = snapshot.columns["transaction_id"][rows][flagged].tolist()
+        return Transactions.objects.filter(TransactionID__in=flagged_ids).select_related(
+            "AccountID", "MerchantID", "DeviceID"
+        )
+
 
-class TransactionsSummaryByMerchant(ListAPIView):
+class TransactionsSummaryByMerchant(ReplicaReadMixin, ListAPIView):
     """
     Provides a summary of total transactions, total amounts, and counts for a specific merchant.
 
     This endpoint filters transactions for a given merchant and performs aggregation to return a summary
     including the total amount of transactions and the total number of transactions for that merchant.
+    Archived transactions (see the archive_transactions command) are included.
+    With ?source=snapshot, the totals are computed on the columnar snapshot instead.
 
     Attributes:
         serializer_class (TransactionsSerializer): The serializer class used for the transactions.
@@ -179,25 +345,241 @@ class TransactionsSummaryByMerchant(ListAPIView):
                 description="Merchant Name (e.g.: M065)",
                 type=openapi.TYPE_STRING,
                 required=True,
-            )
+            ),
+            SOURCE_PARAMETER,
         ],
         responses={200: "Summary of transactions for the specified merchant"},
     )
     def get(self, request, merchant_id, *args, **kwargs):
+        try:
+            snapshot = requested_snapshot(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+        if snapshot is not None:
+            summary = self.summarize_snapshot(snapshot, merchant_id)
+            summary["merchant_id"] = merchant_id
+            return Response(summary, headers={"X-Snapshot-Built-At": snapshot.built_at})
+
         # Filter transactions for the given merchant
         transactions = Transactions.objects.filter(MerchantID=merchant_id)
 
-        # Perform aggregation for the summary
-        summary = transactions.aggregate(
-            total_amount=Sum("TransactionAmount"),
-            total_transactions=Count("TransactionID"),
+        # Perform aggregation for the summary, on every shard
+        summary = sharding.merge_sums(
+            sharding.scatter(
+                lambda: transactions.aggregate(
+                    total_amount=Sum("TransactionAmount"),
+                    total_transactions=Count("TransactionID"),
+                )
+            ),
+            ("total_amount", "total_transactions"),
         )
 
+        # Add the transactions moved to the archive
+        cents, count = archive.merchant_totals([merchant_id]).get(merchant_id, (0, 0))
+        if count:
+            summary["total_amount"] = (summary["total_amount"] or 0) + Decimal(cents) / 100
+            summary["total_transactions"] += count
+
         # Add the merchant ID to the summary
         summary["merchant_id"] = merchant_id
 
         return Response(summary)
 
+    def summarize_snapshot(self, snapshot, merchant_id):
+        code = snapshot.code("merchant", merchant_id)
+        if code is None:
+            return {"total_amount": None, "total_transactions": 0}
+        # One vectorized pass over the memory-mapped columns
+        rows = snapshot.columns["merchant"] == code
+        total_cents = int(snapshot.columns["amount_cents"].sum(where=rows))
+        return {
+            "total_amount": Decimal(total_cents) / 100,
+            "total_transactions": int(np.count_nonzero(rows)),
+        }
+
+
+class MerchantsSummaryView(ReplicaReadMixin, APIView):
+    """
+    Provides transaction totals for many merchants (or all of them) in one request.
+
+    Without `top`, the totals of the requested merchants are computed with a single grouped
+    query over the Transactions table, plus the archive partitions of the requested months. With `top`, the endpoint returns a leaderboard of the
+    N merchants with the highest amount or count, selected with a heap from the per-merchant
+    daily rollups instead of sorting every merchant.
+
+    Query Parameters:
+    - merchant_ids (str, optional): Comma-separated merchant IDs, or "all". Default is "all".
+    - start (str, optional): First day included (YYYY-MM-DD).
+    - end (str, optional): Last day included (YYYY-MM-DD).
+    - top (int, optional): Only return the N merchants with the highest totals.
+    - order_by (str, optional): "amount" or "count", used with `top`. Default is "amount".
+
+    Responses:
+    - 200 OK: A JSON object containing the parameters and `merchants`, a list of objects with
+      merchant_id, total_amount and total_transactions.
+    - 400 Bad Request: Invalid query parameter.
+    """
+
+    ORDER_FIELDS = {"amount": "total_amount", "count": "total_transactions"}
+
+    @swagger_auto_schema(
+        operation_description="Provides total amounts and counts for a list of merchants (or all), or a top-N leaderboard by amount or count.",
+        manual_parameters=[
+            openapi.Parameter(
+                "merchant_ids",
+                openapi.IN_QUERY,
+                description='Comma-separated merchant IDs (e.g.: M001,M065) or "all". Default is "all".',
+                type=openapi.TYPE_STRING,
+                required=False,
+            ),
+            openapi.Parameter(
+                "start",
+                openapi.IN_QUERY,
+                description="First day included (e.g.: 2023-01-01).",
+                type=openapi.TYPE_STRING,
+                required=False,
+            ),
+            openapi.Parameter(
+                "end",
+                openapi.IN_QUERY,
+                description="Last day included (e.g.: 2023-12-31).",
+                type=openapi.TYPE_STRING,
+                required=False,
+            ),
+            openapi.Parameter(
+                "top",
+                openapi.IN_QUERY,
+                description="Only return the N merchants with the highest totals.",
+                type=openapi.TYPE_INTEGER,
+                required=False,
+            ),
+            openapi.Parameter(
+                "order_by",
+                openapi.IN_QUERY,
+                description='Leaderboard order: "amount" or "count". Default is "amount".',
+                type=openapi.TYPE_STRING,
+                required=False,
+            ),
+        ],
+        responses={
+            200: "Summary of transactions for the requested merchants",
+            400: "Invalid query parameter",
+        },
+    )
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        merchant_ids = params.get("merchant_ids", "all").strip()
+        merchant_ids = (
+            None
+            if merchant_ids == "all"
+            else [m.strip() for m in merchant_ids.split(",") if m.strip()]
+        )
+        order_by = params.get("order_by", "amount")
+        top = params.get("top")
+        try:
+            start = parse_day(params.get("start"))
+            end = parse_day(params.get("end"))
+            if top is not None and (not top.isdigit() or int(top) == 0):
+                raise ValueError("top must be a positive integer.")
+            if order_by not in self.ORDER_FIELDS:
+                raise ValueError('order_by must be "amount" or "count".')
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        response = {
+            "merchant_ids": merchant_ids or "all",
+            "start": start,
+            "end": end,
+        }
+        if top is None:
+            response["merchants"] = self.get_totals(merchant_ids, start, end)
+        else:
+            response["top"] = int(top)
+            response["order_by"] = order_by
+            response["merchants"] = self.get_leaderboard(
+                merchant_ids, start, end, int(top), self.ORDER_FIELDS[order_by]
+            )
+        return Response(response)
+
+    def get_totals(self, merchant_ids, start, end):
+        # One grouped query for every requested merchant
+        transactions = Transactions.objects.all()
+        if merchant_ids is not None:
+            transactions = transactions.filter(MerchantID__in=merchant_ids)
+        if start:
+            transactions = transactions.filter(TransactionDate__date__gte=start)
+        if end:
+            transactions = transactions.filter(TransactionDate__date__lte=end)
+
+        rows = transactions.values("MerchantID").annotate(
+            total_amount=Sum("TransactionAmount"),
+            total_transactions=Count("TransactionID"),
+        )
+        # Each shard's totals of the merchants, added up
+        totals = {
+            row["MerchantID"]: row
+            for row in sharding.merge_groups(
+                sharding.scatter(lambda: list(rows.order_by())),
+                "MerchantID",
+                ("total_amount", "total_transactions"),
+            )
+        }
+        # Like merchants/<merchant_id>/summary/, merchants without transactions are included
+        for merchant_id in merchant_ids or []:
+            totals.setdefault(
+                merchant_id,
+                {"MerchantID": merchant_id, "total_amount": None, "total_transactions": 0},
+            )
+        # Add the archived transactions, from the partitions of the requested days only
+        for merchant_id, (cents, count) in archive.merchant_totals(
+            merchant_ids, start, end
+        ).items():
+            row = totals.setdefault(
+                merchant_id,
+                {"MerchantID": merchant_id, "total_amount": None, "total_transactions": 0},
+            )
+            row["total_amount"] = (row["total_amount"] or 0) + Decimal(cents) / 100
+            row["total_transactions"] += count
+        return [
+            {
+                "merchant_id": merchant_id,
+                "total_amount": row["total_amount"],
+                "total_transactions": row["total_transactions"],
+            }
+            for merchant_id, row in sorted(totals.items())
+        ]
+
+    def get_leaderboard(self, merchant_ids, start, end, top, order_field):
+        # Sum the daily rollups per merchant, then keep the N largest with a heap
+        summaries = MerchantDailySummary.objects.all()
+        if merchant_ids is not None:
+            summaries = summaries.filter(MerchantID__in=merchant_ids)
+        if start:
+            summaries = summaries.filter(Day__gte=start)
+        if end:
+            summaries = summaries.filter(Day__lte=end)
+
+        rows = summaries.values("MerchantID").annotate(
+            total_amount=Sum("TotalAmount"),
+            total_transactions=Sum("TransactionCount"),
+        )
+        # Each shard holds partial totals of the merchants: add them up first
+        totals = sharding.merge_groups(
+            sharding.scatter(lambda: list(rows.order_by())),
+            "MerchantID",
+            ("total_amount", "total_transactions"),
+        )
+        return [
+            {
+                "merchant_id": row["MerchantID"],
+                "total_amount": row["total_amount"],
+                "total_transactions": row["total_transactions"],
+            }
+            for row in heapq.nlargest(
+                top, totals, key=lambda row: row[order_field]
+            )
+        ]
+
 
 class AddTransaction(APIView):
     """
@@ -222,9 +604,17 @@ class AddTransaction(APIView):
     - IPAddress (str): The IP address from which the transaction was made.
     - PreviousTransactionDate (str): The date of the previous transaction.
 
+    When the TRANSACTIONS_WRITE_BEHIND setting is enabled, validated transactions are
+    queued and group-committed by a background flusher. The response is only sent once
+    the batch containing the transaction has been committed, or after
+    WRITE_BEHIND_TIMEOUT seconds without a commit.
+
     Responses:
         200: Transaction added successfully.
         400: Bad request with validation errors.
+        500: The write-behind commit failed.
+        503: Write-behind queue is full, or the commit was not confirmed in time; retry
+            after the Retry-After header.
     """
 
     @swagger_auto_schema(
@@ -249,22 +639,135 @@ class AddTransaction(APIView):
                 "PreviousTransactionDate": openapi.Schema(type=openapi.TYPE_STRING),
             },
         ),
-        responses={200: "Transaction added successfully"},
+        responses={
+            200: "Transaction added successfully",
+            503: "Write-behind queue is full or the commit timed out, retry later",
+        },
     )
     def post(self, request):
         serializer = TransactionsSerializer(data=request.data)
         if serializer.is_valid():
+            if settings.TRANSACTIONS_WRITE_BEHIND:
+                return self.write_behind(serializer.validated_data)
             serializer.save()
             return Response({"message": "Transaction added successfully"})
         return Response(serializer.errors, status=400)
 
+    def write_behind(self, validated_data):
+        # Queue the transaction for the next group commit and only acknowledge it
+        # once its batch is durable
+        try:
+            future = get_write_behind_buffer().submit(Transactions(**validated_data))
+        except IngestQueueFull:
+            return Response(
+                {"error": "Too many pending transactions, please retry later."},
+                status=503,
+                headers={"Retry-After": str(settings.WRITE_BEHIND_RETRY_AFTER)},
+            )
+
+        try:
+            future.result(timeout=settings.WRITE_BEHIND_TIMEOUT)
+        except FutureTimeoutError:
+            # The flusher is stalled or dead: free the worker. The batch may still commit
+            # later, so the response says the outcome is unknown
+            logger.error(
+                "Write-behind commit not confirmed in %ss", settings.WRITE_BEHIND_TIMEOUT
+            )
+            return Response(
+                {"error": "Not confirmed in time; the transaction may not be stored."},
+                status=503,
+                headers={"Retry-After": str(settings.WRITE_BEHIND_RETRY_AFTER)},
+            )
+        except Exception:
+            logger.exception("Write-behind commit failed")
+            return Response({"error": "The transaction could not be stored."}, status=500)
+        return Response({"message": "Transaction added successfully"})
+
+
+class BulkAddTransaction(APIView):
+    """
+    Endpoint to create many transactions in a single request.
+
+    The request body is either a JSON array or newline-delimited JSON (Content-Type:
+    application/x-ndjson) where each item has the same fields as AddTransaction.
+
+    All accounts, merchants and devices referenced by the batch are validated with one
+    query per table, the TransactionIDs are allocated as one block and the valid items
+    are inserted with a single bulk insert in one database transaction. Invalid items
+    are skipped and reported by their position in the batch.
+
+    Responses:
+        200: At least one transaction was added (or the batch was empty).
+        400: The body is not a list, is too large, or no item is valid.
+    """
+
+    parser_classes = [JSONParser, NDJSONParser]
+
+    @swagger_auto_schema(
+        operation_description="Creates a batch of transactions (JSON array or NDJSON) and reports per-item validation errors.",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_ARRAY,
+            items=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                description="Same fields as add_transaction/",
+            ),
+        ),
+        responses={
+            200: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    "created": openapi.Schema(type=openapi.TYPE_INTEGER),
+                    "transaction_ids": openapi.Schema(
+                        type=openapi.TYPE_ARRAY,
+                        items=openapi.Schema(type=openapi.TYPE_STRING),
+                    ),
+                    "errors": openapi.Schema(
+                        type=openapi.TYPE_ARRAY,
+                        items=openapi.Schema(
+                            type=openapi.TYPE_OBJECT,
+                            properties={
+                                "index": openapi.Schema(type=openapi.TYPE_INTEGER),
+                                "errors": openapi.Schema(type=openapi.TYPE_OBJECT),
+                            },
+                        ),
+                    ),
+                },
+            ),
+        },
+    )
+    def post(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            return Response({"error": "Expected a list of transactions."}, status=400)
+        if len(items) > settings.BULK_TRANSACTION_MAX_ITEMS:
+            return Response(
+                {
+                    "error": f"A batch may contain at most {settings.BULK_TRANSACTION_MAX_ITEMS} transactions."
+                },
+                status=400,
+            )
 
-class SpendingInsightsView(ListAPIView):
+        instances, errors = validate_transactions(items)
+        created = insert_transactions(instances)
+
+        return Response(
+            {
+                "created": len(created),
+                "transaction_ids": [tx.TransactionID for tx in created],
+                "errors": errors,
+            },
+            status=400 if errors and not created else 200,
+        )
+
+
+class SpendingInsightsView(ReplicaReadMixin, AccountShardMixin, ListAPIView):
     """
     Provides spending insights for a specific account, including totals by transaction type, most-used merchant, location, and channel.
+    With ?source=snapshot, the insights are computed on the account's slice of the columnar snapshot.
 
     Attributes:
         serializer_class (class): The serializer class used for transactions.
+        query_budget (int): Most queries a request may run (see instrumentation.py).
 
     Methods:
         get(request, account_id, *args, **kwargs):
@@ -279,6 +782,9 @@ class SpendingInsightsView(ListAPIView):
     """
 
     serializer_class = TransactionsSerializer
+    # One query per insight, plus the shard directory and the Locations table when not
+    # cached
+    query_budget = 6
 
     @swagger_auto_schema(
         operation_description="Provides spending insights for a specific account, including totals by transaction type, most-used merchant, location, and channel.",
@@ -289,11 +795,21 @@ class SpendingInsightsView(ListAPIView):
                 description="Account ID for which to retrieve spending insights (e.g.: AC00225).",
                 type=openapi.TYPE_STRING,
                 required=True,
-            )
+            ),
+            SOURCE_PARAMETER,
         ],
         responses={200: "Spending insights for the specified account"},
     )
     def get(self, request, account_id, *args, **kwargs):
+        try:
+            snapshot = requested_snapshot(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+        if snapshot is not None:
+            return Response(
+                self.insights_from_snapshot(snapshot, account_id),
+                headers={"X-Snapshot-Built-At": snapshot.built_at},
+            )
 
         try:
             # Filter transactions for the given account
@@ -373,27 +889,69 @@ class SpendingInsightsView(ListAPIView):
                 {"error": f"An unexpected error occurred: {str(e)}"}, status=500
             )
 
+    def insights_from_snapshot(self, snapshot, account_id):
+        rows = snapshot.account_rows(account_id)
+
+        # Total spending by transaction type
+        types = snapshot.columns["transaction_type"][rows]
+        counts = np.bincount(types)
+        cents = np.bincount(types, weights=snapshot.columns["amount_cents"][rows])
+        spending_by_type = [
+            {
+                "TransactionType": snapshot.decode("transaction_type", code),
+                "total_amount": Decimal(int(cents[code])) / 100,
+                "transaction_count": int(counts[code]),
+            }
+            for code in np.flatnonzero(counts)
+        ]
 
-class HighFrequencyAccountsView(APIView):
+        return {
+            "account_id": account_id,
+            "spending_by_type": spending_by_type,
+            "most_used_merchant": most_used(
+                snapshot.value_counts("merchant", rows, "MerchantID"),
+                "All merchants are used once",
+            ),
+            "most_used_channel": most_used(
+                snapshot.value_counts("channel", rows, "Channel"),
+                "All channels are used once",
+            ),
+            "most_used_location": most_used(
+                snapshot.value_counts("location", rows, "Location"),
+                "All locations are used once",
+            ),
+        }
+
+
+class HighFrequencyAccountsView(ReplicaReadMixin, APIView):
     """
     Identifies accounts with unusually high transaction frequency within a defined period.
 
     This endpoint allows users to identify accounts that have a high number of transactions
     within a specified number of days. By default, it analyzes the last 1000 days of transactions.
 
+    The counts are summed from the per-account daily activity buckets instead of grouping the
+    Transactions table, so the period covers whole calendar days: today and the previous
+    `days` days. Responses are cached per calendar day and invalidated when a bucket changes;
+    the ETag header allows clients to revalidate with If-None-Match.
+
     Query Parameters:
-    - days (int, optional): Number of days to analyze transaction frequency. Default is 1000.
+    - days (int, optional): Number of days to analyze transaction frequency, from 1 to 36500. Default is 1000.
+    - threshold (int, optional): Flag accounts with more transactions than this (0 or more). Default is 10.
 
     Responses:
     - 200 OK: A JSON object containing:
         - period_days (int): The number o days analyzed.
+        - threshold (int): The threshold used.
         - high_frequency_accounts (list): A list of accounts with high transaction frequency,
           each containing:
             - AccountID (str): The ID of the account.
             - transaction_count (int): The number of transactions for the account within the period.
+    - 304 Not Modified: The If-None-Match header matches the current ETag.
+    - 400 Bad Request: Invalid days or threshold.
 
     Example:
-    GET /api/high-frequency-accounts?days=30
+    GET /api/high-frequency-accounts?days=30&threshold=20
     """
 
     @swagger_auto_schema(
@@ -405,13 +963,21 @@ class HighFrequencyAccountsView(APIView):
                 description="Number of days to analyze transaction frequency. Default is 1000 since the transactions of the data set occured in 2023.",
                 type=openapi.TYPE_INTEGER,
                 required=False,
-            )
+            ),
+            openapi.Parameter(
+                "threshold",
+                openapi.IN_QUERY,
+                description="Minimum number of transactions (exclusive) for an account to be flagged. Default is 10.",
+                type=openapi.TYPE_INTEGER,
+                required=False,
+            ),
         ],
         responses={
             200: openapi.Schema(
                 type=openapi.TYPE_OBJECT,
                 properties={
                     "period_days": openapi.Schema(type=openapi.TYPE_INTEGER),
+                    "threshold": openapi.Schema(type=openapi.TYPE_INTEGER),
                     "high_frequency_accounts": openapi.Schema(
                         type=openapi.TYPE_ARRAY,
                         items=openapi.Schema(
@@ -426,36 +992,825 @@ class HighFrequencyAccountsView(APIView):
                     ),
                 },
             ),
+            400: "Invalid query parameter",
         },
     )
     def get(self, request, *args, **kwargs):
         # Get the period from query parameters (default: last 1000 days)
-        period = int(request.query_params.get("days", 1000))
-
-        # Calculate the start date for filtering
-        start_date = datetime.now() - timedelta(days=period)
-
-        # Filter transactions within the defined period
-        high_frequency_accounts = (
-            Transactions.objects.filter(TransactionDate__gte=start_date)
-            .values("AccountID")
-            .annotate(transaction_count=Count("TransactionID"))
-            .filter(transaction_count__gt=10)  # Threshold for high frequency
-            .order_by("-transaction_count")
+        try:
+            period, threshold = high_frequency_params(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        # The buckets only change when transactions are inserted, updated or deleted
+        today = timezone.localdate()
+        versions = sharding.scatter(
+            lambda: AccountDailyActivity.objects.aggregate(version=Max("UpdatedAt"))[
+                "version"
+            ]
         )
+        version = max((v for v in versions if v is not None), default=None)
+        cache_key = f"high-frequency:{today}:{period}:{threshold}:{version}"
+        etag = quote_etag(hashlib.md5(cache_key.encode()).hexdigest())
+        if etag in request.headers.get("If-None-Match", ""):
+            return Response(status=304, headers={"ETag": etag})
+
+        results = cache.get(cache_key)
+        metrics.cache_lookup("high_frequency_accounts", results is not None)
+        if results is None:
+            # Sum the daily buckets of the period
+            high_frequency_accounts = (
+                AccountDailyActivity.objects.filter(
+                    Day__gte=today - timedelta(days=period)
+                )
+                .values("AccountID")
+                .annotate(transaction_count=Sum("TransactionCount"))
+                .filter(transaction_count__gt=threshold)
+                .order_by("-transaction_count")
+            )
+            # An account's buckets are all on its shard: the accounts found on each
+            # shard are complete, and only need to be merged in order
+            high_frequency_accounts = sorted(
+                (
+                    account
+                    for accounts in sharding.scatter(lambda: list(high_frequency_accounts.all()))
+                    for account in accounts
+                ),
+                key=lambda account: -account["transaction_count"],
+            )
 
-        # Format the response
-        results = [
-            {
-                "AccountID": account["AccountID"],
-                "transaction_count": account["transaction_count"],
-            }
-            for account in high_frequency_accounts
-        ]
+            # Format the response
+            results = [
+                {
+                    "AccountID": account["AccountID"],
+                    "transaction_count": account["transaction_count"],
+                }
+                for account in high_frequency_accounts
+            ]
+            # Valid for the rest of the calendar day at most
+            tomorrow = datetime.combine(today + timedelta(days=1), time.min)
+            cache.set(
+                cache_key,
+                results,
+                timeout=(timezone.make_aware(tomorrow) - timezone.now()).total_seconds(),
+            )
 
         return Response(
             {
                 "period_days": period,
+                "threshold": threshold,
                 "high_frequency_accounts": results,
+            },
+            headers={"ETag": etag, "Cache-Control": "no-cache"},
+        )
+
+
+class BurstAccountsView(ReplicaReadMixin, APIView):
+    """
+    Detects velocity bursts: accounts with at least N transactions inside any rolling time window.
+
+    Unlike HighFrequencyAccountsView, which counts transactions over a whole period, this
+    endpoint looks at every window of `window` length. For each transaction, a SQL window
+    function (LAG over TransactionDate, partitioned by AccountID) returns the date of the
+    transaction N-1 positions earlier; if it lies within the window, the N transactions
+    form a burst. Overlapping burst windows of the same account are merged.
+
+    Query Parameters:
+    - min_transactions (int, optional): Minimum number of transactions (N) in a window. Default is 10.
+    - window (str, optional): Window length (W) in seconds, or with an s/m/h suffix (e.g. 90s, 15m, 1h). Default is 1h.
+    - start (str, optional): Only consider transactions on or after this date/datetime (ISO 8601).
+    - end (str, optional): Only consider transactions on or before this date/datetime (ISO 8601).
+
+    Responses:
+    - 200 OK: A JSON object containing:
+        - min_transactions (int), window_seconds (int), start (str), end (str): The parameters used.
+        - burst_accounts (list): Accounts with at least one burst, most intense first, each containing:
+            - AccountID (str): The ID of the account.
+            - max_transactions (int): Largest number of transactions in a merged burst.
+            - bursts (list): window_start, window_end and transaction_count of each burst.
+    - 400 Bad Request: Invalid query parameter.
+
+    Example:
+    GET /accounts/bursts/?min_transactions=5&window=10m&start=2023-01-01
+    """
+
+    WINDOW_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600}
+
+    @swagger_auto_schema(
+        operation_description="Finds accounts with at least N transactions inside any rolling window of W seconds/minutes/hours.",
+        manual_parameters=[
+            openapi.Parameter(
+                "min_transactions",
+                openapi.IN_QUERY,
+                description="Minimum number of transactions inside a window (at least 2). Default is 10.",
+                type=openapi.TYPE_INTEGER,
+                required=False,
+            ),
+            openapi.Parameter(
+                "window",
+                openapi.IN_QUERY,
+                description="Window length in seconds or with a unit suffix, e.g. 90s, 15m, 1h. Default is 1h.",
+                type=openapi.TYPE_STRING,
+                required=False,
+            ),
+            openapi.Parameter(
+                "start",
+                openapi.IN_QUERY,
+                description="Start of the date range (e.g.: 2023-01-01 or 2023-01-01T08:00:00).",
+                type=openapi.TYPE_STRING,
+                required=False,
+            ),
+            openapi.Parameter(
+                "end",
+                openapi.IN_QUERY,
+                description="End of the date range (e.g.: 2023-12-31).",
+                type=openapi.TYPE_STRING,
+                required=False,
+            ),
+        ],
+        responses={
+            200: "Accounts with transaction bursts and the offending windows",
+            400: "Invalid query parameter",
+        },
+    )
+    def get(self, request, *args, **kwargs):
+        try:
+            min_transactions = request.query_params.get("min_transactions", "10")
+            if not min_transactions.isdigit() or int(min_transactions) < 2:
+                raise ValueError("min_transactions must be an integer of at least 2.")
+            min_transactions = int(min_transactions)
+            window = self.parse_window(request.query_params.get("window", "1h"))
+            start = parse_bound(request.query_params.get("start"), time.min)
+            end = parse_bound(request.query_params.get("end"), time.max)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        transactions = Transactions.objects.all()
+        if start:
+            transactions = transactions.filter(TransactionDate__gte=start)
+        if end:
+            transactions = transactions.filter(TransactionDate__lte=end)
+
+        # For every transaction, the date of the transaction N-1 positions earlier
+        partition = {
+            "partition_by": F("AccountID"),
+            "order_by": F("TransactionDate").asc(),
+        }
+        window_ends = (
+            transactions.annotate(
+                window_start=Window(
+                    Lag("TransactionDate", offset=min_transactions - 1), **partition
+                ),
+                position=Window(RowNumber(), **partition),
+            )
+            .filter(window_start__gte=F("TransactionDate") - window)
+            .values_list("AccountID", "window_start", "TransactionDate", "position")
+            .order_by("AccountID", "position")
+        )
+        # An account's transactions are all on its shard: the bursts found on each shard
+        # are complete, and only need to be merged in order
+        burst_accounts = sorted(
+            (
+                account
+                for accounts in sharding.scatter(
+                    lambda: self.merge_windows(window_ends.all(), min_transactions)
+                )
+                for account in accounts
+            ),
+            key=lambda account: -account["max_transactions"],
+        )
+
+        return Response(
+            {
+                "min_transactions": min_transactions,
+                "window_seconds": int(window.total_seconds()),
+                "start": start,
+                "end": end,
+                "burst_accounts": burst_accounts,
+            }
+        )
+
+    def parse_window(self, value):
+        match = re.fullmatch(r"(\d+)([smh]?)", value.strip().lower())
+        if not match or int(match.group(1)) == 0:
+            raise ValueError("window must be a positive number of seconds, e.g. 90, 15m or 1h.")
+        return timedelta(seconds=int(match.group(1)) * self.WINDOW_UNITS[match.group(2)])
+
+    def merge_windows(self, window_ends, min_transactions):
+        """
+        Merge the overlapping windows of each account into bursts.
+
+        Each row is the last transaction of a window covering positions
+        [position - N + 1, position] of the account's ordered transactions.
+        """
+        accounts = {}
+        for account_id, window_start, window_end, position in window_ends:
+            bursts = accounts.setdefault(account_id, [])
+            first_position = position - min_transactions + 1
+            if bursts and first_position <= bursts[-1]["last_position"]:
+                burst = bursts[-1]
+                burst["window_end"] = window_end
+                burst["transaction_count"] += position - burst["last_position"]
+                burst["last_position"] = position
+            else:
+                bursts.append(
+                    {
+                        "window_start": window_start,
+                        "window_end": window_end,
+                        "transaction_count": min_transactions,
+                        "last_position": position,
+                    }
+                )
+
+        results = []
+        for account_id, bursts in accounts.items():
+            for burst in bursts:
+                del burst["last_position"]
+            results.append(
+                {
+                    "AccountID": account_id,
+                    "max_transactions": max(b["transaction_count"] for b in bursts),
+                    "bursts": bursts,
+                }
+            )
+        return sorted(results, key=lambda account: -account["max_transactions"])
+
+
+class LiveHighFrequencyAccountsView(APIView):
+    """
+    Identifies accounts with a high transaction velocity right now, without querying the database.
+
+    The counts come from the in-memory velocity tracker, which is fed as transactions are
+    inserted and keeps a ring buffer of recent transactions per account. Each worker process
+    tracks the transactions it inserted itself.
+
+    Query Parameters:
+    - window (str, optional): One of 1m, 1h or 24h (or the equivalent seconds). Default is 1h.
+    - threshold (int, optional): Flag accounts with more transactions than this in the window. Default is 10.
+
+    Responses:
+    - 200 OK: A JSON object containing:
+        - window_seconds (int), threshold (int): The parameters used.
+        - high_frequency_accounts (list): Accounts above the threshold, busiest first, each containing:
+            - AccountID (str): The ID of the account.
+            - transaction_count (int): Transactions in the window.
+            - total_amount (float): Amount of those transactions.
+            - saturated (bool): The window holds more transactions than the tracker retains per account.
+    - 400 Bad Request: Invalid query parameter.
+    """
+
+    WINDOWS = {"1m": 60, "1h": 3600, "24h": 86400}
+
+    @swagger_auto_schema(
+        operation_description="Lists accounts whose transaction count in the last minute/hour/day exceeds a threshold, from the in-memory velocity tracker.",
+        manual_parameters=[
+            openapi.Parameter(
+                "window",
+                openapi.IN_QUERY,
+                description="Window: 1m, 1h or 24h. Default is 1h.",
+                type=openapi.TYPE_STRING,
+                required=False,
+            ),
+            openapi.Parameter(
+                "threshold",
+                openapi.IN_QUERY,
+                description="Minimum number of transactions (exclusive). Default is 10.",
+                type=openapi.TYPE_INTEGER,
+                required=False,
+            ),
+        ],
+        responses={
+            200: "Accounts above the velocity threshold",
+            400: "Invalid query parameter",
+        },
+    )
+    def get(self, request, *args, **kwargs):
+        window = request.query_params.get("window", "1h")
+        window = self.WINDOWS.get(window, window)
+        threshold = request.query_params.get("threshold", "10")
+        tracker = get_velocity_tracker()
+
+        if str(window) not in {str(seconds) for seconds in tracker.windows}:
+            return Response(
+                {"error": "window must be one of: 1m, 1h, 24h."}, status=400
+            )
+        if not threshold.isdigit():
+            return Response(
+                {"error": "threshold must be a non-negative integer."}, status=400
+            )
+
+        window, threshold = int(window), int(threshold)
+        return Response(
+            {
+                "window_seconds": window,
+                "threshold": threshold,
+                "high_frequency_accounts": tracker.accounts_over(window, threshold),
+            }
+        )
+
+
+class TimeSeriesView(ReplicaReadMixin, APIView):
+    """
+    Base class of the account and merchant time-series endpoints.
+
+    Returns the transaction count and total amount of an account or merchant per hour,
+    day, week or month. The series is read from pre-aggregated buckets (AccountTimeSeries
+    and MerchantTimeSeries) kept at hourly, daily and monthly resolution, so no query
+    groups the Transactions table by a truncated date; weekly points are summed from the
+    daily buckets. When the range holds more buckets than `max_points`, consecutive
+    buckets are merged and `bucket_size` tells how many buckets each point covers.
+
+    Query Parameters:
+    - granularity (str, optional): "hour", "day", "week" or "month". Default is "day".
+    - start (str, optional): Start of the range (date or datetime). Default depends on the granularity (2 days of hours, 90 days, 52 weeks or 24 months).
+    - end (str, optional): End of the range (date or datetime). Default is now.
+    - transaction_type (str, optional): Only count "Credit" or "Debit" transactions.
+    - channel (str, optional): Only count "ATM", "Online" or "Branch" transactions.
+    - max_points (int, optional): Maximum number of points. Default (and maximum) is TIMESERIES_MAX_POINTS.
+
+    Responses:
+    - 200 OK: The parameters used, bucket_size, and `points`, a list of objects with
+      start, transaction_count and total_amount (empty buckets are included with zeros).
+    - 400 Bad Request: Invalid query parameter.
+    """
+
+    model = None
+    key_field = None
+    url_kwarg = None
+    DEFAULT_SPANS = {
+        "hour": timedelta(days=2),
+        "day": timedelta(days=90),
+        "week": timedelta(weeks=52),
+        "month": timedelta(days=730),
+    }
+
+    @swagger_auto_schema(
+        operation_description="Transaction count and amount over time, per hour, day, week or month.",
+        manual_parameters=[
+            openapi.Parameter(
+                "granularity",
+                openapi.IN_QUERY,
+                description='"hour", "day", "week" or "month". Default is "day".',
+                type=openapi.TYPE_STRING,
+                required=False,
+            ),
+            openapi.Parameter(
+                "start",
+                openapi.IN_QUERY,
+                description="Start of the range (e.g.: 2023-01-01 or 2023-01-01T08:00:00).",
+                type=openapi.TYPE_STRING,
+                required=False,
+            ),
+            openapi.Parameter(
+                "end",
+                openapi.IN_QUERY,
+                description="End of the range (e.g.: 2023-12-31). Default is now.",
+                type=openapi.TYPE_STRING,
+                required=False,
+            ),
+            openapi.Parameter(
+                "transaction_type",
+                openapi.IN_QUERY,
+                description='Only count "Credit" or "Debit" transactions.',
+                type=openapi.TYPE_STRING,
+                required=False,
+            ),
+            openapi.Parameter(
+                "channel",
+                openapi.IN_QUERY,
+                description='Only count "ATM", "Online" or "Branch" transactions.',
+                type=openapi.TYPE_STRING,
+                required=False,
+            ),
+            openapi.Parameter(
+                "max_points",
+                openapi.IN_QUERY,
+                description="Maximum number of points; longer ranges are downsampled.",
+                type=openapi.TYPE_INTEGER,
+                required=False,
+            ),
+        ],
+        responses={
+            200: "Transaction count and amount per time bucket",
+            400: "Invalid query parameter",
+        },
+    )
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        granularity = params.get("granularity", "day")
+        filters = {
+            "TransactionType": params.get("transaction_type"),
+            "Channel": params.get("channel"),
+        }
+        max_points = params.get("max_points", str(settings.TIMESERIES_MAX_POINTS))
+        try:
+            if granularity not in self.DEFAULT_SPANS:
+                raise ValueError('granularity must be "hour", "day", "week" or "month".')
+            for field, value in filters.items():
+                choices = dict(Transactions._meta.get_field(field).choices)
+                if value and value not in choices:
+                    raise ValueError(f"{field} must be one of {', '.join(choices)}.")
+            if not max_points.isdigit() or int(max_points) == 0:
+                raise ValueError("max_points must be a positive integer.")
+            max_points = min(int(max_points), settings.TIMESERIES_MAX_POINTS)
+            end = parse_bound(params.get("end"), time.max) or timezone.now()
+            start = parse_bound(params.get("start"), time.min) or (
+                end - self.DEFAULT_SPANS[granularity]
+            )
+            if start > end:
+                raise ValueError("start must be before end.")
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        key = kwargs[self.url_kwarg]
+        bucket_size, points = time_series(
+            self.model,
+            {self.key_field: key},
+            granularity,
+            start,
+            end,
+            max_points,
+            **filters,
+        )
+        return Response(
+            {
+                self.url_kwarg: key,
+                "granularity": granularity,
+                "start": start,
+                "end": end,
+                "transaction_type": filters["TransactionType"],
+                "channel": filters["Channel"],
+                "bucket_size": bucket_size,
+                "points": points,
+            }
+        )
+
+
+class AccountTimeSeriesView(AccountShardMixin, TimeSeriesView):
+    """
+    Transaction count and amount of an account over time (see TimeSeriesView).
+
+    Example:
+    GET /accounts/AC00128/timeseries/?granularity=week&start=2023-01-01&channel=Online
+    """
+
+    model = AccountTimeSeries
+    key_field = "AccountID"
+    url_kwarg = "account_id"
+
+
+class MerchantTimeSeriesView(TimeSeriesView):
+    """
+    Transaction count and amount of a merchant over time (see TimeSeriesView).
+
+    Example:
+    GET /merchants/M015/timeseries/?granularity=month&transaction_type=Debit
+    """
+
+    model = MerchantTimeSeries
+    key_field = "MerchantID"
+    url_kwarg = "merchant_id"
+
+
+class AnalyticsCubeView(ReplicaReadMixin, APIView):
+    """
+    Slices transactions by channel, location, transaction type, customer occupation, customer
+    age band and day, answered from the pre-aggregated analytics cube (see cube.py).
+
+    Each cube cell holds the count, amount and sum of squared amounts of the transactions of
+    one day and one value of every dimension, so any slice is a sum of cells instead of an
+    aggregate over the Transactions table.
+
+    Query Parameters:
+    - group_by (str, optional): Comma-separated dimensions to group by, among channel, location,
+      transaction_type, occupation, age_band, day and month. Removing a dimension rolls it up,
+      adding one drills down. Default is no grouping (a single total).
+    - channel, location, transaction_type, occupation, age_band (str, optional): Comma-separated
+      values to keep for that dimension (e.g. channel=ATM,Online or age_band=18-24).
+    - start (str, optional): First day included (YYYY-MM-DD).
+    - end (str, optional): Last day included (YYYY-MM-DD).
+
+    Responses:
+    - 200 OK: The parameters used and `cells`, one object per group with its dimension values,
+      transaction_count, total_amount, average_amount and stddev_amount.
+    - 400 Bad Request: Invalid query parameter.
+
+    Example:
+    GET /analytics/cube/?group_by=channel,month&transaction_type=Debit&age_band=25-34
+    """
+
+    @swagger_auto_schema(
+        operation_description="Transaction count, total, average and standard deviation of the amount, grouped by and filtered on any subset of channel, location, transaction type, occupation, age band and day/month.",
+        manual_parameters=[
+            openapi.Parameter(
+                "group_by",
+                openapi.IN_QUERY,
+                description="Comma-separated dimensions: " + ", ".join(cube.GROUP_FIELDS),
+                type=openapi.TYPE_STRING,
+                required=False,
+            ),
+            *(
+                openapi.Parameter(
+                    dimension,
+                    openapi.IN_QUERY,
+                    description=f"Comma-separated {dimension} values to keep.",
+                    type=openapi.TYPE_STRING,
+                    required=False,
+                )
+                for dimension in cube.FILTER_DIMENSIONS
+            ),
+            openapi.Parameter(
+                "start",
+                openapi.IN_QUERY,
+                description="First day included (e.g.: 2023-01-01).",
+                type=openapi.TYPE_STRING,
+                required=False,
+            ),
+            openapi.Parameter(
+                "end",
+                openapi.IN_QUERY,
+                description="Last day included (e.g.: 2023-12-31).",
+                type=openapi.TYPE_STRING,
+                required=False,
+            ),
+        ],
+        responses={
+            200: "Aggregates of the requested slice",
+            400: "Invalid query parameter",
+        },
+    )
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        group_by = [d.strip() for d in params.get("group_by", "").split(",") if d.strip()]
+        filters = {
+            dimension: [v.strip() for v in params[dimension].split(",") if v.strip()]
+            for dimension in cube.FILTER_DIMENSIONS
+            if dimension in params
+        }
+        try:
+            unknown = [d for d in group_by if d not in cube.GROUP_FIELDS]
+            if unknown:
+                raise ValueError(
+                    f"Unknown dimension: {', '.join(unknown)}. "
+                    f"Expected {', '.join(cube.GROUP_FIELDS)}."
+                )
+            invalid_bands = set(filters.get("age_band", [])) - set(cube.AGE_BAND_LABELS)
+            if invalid_bands:
+                raise ValueError(
+                    f"Invalid age_band: {', '.join(sorted(invalid_bands))}. "
+                    f"Expected {', '.join(cube.AGE_BAND_LABELS)}."
+                )
+            start = parse_day(params.get("start"))
+            end = parse_day(params.get("end"))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        return Response(
+            {
+                "group_by": group_by,
+                "filters": filters,
+                "start": start,
+                "end": end,
+                "cells": cube.query_cube(group_by, filters, start, end),
+            }
+        )
+
+
+class ChangeLogFreshnessView(APIView):
+    """
+    Reports how fresh the consumers of the Transactions change log are.
+
+    Every insert, update and delete of a transaction is appended to the change log in the
+    same database transaction; consumers such as the columnar snapshot apply it in batches
+    (see the consume_changes command).
+
+    Query Parameters:
+    - shard (str): Shard whose change log is reported. Required with several shards,
+      which each log the changes of their own transactions.
+
+    Responses:
+    - 200 OK: A JSON object containing:
+        - head (int): Sequence number of the last change.
+        - consumers (dict): Per consumer, `applied` (last Sequence applied), `lag` (changes
+          not applied yet) and `lag_seconds` (age of the oldest change not applied yet).
+    - 400 Bad Request: Missing or unknown shard.
+    """
+
+    @swagger_auto_schema(
+        operation_description="Freshness lag of the change log consumers (last sequence applied compared with the head of the log).",
+        manual_parameters=[
+            openapi.Parameter("shard", openapi.IN_QUERY, type=openapi.TYPE_STRING, description="Shard whose change log is reported (required with several shards)"),
+        ],
+        responses={
+            200: "Head of the change log and lag of each consumer",
+            400: "Missing or unknown shard",
+        },
+    )
+    def get(self, request, *args, **kwargs):
+        try:
+            alias = requested_shard(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+        with sharding.use_shard(alias):
+            return Response(changelog.freshness())
+
+
+class ChangesFeedView(APIView):
+    """
+    Change-data-capture feed of the Transactions table for downstream consumers.
+
+    Returns the inserts, updates and deletes committed after the cursor `since`, in commit
+    order. Each change carries its `sequence`; the next poll passes the sequence of the
+    last change received (or `next`) as `since`. The changes are read with a range scan
+    of the change log's primary key, so a poll costs the same however large the
+    Transactions table is.
+
+    Query Parameters:
+    - shard (str): Shard whose changes are read. Required with several shards, which each
+      log and number the changes of their own transactions: a consumer follows each
+      shard with its own cursor.
+    - since (int, optional): Cursor returned by the previous poll. Defaults to 0.
+    - limit (int, optional): Maximum number of changes. Defaults to CHANGELOG_BATCH_SIZE,
+      or CHANGES_FEED_MAX_LIMIT when streaming.
+    - wait (int, optional): Seconds to wait for a change when there is none yet
+      (long-poll). Defaults to 0. Waits last at most CHANGES_FEED_SYNC_MAX_WAIT seconds
+      here, since they hold a worker thread; async/changes/ waits the full time.
+
+    With `Accept: application/x-ndjson` (or ?format=ndjson) the changes are streamed one
+    per line instead, fetched from the database in batches.
+
+    Responses:
+    - 200 OK: `changes` (list of sequence, transaction_id, operation, data, created_at)
+      and `next`, the cursor for the next poll.
+    - 400 Bad Request: A parameter is invalid.
+    - 410 Gone: Changes after `since` were deleted by compaction; the consumer must
+      reload the transactions and continue from `compacted`.
+    """
+
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer]
+
+    @swagger_auto_schema(
+        operation_description="Inserted, updated and deleted transactions after a cursor, in commit order (JSON or NDJSON, optional long-poll).",
+        manual_parameters=[
+            openapi.Parameter("shard", openapi.IN_QUERY, type=openapi.TYPE_STRING, description="Shard whose changes are read (required with several shards)"),
+            openapi.Parameter("since", openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description="Sequence of the last change received"),
+            openapi.Parameter("limit", openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description="Maximum number of changes"),
+            openapi.Parameter("wait", openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description="Seconds to wait for new changes (long-poll)"),
+        ],
+        responses={
+            200: "Changes after the cursor and the next cursor",
+            400: "Invalid parameter",
+            410: "The cursor is older than the compacted part of the log",
+        },
+    )
+    def get(self, request, *args, **kwargs):
+        stream = request.accepted_renderer.format == "ndjson"
+        try:
+            alias = requested_shard(request)
+            since = bounded_int(request, "since", 0, 0, 2**63 - 1)
+            limit = bounded_int(
+                request,
+                "limit",
+                settings.CHANGES_FEED_MAX_LIMIT if stream else settings.CHANGELOG_BATCH_SIZE,
+                1,
+                settings.CHANGES_FEED_MAX_LIMIT,
+            )
+            wait = bounded_int(request, "wait", 0, 0, settings.CHANGES_FEED_MAX_WAIT)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        batch = min(limit, settings.CHANGELOG_BATCH_SIZE) if stream else limit
+        # A long-poll holds a worker thread: longer waits belong to async/changes/
+        deadline = monotonic() + min(wait, settings.CHANGES_FEED_SYNC_MAX_WAIT)
+        try:
+            with sharding.use_shard(alias):
+                changes = changelog.read_changes(since, batch)
+                while not changes and monotonic() < deadline:
+                    sleep(settings.CHANGES_FEED_POLL_INTERVAL)
+                    changes = changelog.read_changes(since, batch)
+        except changelog.CursorExpired as e:
+            return Response(
+                {
+                    "error": "Changes after this cursor were compacted; reload and continue from `compacted`.",
+                    "compacted": e.args[0],
+                },
+                status=410,
+            )
+
+        if stream:
+            return StreamingHttpResponse(
+                self.stream(alias, changes, limit), content_type=NDJSONRenderer.media_type
+            )
+        return Response(
+            {
+                "changes": [changelog.serialize_change(c) for c in changes],
+                "next": changes[-1].Sequence if changes else since,
             }
         )
+
+    def stream(self, alias, changes, limit):
+        """Yield up to ``limit`` changes as NDJSON lines, fetching the next batches lazily."""
+        sent = 0
+        while changes:
+            for change in changes:
+                yield ndjson_line(changelog.serialize_change(change))
+            sent += len(changes)
+            if sent >= limit:
+                break
+            # Consumed after the view returned, outside its use_shard()
+            with sharding.use_shard(alias):
+                changes = changelog.pending_changes(
+                    changes[-1].Sequence, min(limit - sent, settings.CHANGELOG_BATCH_SIZE)
+                )
+
+
+class SchemaDocumentView(View):
+    """
+    OpenAPI schema of the API (see schema.py), served from memory as JSON or YAML.
+
+    Browsers and proxies may cache it for API_SCHEMA_MAX_AGE seconds, then revalidate it
+    with If-None-Match: the ETag only changes when the schema does.
+    """
+
+    format = "json"
+
+    def get(self, request):
+        content, content_type, etag = schema.schema_document(self.format)
+        headers = {
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={settings.API_SCHEMA_MAX_AGE}",
+        }
+        if etag in request.headers.get("If-None-Match", ""):
+            return HttpResponse(status=304, headers=headers)
+        return HttpResponse(content, content_type=content_type, headers=headers)
+
+
+class DocumentationPageView(View):
+    """
+    Swagger UI or ReDoc page (see schema.py), rendered once and served from memory. The
+    page loads the schema from swagger.json; it is cached and revalidated like it.
+    """
+
+    page = "swagger"
+
+    def get(self, request):
+        content, etag = schema.documentation_page(self.page)
+        headers = {
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={settings.API_SCHEMA_MAX_AGE}",
+        }
+        if etag in request.headers.get("If-None-Match", ""):
+            return HttpResponse(status=304, headers=headers)
+        return HttpResponse(content, content_type="text/html; charset=utf-8", headers=headers)
+
+
+class MetricsView(View):
+    """
+    Metrics of every worker process in the Prometheus text format (see metrics.py), for
+    Prometheus to scrape.
+    """
+
+    def get(self, request):
+        metrics.publish_cache_lookups()
+        return HttpResponse(
+            metrics.exposition(), content_type="text/plain; version=0.0.4; charset=utf-8"
+        )
+
+
+class ProfileListView(APIView):
+    """
+    Profiles saved by the profiling middleware (see profiling.py), most recent first.
+    Admins only.
+    """
+
+    permission_classes = [IsAdminUser]
+    swagger_schema = None
+
+    def get(self, request):
+        profiles = profiling.list_profiles()
+        for profile in profiles:
+            profile["url"] = reverse(
+                "profile-download", args=[profile["profile_id"]], request=request
+            )
+        return Response(profiles)
+
+
+class ProfileDownloadView(APIView):
+    """
+    The profile of a request: a pstats file (cProfile) or collapsed stacks (sampler).
+    Admins only.
+    """
+
+    permission_classes = [IsAdminUser]
+    swagger_schema = None
+
+    def get(self, request, profile_id):
+        path = profiling.profile_path(profile_id)
+        try:
+            profile = json.loads(path.read_text()) if path else None
+            file = open(path.with_name(profile["file"]), "rb") if profile else None
+        except (OSError, ValueError):
+            file = None
+        if file is None:
+            raise Http404("No such profile.")
+        return FileResponse(file, as_attachment=True, filename=profile["file"])
@@ -0,0 +1,148 @@
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import metrics, sharding
+from .ingest import insert_transactions
+
+logger = logging.getLogger(__name__)
+
+
+class IngestQueueFull(Exception):
+    """Raised when the write-behind queue cannot accept more transactions."""
+
+
+def transaction_shard(instance):
+    return sharding.shard_for(instance.AccountID_id)
+
+
+class WriteBehindBuffer:
+    """
+    Bounded in-process queue that group-commits transactions from a background thread.
+
+    Each call to ``submit`` returns a ``concurrent.futures.Future`` that resolves once the
+    batch containing the transaction has been committed, so callers only acknowledge
+    durable writes. Async code can await it with ``asyncio.wrap_future``.
+
+    The flusher commits a batch as soon as it holds ``max_rows`` transactions or
+    ``max_delay`` seconds after the first transaction of the batch was queued. The rows of
+    each shard (``shard_of``) are flushed separately, so that a failure on one shard only
+    retries rows that were rolled back.
+
+    Attributes:
+        capacity (int): Maximum number of queued transactions before submit() fails.
+        max_rows (int): Maximum number of transactions committed together.
+        max_delay (float): Maximum time in seconds a transaction waits for its batch.
+    """
+
+    def __init__(
+        self,
+        capacity,
+        max_rows,
+        max_delay,
+        flush=insert_transactions,
+        shard_of=transaction_shard,
+    ):
+        self.capacity = capacity
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self._flush = flush
+        self._shard_of = shard_of
+        self._queue = queue.Queue(maxsize=capacity)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def depth(self):
+        """Number of transactions waiting to be committed."""
+        return self._queue.qsize()
+
+    def submit(self, instance):
+        """
+        Queue an unsaved Transactions instance.
+
+        Raises:
+            IngestQueueFull: The queue already holds ``capacity`` transactions.
+        """
+        self._ensure_started()
+        future = Future()
+        try:
+            self._queue.put_nowait((instance, future))
+        except queue.Full:
+            raise IngestQueueFull
+        metrics.set_gauge("ingest_queue_depth", (), self.depth)
+        return future
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="write-behind-flusher", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            metrics.set_gauge("ingest_queue_depth", (), self.depth)
+            self._commit(batch)
+
+    def _commit(self, batch):
+        close_old_connections()
+        by_shard = defaultdict(list)
+        for instance, future in batch:
+            by_shard[self._shard_of(instance)].append((instance, future))
+        for shard_batch in by_shard.values():
+            self._commit_shard(shard_batch)
+
+    def _commit_shard(self, batch):
+        # One database transaction: if it fails, none of the batch was stored
+        try:
+            self._flush([instance for instance, _ in batch])
+        except Exception:
+            logger.exception(
+                "Write-behind batch of %d failed, retrying one by one", len(batch)
+            )
+            # Isolate the failing rows so the rest of the batch is still stored
+            for instance, future in batch:
+                try:
+                    self._flush([instance])
+                except Exception as exc:
+                    future.set_exception(exc)
+                else:
+                    future.set_result(instance)
+        else:
+            for instance, future in batch:
+                future.set_result(instance)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_write_behind_buffer():
+    """Return the process-wide buffer configured by the WRITE_BEHIND_* settings."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = WriteBehindBuffer(
+                capacity=settings.WRITE_BEHIND_QUEUE_SIZE,
+                max_rows=settings.WRITE_BEHIND_MAX_BATCH,
+                max_delay=settings.WRITE_BEHIND_MAX_DELAY_MS / 1000,
+            )
+        return _buffer